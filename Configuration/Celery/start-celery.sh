@@ -6,5 +6,14 @@ source /home/pkimani/venv/bin/activate
 # Navigate to the Django project directory
 cd /home/pkimani/getting-started-app/djrssproj/
 
+# Tasks on the 1000 threads share the pooled database connections of the celery entry of DB_CONNECTION_BUDGET
+export DB_PROCESS_ROLE=celery
+
+# Refuse to start when the connection budget of all services exceeds the server's max_connections
+python manage.py check --database default || exit 1
+
+# Register the feeds of the OPML file, the tasks poll the enabled feeds of the registry
+python manage.py sync_feeds
+
 # Start the Celery worker
 celery -A djrssproj worker --concurrency=1000 --pool=threads --loglevel=INFO
\ No newline at end of file
@@ -9,8 +9,20 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djrssproj.settings')
 
-application = get_asgi_application()
+
+class AsyncAPIHandler(ASGIHandler):
+    """Resolve requests with ASGI_ROOT_URLCONF, whose read endpoints are async views."""
+
+    async def get_response_async(self, request):
+        request.urlconf = settings.ASGI_ROOT_URLCONF
+        return await super().get_response_async(request)
+
+
+django.setup(set_prefix=False)
+application = AsyncAPIHandler()
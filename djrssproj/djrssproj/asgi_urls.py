@@ -0,0 +1,17 @@
+"""
+URL configuration of the ASGI application (djrssproj/asgi.py).
+
+The read endpoints are served by the async views in rssapp/async_views.py; every other URL, and the whole
+site under WSGI, is served as configured in djrssproj/urls.py.
+"""
+from django.urls import path
+from rssapp import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/articles/', async_views.AsyncArticleListView.as_view(), name='article-list'),
+    path('api/sources/', async_views.AsyncSourceListView.as_view(), name='source-list'),
+    path('api/score-range/', async_views.AsyncScoreRangeView.as_view(), name='score-range'),
+    path('api/date-range/', async_views.AsyncDateRangeView.as_view(), name='date-range'),
+    path('api/source-counts/', async_views.AsyncSourceCountView.as_view(), name='source-counts'),
+] + sync_urlpatterns
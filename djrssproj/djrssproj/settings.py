@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'rssapp.metrics.ViewMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -43,6 +44,8 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'djrssproj.urls'
+# URLs served by the ASGI application (djrssproj/asgi.py): the read endpoints as async views
+ASGI_ROOT_URLCONF = 'djrssproj.asgi_urls'
 
 TEMPLATES = [
     {
@@ -65,7 +68,8 @@ WSGI_APPLICATION = 'djrssproj.wsgi.application'
 # Database configuration
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Django's PostgreSQL backend on a per-process connection pool, sized by the DB_POOL_* settings below
+        'ENGINE': 'rssapp.db_backend',
         'NAME': 'articles_db',
         'USER': 'postgres',
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
@@ -179,6 +183,25 @@ CELERY_TASK_QUEUES = (
     Queue('celery', Exchange('celery'), routing_key='celery', queue_arguments={'x-max-priority': 5}),
 )
 
+# Cache settings
+# Local memory by default (per process, LRU once MAX_ENTRIES is reached). Set REDIS_URL to share the cache
+# between processes; configure the Redis server with an LRU maxmemory-policy such as allkeys-lru.
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
 # CORS settings
 CORS_ORIGIN_WHITELIST = [
     'http://localhost:8000',
@@ -200,5 +223,97 @@ CSRF_COOKIE_SECURE = True
 
 # Custom settings
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+OPENAI_API_URL = os.environ.get('OPENAI_API_URL', 'https://api.openai.com/v1/chat/completions')
 OPML_FILE_PATH = os.path.join(BASE_DIR, 'XML', 'Feeds.opml')
+
+# Scoring batches: token budget per request (prompt included), cap on titles per request
+# (bounds the size of the JSON reply) and how long a partial batch may wait before it is sent
+SCORING_TOKEN_BUDGET = 4000
+SCORING_MAX_TITLES = 100
+SCORING_FLUSH_SECONDS = 10
+# How long a title queued for scoring is left to its batch, retries and rate limit deferrals before the sweep of
+# unscored articles queues it again
+SCORING_RESEND_SECONDS = 15 * 60
+
+# Scoring API quota shared by every worker and node (rssapp/rate_limit.py): requests and tokens per minute (lowered
+# to the limits the API reports), seconds of quota that may be spent at once, how long a request may wait for the
+# limiter before it is re-queued, and the reply tokens reserved per title on top of the prompt
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get('LLM_REQUESTS_PER_MINUTE', '250'))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get('LLM_TOKENS_PER_MINUTE', '150000'))
+LLM_RATE_LIMIT_BURST_SECONDS = 10
+LLM_RATE_LIMIT_MAX_WAIT = 60
+LLM_COMPLETION_TOKENS_PER_TITLE = 30
+
+# Shared Bloom filter of stored article hashes, used to skip known feed entries before they are queued
+HASH_INDEX_PATH = os.path.join(BASE_DIR, 'var', 'article_hashes.bloom')
+HASH_INDEX_CAPACITY = 2000000
+HASH_INDEX_ERROR_RATE = 1e-7
+
+# Feed parsing process pool: number of processes (None for one per CPU) and feeds handed to a process at a time
+FEED_PARSE_PROCESSES = None
+FEED_PARSE_BATCH_SIZE = 8
+
+# Adaptive feed polling: bounds on the learned poll interval, the interval for feeds with no known source,
+# the cap on the backoff for failing feeds, relative jitter, and the window the publishing rate is learned from
+FEED_POLL_MIN_SECONDS = 5 * 60
+FEED_POLL_MAX_SECONDS = 6 * 60 * 60
+FEED_POLL_DEFAULT_SECONDS = 60 * 60
+FEED_POLL_MAX_BACKOFF_SECONDS = 24 * 60 * 60
+FEED_POLL_JITTER = 0.1
+FEED_RATE_WINDOW_DAYS = 14
+# Bounds on how long the update articles loop waits before checking for due feeds again
+SCHEDULER_MIN_TICK_SECONDS = 30
+SCHEDULER_MAX_TICK_SECONDS = 15 * 60
+
+# /api/articles/ page cache: page TTL, and how long a process may use the invalidation generation it last read
+ARTICLE_PAGE_CACHE_TIMEOUT = 5 * 60
+PAGE_CACHE_GENERATION_TTL = 2
+# Render /api/articles/ pages from value tuples instead of through ArticleSerializer
+ARTICLE_LIST_FAST_PATH = True
+# Every kind of process that uses the database, how many of them run at once, and the connections each one may
+# hold: max_size of its pool (rssapp/db_backend) and of the async pool of the ASGI views (rssapp/async_db). The
+# sum over all of them must stay below the server's max_connections; the rssapp.E001 check (rssapp/checks.py),
+# run by every service before it starts, fails when it does not. Keep processes in line with the service files.
+DB_CONNECTION_BUDGET = {
+    # uWSGI, processes in Configuration/uWSGI/uwsgi-ssl.ini
+    'wsgi': {'processes': 4, 'pool': 8, 'async_pool': 0},
+    # The Celery worker, one process whose 1000 threads share the pool (Configuration/Celery/start-celery.sh)
+    'celery': {'processes': 1, 'pool': 40, 'async_pool': 0},
+    # Uvicorn, --workers in Configuration/ASGI/uvicorn.service
+    'asgi': {'processes': 4, 'pool': 2, 'async_pool': 2},
+    # manage.py commands and shells run by hand, and the tests
+    'manage': {'processes': 1, 'pool': 4, 'async_pool': 0},
+}
+# Which of them this process is, set by its service
+DB_PROCESS_ROLE = os.environ.get('DB_PROCESS_ROLE', 'manage')
+# Connection pool of each process using the database (rssapp/db_backend). Closing a connection returns it to
+# the pool; a thread waits up to DB_POOL_TIMEOUT seconds for one when all DB_POOL_MAX_SIZE are in use
+DB_POOL_MAX_SIZE = DB_CONNECTION_BUDGET.get(DB_PROCESS_ROLE, {}).get('pool', 1)
+DB_POOL_MIN_SIZE = min(int(os.environ.get('DB_POOL_MIN_SIZE', '1')), DB_POOL_MAX_SIZE)
+DB_POOL_TIMEOUT = 30
+# Idle connections above DB_POOL_MIN_SIZE are closed after this many seconds, and any connection after its lifetime
+DB_POOL_MAX_IDLE = 10 * 60
+DB_POOL_MAX_LIFETIME = 60 * 60
+# Connections of the async psycopg pool used by the async read views under ASGI, per process
+ASYNC_DB_POOL_MAX_SIZE = DB_CONNECTION_BUDGET.get(DB_PROCESS_ROLE, {}).get('async_pool', 0)
+ASYNC_DB_POOL_MIN_SIZE = min(2, ASYNC_DB_POOL_MAX_SIZE)
+# Rows fetched per round trip from the server-side cursor of /api/articles/export/
+ARTICLE_EXPORT_CHUNK_SIZE = 2000
+# Near-duplicate clustering: title shingle similarity needed to join a cluster, and how far back to look
+CLUSTER_SIMILARITY_THRESHOLD = 0.5
+CLUSTER_WINDOW_HOURS = 72
+# Monthly partitions of the articles table (rssapp/partitions.py): months created ahead of the current one, and
+# how long detaching a partition may wait for queries on the table before it gives up
+ARTICLE_PARTITION_MONTHS_AHEAD = 3
+ARTICLE_PARTITION_LOCK_TIMEOUT = 5
+# Cold storage of aged articles (rssapp/archive.py): months that ended more than ARTICLE_ARCHIVE_HORIZON_DAYS ago
+# move from their partition to a zstd-compressed segment in ARTICLE_ARCHIVE_DIR, in independently readable
+# blocks of ARTICLE_ARCHIVE_BLOCK_ROWS articles
+ARTICLE_ARCHIVE_DIR = os.path.join(BASE_DIR, 'var', 'archive')
+ARTICLE_ARCHIVE_HORIZON_DAYS = 180
+ARTICLE_ARCHIVE_BLOCK_ROWS = 1000
+ARTICLE_ARCHIVE_COMPRESSION_LEVEL = 10
+# Port and address of the Celery worker's Prometheus exporter (0 to disable); the web processes serve /metrics
+METRICS_WORKER_PORT = int(os.environ.get('METRICS_WORKER_PORT', 9808))
+METRICS_WORKER_ADDR = os.environ.get('METRICS_WORKER_ADDR', '127.0.0.1')
 PROMPT = 'Please score the given article titles from 1 to 100 based on their significance and create a JSON dictionary named "articles" with a list of objects containing "id" and "score". The "id" is a 32-character hash code, and the "score" is the significance score. For each title listed after "TITLES:", create a JSON object with "id" and "score". The title is between the first backticks, and the hash code "id" is within the second backticks per line. Exclude the title from the JSON output, only include the hash code "id" and its score. The output should be the "articles" JSON dictionary with objects holding the hash code "id" and the ranking score "score" for each title.\nSignificance criteria:\n1. Score 100 for critical events and emergencies.\n2. Score 90 for topics on Africa, Africans, and the Black diaspora.\n3. Score 80 for exceptional STEM advancements.\n4. Score 75 for climate change, ecology, and environmentalism.\n5. Score 40 for sports.\n6. Score 20 for entertainment and media personalities.\n7. Score 0 for retail discounts and online shopping promotions, excluding new product launches.\nFor unmentioned categories, assign a general score without commentary, only provide the JSON response.\nExample Response:\n```json\n{"articles": [{"id": "29d5f5684f8ceb75c2ad66d968be8cd0", "score": 80}, {"id": "b39b55460cbe71b7940fe9043750e86b", "score": 20}]}```\nTITLES:'
\ No newline at end of file
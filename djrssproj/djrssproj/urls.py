@@ -23,5 +23,6 @@ urlpatterns = [
     path('api/', include('rssapp.urls')),  # Include the URLs from the 'rssapp' app
     path('api/start_rss_feed_download/', views.start_rss_feed_download, name='start_rss_feed_download'),
     path('api/start_openai_query/', views.start_openai_query, name='start_openai_query'),
+    path('metrics', views.metrics, name='metrics'),
     # No need for other URL patterns here since the frontend will be served by Nginx
 ]
\ No newline at end of file
@@ -0,0 +1,429 @@
+# rssapp/archive.py
+# Cold storage for aged articles. A month older than ARTICLE_ARCHIVE_HORIZON_DAYS is written to a segment file
+# in ARTICLE_ARCHIVE_DIR and its partition of the articles table is dropped. A segment holds the month's
+# articles as JSON lines, newest first, compressed as a series of independent zstd frames of
+# ARTICLE_ARCHIVE_BLOCK_ROWS lines; `zstd -dc` reads a whole segment, and a reader only decompresses the blocks
+# it needs. The sidecar index holds the offset and the date and score bounds of every block, and the hash of
+# every article with its block.
+import hashlib
+import heapq
+import json
+import logging
+import os
+import struct
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+import zstandard
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.query import NamedValuesListIterable
+from django.db.models.utils import create_namedtuple_class
+from django.utils.dateparse import parse_datetime
+from .models import Article
+from .partitions import add_months, attached_months, detach_partition, month_start, partition_name
+from .renderers import ARTICLE_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'DJRSARC1'
+# magic, number of blocks, number of articles
+HEADER = struct.Struct('<8sQQ')
+# offset and length in the segment, articles, scored articles, newest and oldest (publication_date in
+# microseconds since the epoch, id), lowest and highest score
+BLOCK = struct.Struct('<QIIIqqqqii')
+# MD5 digest of the article hash, block
+HASH_ENTRY = struct.Struct('<16sI')
+
+Block = namedtuple('Block', ['offset', 'length', 'rows', 'scored', 'newest_date', 'newest_id', 'oldest_date',
+                             'oldest_id', 'min_score', 'max_score'])
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def hash_digest(article_hash):
+    # Article hashes are MD5 hex digests; anything else is digested like the hash index does
+    if len(article_hash) != 32:
+        return hashlib.md5(article_hash.encode()).digest()
+    return bytes.fromhex(article_hash)
+
+
+def segment_path(month):
+    return os.path.join(settings.ARTICLE_ARCHIVE_DIR, f"{partition_name(month)}.jsonl.zst")
+
+
+def index_path(month):
+    return os.path.join(settings.ARTICLE_ARCHIVE_DIR, f"{partition_name(month)}.idx")
+
+
+class Segment:
+    """One archived month: the block list and hash table of its sidecar index, and block reads of its data."""
+    def __init__(self, month):
+        self.month = month
+        self.end = add_months(month, 1)
+        self.path = segment_path(month)
+        with open(index_path(month), 'rb') as f:
+            data = f.read()
+        magic, num_blocks, self.count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{index_path(month)} is not an article archive index")
+        offset = HEADER.size
+        self.blocks = [Block(*BLOCK.unpack_from(data, offset + i * BLOCK.size)) for i in range(num_blocks)]
+        self._hashes = memoryview(data)[offset + num_blocks * BLOCK.size:]
+
+    def read_block(self, number):
+        """Article dicts of a block, in the segment's order (newest first)."""
+        block = self.blocks[number]
+        with open(self.path, 'rb') as f:
+            f.seek(block.offset)
+            data = zstandard.ZstdDecompressor().decompress(f.read(block.length))
+        return [decode_row(line) for line in data.splitlines()]
+
+    def find(self, article_hash):
+        """Article dict of an archived hash, or None. Binary search of the sorted hash table."""
+        digest = hash_digest(article_hash)
+        low, high = 0, len(self._hashes) // HASH_ENTRY.size
+        while low < high:
+            middle = (low + high) // 2
+            entry, block = HASH_ENTRY.unpack_from(self._hashes, middle * HASH_ENTRY.size)
+            if entry < digest:
+                low = middle + 1
+            elif entry > digest:
+                high = middle
+            else:
+                return next(row for row in self.read_block(block) if row['hash'] == article_hash)
+        return None
+
+
+# Datetime columns of an archived row, stored as ISO 8601 strings
+DATE_COLUMNS = ('publication_date', 'cluster_date')
+
+
+def encode_row(row):
+    dates = {name: row[name].isoformat() for name in DATE_COLUMNS if row.get(name) is not None}
+    return json.dumps({**row, **dates}, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+
+def decode_row(line):
+    row = json.loads(line)
+    for name in DATE_COLUMNS:
+        if row.get(name) is not None:
+            row[name] = datetime.fromisoformat(row[name])
+    return row
+
+
+def write_segment(month, rows):
+    """
+    Write the segment and sidecar index of a month from article dicts ordered newest first, to temporary files
+    next to their final paths. Returns the temporary paths and the number of articles.
+    """
+    os.makedirs(settings.ARTICLE_ARCHIVE_DIR, exist_ok=True)
+    segment_tmp = f"{segment_path(month)}.{os.getpid()}.tmp"
+    index_tmp = f"{index_path(month)}.{os.getpid()}.tmp"
+    try:
+        count = _write_segment(segment_tmp, index_tmp, rows)
+    except BaseException:
+        remove_files(segment_tmp, index_tmp)
+        raise
+    return segment_tmp, index_tmp, count
+
+
+def _write_segment(segment_tmp, index_tmp, rows):
+    compressor = zstandard.ZstdCompressor(level=settings.ARTICLE_ARCHIVE_COMPRESSION_LEVEL)
+    blocks = []
+    hashes = []
+    count = 0
+    with open(segment_tmp, 'wb') as f:
+        rows = iter(rows)
+        while chunk := list(islice(rows, settings.ARTICLE_ARCHIVE_BLOCK_ROWS)):
+            data = compressor.compress(b''.join(encode_row(row) for row in chunk))
+            scores = [row['score'] for row in chunk if row['score'] is not None]
+            blocks.append(Block(f.tell(), len(data), len(chunk), len(scores),
+                                to_micros(chunk[0]['publication_date']), chunk[0]['id'],
+                                to_micros(chunk[-1]['publication_date']), chunk[-1]['id'],
+                                min(scores, default=0), max(scores, default=0)))
+            hashes.extend((hash_digest(row['hash']), len(blocks) - 1) for row in chunk)
+            count += len(chunk)
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    with open(index_tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(blocks), count))
+        f.write(b''.join(BLOCK.pack(*block) for block in blocks))
+        f.write(b''.join(HASH_ENTRY.pack(*entry) for entry in sorted(hashes)))
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+
+def remove_files(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def archive_month(month):
+    """
+    Move a month of articles from its partition to a segment. The segment is written and moved into place
+    first; the partition is then detached (which takes the articles out of the source statistics) and dropped,
+    so the articles can always be read from one or the other. Hashes stay in the ArticleHash registry, so
+    archived articles are not ingested again. Feeds are only read back DEFAULT_HOURS, so a month past the
+    horizon gets no new articles while it is written. Returns the number of archived articles.
+    """
+    month = month_start(month)
+    if os.path.exists(index_path(month)):
+        raise ValueError(f"{partition_name(month)} is already archived")
+    articles = Article.objects.filter(publication_date__gte=month, publication_date__lt=add_months(month, 1))
+    # cluster_date lets readers find out whether a member's first article is still stored (ArchiveFilter)
+    rows = articles.order_by('-publication_date', '-id').values(*ARTICLE_COLUMNS, 'cluster_date')
+    with transaction.atomic():
+        segment_tmp, index_tmp, count = write_segment(month, rows.iterator(chunk_size=2000))
+    try:
+        # Readers only see a segment once its index is in place. Until the partition is detached its articles
+        # are read from both, which is better than from neither
+        os.replace(segment_tmp, segment_path(month))
+        os.replace(index_tmp, index_path(month))
+        detach_partition(month)
+    except BaseException:
+        remove_files(index_path(month), segment_path(month), index_tmp, segment_tmp)
+        raise
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {connection.ops.quote_name(partition_name(month))}")
+    logger.info(f"[archive_month] Archived {count} articles of {partition_name(month)} to {segment_path(month)}")
+    return count
+
+
+def months_to_archive(now=None):
+    """Attached months that ended more than ARTICLE_ARCHIVE_HORIZON_DAYS ago, oldest first."""
+    horizon = (now or datetime.now(timezone.utc)) - timedelta(days=settings.ARTICLE_ARCHIVE_HORIZON_DAYS)
+    return [month for month in attached_months() if add_months(month, 1) <= horizon]
+
+
+_segments = {}
+_segments_lock = threading.Lock()
+
+
+def segments():
+    """Archived months, oldest first. Sidecar indexes are read once per process and again when replaced."""
+    try:
+        names = sorted(name for name in os.listdir(settings.ARTICLE_ARCHIVE_DIR) if name.endswith('.idx'))
+    except FileNotFoundError:
+        return []
+    found = []
+    with _segments_lock:
+        for name in names:
+            path = os.path.join(settings.ARTICLE_ARCHIVE_DIR, name)
+            stat = os.stat(path)
+            cached = _segments.get(path)
+            if cached is None or cached[0] != (stat.st_ino, stat.st_mtime_ns):
+                stem = name[:-len('.idx')]
+                month = datetime(int(stem[-7:-3]), int(stem[-2:]), 1, tzinfo=timezone.utc)
+                cached = _segments[path] = ((stat.st_ino, stat.st_mtime_ns), Segment(month))
+            found.append(cached[1])
+    return found
+
+
+def lookup(article_hash):
+    """Archived article dict of a hash, or None."""
+    for segment in reversed(segments()):
+        if (row := segment.find(article_hash)) is not None:
+            return row
+    return None
+
+
+class ArchiveFilter:
+    """
+    The article list filters, evaluated against archived article dicts. Dates are bounded like the queryset:
+    start inclusive, end exclusive.
+    """
+    def __init__(self, start=None, end=None, sources=None, min_score=None, max_score=None, scored_only=True,
+                 representative_only=False, positions=(), first_articles=None):
+        self.start = start
+        self.end = end
+        self.sources = set(sources) if sources else None
+        self.min_score = min_score
+        self.max_score = max_score
+        self.scored_only = scored_only
+        self.representative_only = representative_only
+        # (column, 'lt' or 'gt', value) bounds of cursor positions, e.g. DRF's publication_date__lt
+        self.positions = list(positions)
+        # Whether the first article of a cluster is stored, by (cluster_id, cluster_date); shared by narrowed copies
+        self.first_articles = {} if first_articles is None else first_articles
+
+    def narrow(self, field, operator, value):
+        """A copy also bounded by a cursor position, which tightens the date or score range blocks are read for."""
+        narrowed = ArchiveFilter(self.start, self.end, self.sources, self.min_score, self.max_score,
+                                 self.scored_only, self.representative_only, self.positions + [(field, operator, value)],
+                                 self.first_articles)
+        if field == 'publication_date' and operator == 'lt':
+            narrowed.end = value if self.end is None else min(self.end, value)
+        elif field == 'publication_date':
+            narrowed.start = value if self.start is None else max(self.start, value)
+        elif field == 'score' and operator == 'lt':
+            narrowed.max_score = value - 1 if self.max_score is None else min(self.max_score, value - 1)
+        elif field == 'score':
+            narrowed.min_score = value + 1 if self.min_score is None else max(self.min_score, value + 1)
+        return narrowed
+
+    def segment_matches(self, segment):
+        return (self.start is None or segment.end > self.start) and (self.end is None or segment.month < self.end)
+
+    def block_matches(self, block):
+        if self.start is not None and block.newest_date < to_micros(self.start):
+            return False
+        if self.end is not None and block.oldest_date >= to_micros(self.end):
+            return False
+        if self.min_score is not None or self.max_score is not None or self.scored_only:
+            if not block.scored:
+                return False
+            if self.min_score is not None and block.max_score < self.min_score:
+                return False
+            if self.max_score is not None and block.min_score > self.max_score:
+                return False
+        return True
+
+    def matches(self, row):
+        score = row['score']
+        return ((self.start is None or row['publication_date'] >= self.start)
+                and (self.end is None or row['publication_date'] < self.end)
+                and (self.sources is None or row['source'] in self.sources)
+                and (not self.scored_only or score is not None)
+                and (self.min_score is None or (score is not None and score >= self.min_score))
+                and (self.max_score is None or (score is not None and score <= self.max_score))
+                and (not self.representative_only or self.is_representative(row))
+                and all(row[field] < value if operator == 'lt' else row[field] > value
+                        for field, operator, value in self.positions))
+
+    def is_representative(self, row):
+        """
+        Whether an archived article is shown with collapse=cluster, decided like representative_filter() when
+        it is read rather than when it was archived: its cluster's first article may have been archived or
+        dropped since. A first article counts as stored when its month is archived or it is in the table.
+        """
+        if row['cluster_id'] is None or row['cluster_id'] == row['id'] or row['cluster_date'] is None:
+            return True
+        first = (row['cluster_id'], row['cluster_date'])
+        if first not in self.first_articles:
+            self.first_articles[first] = (
+                any(segment.month == month_start(row['cluster_date']) for segment in segments())
+                or Article.objects.filter(id=row['cluster_id'], publication_date=row['cluster_date']).exists())
+        return not self.first_articles[first]
+
+
+def archived_ordering(ordering):
+    """Whether archived articles can be read in an ordering of article columns."""
+    return [name.lstrip('-') for name in ordering] == ['publication_date', 'id']
+
+
+def reaches_archive(start):
+    """Whether a date range starting at start (None for unbounded) includes archived months."""
+    return start is not None and any(segment.end > start for segment in segments())
+
+
+def archived_rows(archive_filter, ordering):
+    """
+    Archived article dicts matching a filter, in descending or ascending date order (['-publication_date',
+    '-id'] or ['publication_date', 'id']), read block by block. Blocks hold a date range each, so any other
+    order would have to sort every matching row in memory; it is not supported.
+    """
+    if not archived_ordering(ordering):
+        raise ValueError(f"Archived articles can only be read in date order, not {ordering}")
+    descending = ordering[0].startswith('-')
+    matching = (segment for segment in segments() if archive_filter.segment_matches(segment))
+    ordered = reversed(list(matching)) if descending else matching
+    return (row for segment in ordered for row in scan(segment, archive_filter, descending))
+
+
+def scan(segment, archive_filter, descending):
+    numbers = range(len(segment.blocks)) if descending else reversed(range(len(segment.blocks)))
+    for number in numbers:
+        if archive_filter.block_matches(segment.blocks[number]):
+            rows = segment.read_block(number)
+            yield from (row for row in (rows if descending else reversed(rows)) if archive_filter.matches(row))
+
+
+class ArchiveReadThrough:
+    """
+    Stands in for an article queryset whose date range reaches the archive: order_by(), filter() with the
+    cursor lookups of DRF's CursorPagination, slicing and iterator() read the database rows and the archived
+    rows and merge them in the queryset's order. Archived rows take the queryset's row type: named tuples of
+    its columns for values_list(named=True), else unsaved Article instances.
+    """
+    def __init__(self, queryset, archive_filter, ordering=None, after=None, bounds=(0, None)):
+        self.queryset = queryset
+        self.archive_filter = archive_filter
+        self.ordering = list(ordering or queryset.query.order_by)
+        # Ordering values of the export's after= row; archived rows must come strictly after it
+        self.after = after
+        self.bounds = bounds
+
+    def _copy(self, **changes):
+        values = {'queryset': self.queryset, 'archive_filter': self.archive_filter, 'ordering': self.ordering,
+                  'after': self.after, 'bounds': self.bounds}
+        values.update(changes)
+        return ArchiveReadThrough(**values)
+
+    def order_by(self, *ordering):
+        return self._copy(queryset=self.queryset.order_by(*ordering), ordering=ordering)
+
+    def filter(self, **lookups):
+        archive_filter = self.archive_filter
+        for lookup, value in lookups.items():
+            field, operator = lookup.rsplit('__', 1)
+            if operator not in ('lt', 'gt'):
+                raise TypeError(f"Archived articles cannot be filtered by {lookup}")
+            # DRF passes the position as text
+            value = parse_datetime(value) if field == 'publication_date' and isinstance(value, str) else value
+            archive_filter = archive_filter.narrow(field, operator, value if field == 'publication_date' else int(value))
+        return self._copy(queryset=self.queryset.filter(**lookups), archive_filter=archive_filter)
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step is not None:
+            raise TypeError('Only slices without a step are supported')
+        return self._copy(bounds=(item.start or 0, item.stop))
+
+    def key(self, row):
+        return tuple(getattr(row, name.lstrip('-')) for name in self.ordering)
+
+    @property
+    def descending(self):
+        return self.ordering[0].startswith('-')
+
+    def database_rows(self):
+        """The database part of the slice: the queryset up to the slice's stop."""
+        return self.queryset[:self.bounds[1]] if self.bounds[1] is not None else self.queryset
+
+    def archived(self):
+        """Matching archived rows in the queryset's order and row type."""
+        if self.queryset._iterable_class is NamedValuesListIterable:
+            query = self.queryset.query
+            row_class = create_namedtuple_class(*query.extra_select, *query.values_select, *query.annotation_select)
+            convert = lambda row: row_class(*[row[name] for name in row_class._fields])
+        else:
+            convert = lambda row: Article(**{name: row[name] for name in ARTICLE_COLUMNS})
+        rows = (convert(row) for row in archived_rows(self.archive_filter, self.ordering))
+        if self.after is not None:
+            after, key = self.after, self.key
+            rows = (row for row in rows if (key(row) < after if self.descending else key(row) > after))
+        return rows
+
+    def merge(self, database_rows):
+        """Merge fetched database rows with the archived rows and take the slice."""
+        start, stop = self.bounds
+        archived = self.archived() if stop is None else islice(self.archived(), stop)
+        return list(islice(heapq.merge(database_rows, archived, key=self.key, reverse=self.descending), start, stop))
+
+    def __iter__(self):
+        return iter(self.merge(self.database_rows()))
+
+    def iterator(self, chunk_size=2000):
+        """Stream the whole result, the database rows through a server-side cursor."""
+        return heapq.merge(self.queryset.iterator(chunk_size=chunk_size), self.archived(),
+                           key=self.key, reverse=self.descending)
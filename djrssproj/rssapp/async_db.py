@@ -0,0 +1,90 @@
+# rssapp/async_db.py
+# Queries for the async views, run on a pool of async psycopg 3 connections. Django 4.2's async ORM methods
+# still run each query on a thread; here the queryset is only compiled to SQL, which needs no connection,
+# and the SQL runs on the event loop.
+import asyncio
+import logging
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.db import connections
+from django.db.models import Value
+from django.db.models.query import NamedValuesListIterable
+from django.db.models.utils import create_namedtuple_class
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_loop = None
+
+
+def database_conninfo(alias='default'):
+    """libpq connection string of a configured database."""
+    database = settings.DATABASES[alias]
+    params = {
+        'dbname': database['NAME'],
+        'user': database.get('USER'),
+        'password': database.get('PASSWORD'),
+        'host': database.get('HOST'),
+        'port': database.get('PORT'),
+        'client_encoding': 'UTF8',
+    }
+    return make_conninfo(**{name: value for name, value in params.items() if value})
+
+
+async def configure_connection(conn):
+    # Django reads and writes datetimes in UTC
+    await conn.execute("SET TIME ZONE 'UTC'")
+
+
+async def get_pool():
+    """Get this process's connection pool, opened on first use in the running event loop."""
+    global _pool, _pool_loop
+    loop = asyncio.get_running_loop()
+    if _pool is None or _pool_loop is not loop:
+        if not settings.ASYNC_DB_POOL_MAX_SIZE:
+            raise ImproperlyConfigured(f"DB_CONNECTION_BUDGET has no async_pool connections for the "
+                                       f"{settings.DB_PROCESS_ROLE} processes, set DB_PROCESS_ROLE=asgi")
+        pool = AsyncConnectionPool(database_conninfo(), min_size=settings.ASYNC_DB_POOL_MIN_SIZE,
+                                   max_size=settings.ASYNC_DB_POOL_MAX_SIZE, kwargs={'autocommit': True},
+                                   configure=configure_connection, open=False)
+        _pool, _pool_loop = pool, loop
+        await pool.open()
+        logger.info(f"[async_db] Opened a pool of up to {settings.ASYNC_DB_POOL_MAX_SIZE} connections")
+    return _pool
+
+
+async def fetch_rows(queryset):
+    """
+    Run a values_list() queryset on the pool and return its rows, as named tuples if it was created with
+    named=True. Columns are returned as the driver loads them, without Django's field converters.
+    """
+    try:
+        sql, params = queryset.query.get_compiler(connection=connections[queryset.db]).as_sql()
+    except EmptyResultSet:
+        return []
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        cursor = await conn.execute(sql, params)
+        rows = await cursor.fetchall()
+    if queryset._iterable_class is NamedValuesListIterable:
+        query = queryset.query
+        row_class = create_namedtuple_class(*query.extra_select, *query.values_select, *query.annotation_select)
+        return [row_class(*row) for row in rows]
+    return rows
+
+
+async def fetch_aggregate(queryset, **aggregates):
+    """Async counterpart of queryset.aggregate(**aggregates)."""
+    rows = await fetch_rows(queryset.order_by().values(everything=Value(1)).annotate(**aggregates)
+                            .values_list(*aggregates))
+    return dict(zip(aggregates, rows[0])) if rows else dict.fromkeys(aggregates)
+
+
+async def close_pool():
+    """Close this process's pool, opened again on next use, e.g. before its event loop ends."""
+    global _pool, _pool_loop
+    if _pool is not None:
+        pool, _pool, _pool_loop = _pool, None, None
+        await pool.close()
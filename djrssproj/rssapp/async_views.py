@@ -0,0 +1,106 @@
+# rssapp/async_views.py
+# Async versions of the read endpoints, served by the ASGI application (djrssproj/asgi_urls.py). They are the
+# DRF views of views.py with coroutine handlers: requests still go through DRF's authentication, throttling,
+# content negotiation and exception handling, and the views reuse the sync views' querysets, pagination and
+# renderers. Queries run on the async connection pool, so a slow query holds a pooled connection but no worker.
+import asyncio
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .archive import ArchiveReadThrough
+from .async_db import fetch_aggregate, fetch_rows
+from .page_cache import ARTICLES, aarticle_page_key, record_lookup
+from .views import ArticleListView, DateRangeView, ScoreRangeView, SourceCountView, SourceListView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView with coroutine handlers. DRF 3.14 only dispatches synchronously, so dispatch() is APIView.dispatch
+    as a coroutine: the checks of initial() run on a thread, as the session of SessionAuthentication and the
+    throttles' cache may do I/O, and a handler's response or exception is handled as DRF would.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            # OPTIONS is answered by APIView's sync options()
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+async def fetch_page(queryset):
+    """fetch_rows for a page of the article list, merging in archived articles when the date range reaches them."""
+    if isinstance(queryset, ArchiveReadThrough):
+        rows = await fetch_rows(queryset.database_rows())
+        # Segment reads are blocking file I/O
+        return await sync_to_async(queryset.merge)(rows)
+    return await fetch_rows(queryset)
+
+
+class AsyncArticleListView(AsyncAPIView, ArticleListView):
+    async def get(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json' or not settings.ARTICLE_LIST_FAST_PATH:
+            # The browsable API and the serializer path, rendered by the sync view on a thread
+            return await sync_to_async(self.list)(request, *args, **kwargs)
+
+        key = await aarticle_page_key(request.query_params, self.page_cache_view)
+        content = await cache.aget(key)
+        record_lookup(ARTICLES, hit=content is not None)
+        cache_status = 'HIT'
+        if content is None:
+            content = await self.arender_page()
+            await cache.aset(key, content, settings.ARTICLE_PAGE_CACHE_TIMEOUT)
+            cache_status = 'MISS'
+
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = cache_status
+        return response
+
+    async def arender_page(self):
+        """render_page with the page fetched on the async pool."""
+        fields = self.get_fields()
+        queryset = self.read_through(self.get_rows_queryset(fields))
+        page = await self.paginator.apaginate_queryset(queryset, self.request, fetch_page, view=self)
+        return self.render_rows(page, fields)
+
+
+class AsyncSourceListView(AsyncAPIView, SourceListView):
+    async def get(self, request, *args, **kwargs):
+        return Response(self.list_sources(await fetch_rows(self.get_queryset())))
+
+
+class AsyncScoreRangeView(AsyncAPIView, ScoreRangeView):
+    async def get(self, request, *args, **kwargs):
+        return Response(await fetch_aggregate(self.get_queryset(), **self.aggregates))
+
+
+class AsyncDateRangeView(AsyncAPIView, DateRangeView):
+    async def get(self, request, *args, **kwargs):
+        return Response(await fetch_aggregate(self.get_queryset(), **self.aggregates))
+
+
+class AsyncSourceCountView(AsyncAPIView, SourceCountView):
+    async def get(self, request, *args, **kwargs):
+        try:
+            min_score, max_score = self.get_score_range()
+        except ValueError:
+            return Response({'error': 'min_score and max_score must be integers'}, status=400)
+        return Response(self.count_sources(await fetch_rows(self.get_queryset()), min_score, max_score))
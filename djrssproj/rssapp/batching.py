@@ -0,0 +1,95 @@
+# rssapp/batching.py
+import logging
+import threading
+from concurrent.futures import Future
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class BatchBuffer:
+    """
+    Thread-safe buffer that collects items and hands them to a flush callback in batches.
+
+    A batch is flushed as soon as adding another item would push it past max_weight or
+    max_items, or max_wait seconds after its first item arrived, whichever comes first.
+    An item heavier than max_weight on its own is flushed as a batch of one.
+
+    add() returns the futures of the batches its items landed in; each resolves to the
+    return value of the flush callback, or to the exception it raised.
+    """
+    def __init__(self, flush, max_weight, max_wait, weight=None, max_items=None):
+        self._flush = flush
+        self.max_weight = max_weight
+        self.max_wait = max_wait
+        self.max_items = max_items
+        self._weight = weight or (lambda item: 1)
+        self._lock = threading.Lock()
+        self._items = []
+        self._total = 0
+        self._future = Future()
+        self._timer = None
+
+    def add(self, items):
+        """Add items to the buffer, flushing every batch that fills up."""
+        full_batches = []
+        futures = []
+        with self._lock:
+            for item in items:
+                weight = self._weight(item)
+                if self._items and (self._total + weight > self.max_weight or self._is_full()):
+                    full_batches.append(self._take())
+                self._items.append(item)
+                self._total += weight
+                if not futures or futures[-1] is not self._future:
+                    futures.append(self._future)
+            if self._total >= self.max_weight or self._is_full():
+                full_batches.append(self._take())
+            elif self._items and self._timer is None:
+                # Bound the latency of a partially filled batch
+                self._timer = threading.Timer(self.max_wait, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+        for batch, future in full_batches:
+            self._run(batch, future)
+        return futures
+
+    def flush(self):
+        """Flush whatever is buffered, regardless of size."""
+        with self._lock:
+            batch, future = self._take()
+        if batch:
+            self._run(batch, future)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"[BatchBuffer] Error flushing batch on timeout: {e}")
+        finally:
+            # Each timer runs on its own thread, close any database connection it opened
+            connections.close_all()
+
+    def _run(self, batch, future):
+        try:
+            result = self._flush(batch)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+
+    def _is_full(self):
+        return self.max_items is not None and len(self._items) >= self.max_items
+
+    def _take(self):
+        taken = (self._items, self._future)
+        self._items, self._total, self._future = [], 0, Future()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return taken
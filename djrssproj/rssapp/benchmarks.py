@@ -0,0 +1,160 @@
+# rssapp/benchmarks.py
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from xml.sax.saxutils import escape, quoteattr
+from aiohttp import web
+
+WORDS = ('africa', 'climate', 'election', 'market', 'vaccine', 'startup', 'drought', 'court', 'energy', 'football',
+         'minister', 'protest', 'satellite', 'bank', 'harvest', 'festival', 'parliament', 'ocean', 'refinery', 'rover')
+
+
+def synthetic_title(rng):
+    """A random headline-like title."""
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 12))).capitalize()
+
+
+def synthetic_articles(count, seed=0, sources=10):
+    """Generate article dicts shaped like process_feed output, with hashes unique to this call."""
+    rng = random.Random(seed)
+    run_id = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    articles = []
+    for i in range(count):
+        title = f"{synthetic_title(rng)} {run_id[:8]}-{i}"
+        source = f"Benchmark Source {i % sources}"
+        articles.append({
+            'hash': hashlib.md5(f"{run_id}-{i}".encode()).hexdigest(),
+            'publication_date': now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+            'title': title,
+            'author': 'Benchmark Author',
+            'link': f"https://benchmark.invalid/{run_id}/{i}",
+            'description': '<p>' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(40, 400))) + '</p>',
+            'image': None,
+            'source': source,
+            'source_url': 'https://benchmark.invalid/',
+            'source_image': '',
+        })
+    return articles
+
+
+def synthetic_feed(seed=0, entries=30, title=None):
+    """Generate an RSS 2.0 document with realistic entry markup (HTML descriptions, images, authors)."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    title = title or f"Benchmark Feed {seed}"
+    items = []
+    for i in range(entries):
+        published = now - timedelta(minutes=rng.randint(0, 60 * 24 * 14))
+        paragraphs = ''.join(f"<p>{' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 80)))}</p>"
+                             for _ in range(rng.randint(1, 6)))
+        description = f'<img src="https://benchmark.invalid/img/{seed}/{i}.jpg" alt="">{paragraphs}<br>'
+        items.append(
+            f"<item><title>{escape(synthetic_title(rng))} {seed}-{i}</title>"
+            f"<link>https://benchmark.invalid/{seed}/{i}</link>"
+            f"<guid>https://benchmark.invalid/{seed}/{i}</guid>"
+            f"<dc:creator><![CDATA[Author {rng.randint(1, 50)}]]></dc:creator>"
+            f"<pubDate>{format_datetime(published)}</pubDate>"
+            f"<description>{escape(description)}</description></item>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/"><channel>'
+        f"<title>{escape(title)}</title><link>https://benchmark.invalid/{seed}</link>"
+        f"<image><url>https://benchmark.invalid/{seed}/logo.png</url></image>"
+        f"{''.join(items)}</channel></rss>"
+    )
+
+
+def load_corpus(directory):
+    """Load a saved corpus of feed documents as (file name, bytes) pairs."""
+    names = sorted(name for name in os.listdir(directory) if not name.startswith('.'))
+    corpus = []
+    for name in names:
+        with open(os.path.join(directory, name), 'rb') as f:
+            corpus.append((name, f.read()))
+    return corpus
+
+
+def synthetic_opml(urls):
+    """An OPML document listing the given feed URLs."""
+    outlines = ''.join(f'<outline type="rss" text="Feed {i}" xmlUrl={quoteattr(url)}/>' for i, url in enumerate(urls))
+    return f'<?xml version="1.0" encoding="UTF-8"?><opml version="2.0"><body>{outlines}</body></opml>'
+
+
+class BenchmarkServer:
+    """
+    HTTP server on a local address standing in for feed hosts and the OpenAI chat completions API, run on its own thread.
+
+    Feeds are served from /feeds/<name> with a random latency in feed_latency seconds, gzip-compressed when
+    the client accepts it. /v1/chat/completions answers a scoring request with a random score for every
+    hash in the titles, after a random latency in llm_latency seconds, shaped like the real API's reply.
+    """
+    TITLE_HASH_RE = re.compile(r'Hash \("id"\): `([0-9a-f]{32})`')
+
+    def __init__(self, feeds, feed_latency=(0.02, 0.2), llm_latency=(0.3, 1.5), seed=0, host='127.0.0.1'):
+        self.feeds = feeds
+        self.host = host
+        self.feed_latency = feed_latency
+        self.llm_latency = llm_latency
+        self.rng = random.Random(seed)
+        self.feed_requests = 0
+        self.llm_requests = 0
+        self.llm_titles = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._runner = None
+        self.base_url = None
+
+    def start(self):
+        """Start serving on a free local port and return the base URL."""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self.base_url
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def _start(self):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get('/feeds/{name}', self._feed)
+        app.router.add_post('/v1/chat/completions', self._chat_completion)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, 0)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+
+    async def _feed(self, request):
+        self.feed_requests += 1
+        await asyncio.sleep(self.rng.uniform(*self.feed_latency))
+        body = self.feeds.get(request.match_info['name'])
+        if body is None:
+            raise web.HTTPNotFound()
+        response = web.Response(body=body, content_type='application/rss+xml')
+        response.enable_compression()
+        return response
+
+    async def _chat_completion(self, request):
+        data = await request.json()
+        hashes = self.TITLE_HASH_RE.findall(data['messages'][-1]['content'])
+        self.llm_requests += 1
+        self.llm_titles += len(hashes)
+        await asyncio.sleep(self.rng.uniform(*self.llm_latency))
+        rankings = {'articles': [{'id': article_hash, 'score': self.rng.randint(0, 100)} for article_hash in hashes]}
+        return web.json_response({
+            'object': 'chat.completion',
+            'model': data.get('model'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': f"```json\n{json.dumps(rankings)}```"}}],
+        })
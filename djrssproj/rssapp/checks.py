@@ -0,0 +1,42 @@
+# rssapp/checks.py
+# System checks, run by manage.py check and before migrate. Every service runs
+# "manage.py check --database default" before it starts (Configuration/), so a connection budget the server
+# cannot hold stops the deployment instead of failing requests with "too many clients" under load.
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.db import DatabaseError, connections
+
+
+def planned_connections():
+    """Connections the processes of DB_CONNECTION_BUDGET may hold together."""
+    return sum(role['processes'] * (role['pool'] + role.get('async_pool', 0))
+               for role in settings.DB_CONNECTION_BUDGET.values())
+
+
+@register()
+def check_process_role(app_configs, **kwargs):
+    if settings.DB_PROCESS_ROLE not in settings.DB_CONNECTION_BUDGET:
+        return [Error(f"DB_PROCESS_ROLE {settings.DB_PROCESS_ROLE!r} is not a key of DB_CONNECTION_BUDGET.",
+                      hint=f"Use one of {', '.join(settings.DB_CONNECTION_BUDGET)}.", id='rssapp.E002')]
+    return []
+
+
+@register(Tags.database)
+def check_connection_budget(app_configs, databases=None, **kwargs):
+    if not databases or 'default' not in databases:
+        return []
+    try:
+        with connections['default'].cursor() as cursor:
+            # Connections left to non-superusers; reserved_connections exists from PostgreSQL 16
+            cursor.execute("SELECT current_setting('max_connections')::int "
+                           "- current_setting('superuser_reserved_connections')::int "
+                           "- coalesce(current_setting('reserved_connections', true)::int, 0)")
+            available, = cursor.fetchone()
+    except DatabaseError as e:
+        return [Error(f"Could not read max_connections: {e}", id='rssapp.E001')]
+    planned = planned_connections()
+    if planned > available:
+        return [Error(f"DB_CONNECTION_BUDGET allows {planned} connections, the server accepts {available}.",
+                      hint="Lower the pool sizes or process counts of DB_CONNECTION_BUDGET, or raise the server's "
+                           "max_connections.", id='rssapp.E001')]
+    return []
@@ -0,0 +1,203 @@
+# rssapp/clustering.py
+import hashlib
+import logging
+import random
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from .ingest import update_scores
+from .models import Article, TitleBand
+from .partitions import add_months
+
+logger = logging.getLogger(__name__)
+
+# MinHash signature of NUM_BANDS bands of ROWS_PER_BAND values. Two titles with shingle Jaccard similarity s
+# share at least one band with probability 1 - (1 - s ** ROWS_PER_BAND) ** NUM_BANDS: 0.93 at s = 0.5, 0.42 at 0.3.
+# Changing these invalidates the stored bands.
+NUM_BANDS = 20
+ROWS_PER_BAND = 3
+NUM_PERMUTATIONS = NUM_BANDS * ROWS_PER_BAND
+SHINGLE_SIZE = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(NUM_PERMUTATIONS)]
+
+# Trailing " - Reuters" / " | BBC News" style outlet names that aggregators append to headlines
+SOURCE_SUFFIX_RE = re.compile(r'\s+[-|–—]\s+[^-|–—]{1,40}$')
+NON_WORD_RE = re.compile(r'[^\w\s]')
+
+
+def normalize_title(title):
+    """Lowercase a title and strip accents, punctuation and a trailing outlet name."""
+    title = SOURCE_SUFFIX_RE.sub('', title or '')
+    title = ''.join(char for char in unicodedata.normalize('NFKD', title) if not unicodedata.combining(char))
+    return ' '.join(NON_WORD_RE.sub(' ', title.lower()).split())
+
+
+def shingles(title):
+    """Character SHINGLE_SIZE-grams of a normalized title."""
+    text = normalize_title(title)
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a, b):
+    """Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minhash_signature(shingle_set):
+    """MinHash signature of a shingle set, one minimum per permutation."""
+    values = [int.from_bytes(hashlib.md5(shingle.encode()).digest()[:8], 'little') for shingle in shingle_set]
+    return [min((a * value + b) % _MERSENNE_PRIME for value in values) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature):
+    """Hash each band of a signature to a signed 64-bit key, distinct per band position."""
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.md5(f"{band}:{rows}".encode()).digest()
+        keys.append(int.from_bytes(digest[:8], 'big', signed=True))
+    return keys
+
+
+def window_start(now=None):
+    """Oldest publication date near-duplicates are looked for in."""
+    return (now or datetime.now(timezone.utc)) - timedelta(hours=settings.CLUSTER_WINDOW_HOURS)
+
+
+def assign_clusters(hashes):
+    """
+    Put newly inserted articles into near-duplicate clusters.
+
+    Each article joins the cluster of the most similar title published in the last CLUSTER_WINDOW_HOURS,
+    if its shingle similarity reaches CLUSTER_SIMILARITY_THRESHOLD, or starts a cluster of its own. Members
+    that join an already scored cluster get its score. Returns the hashes of the articles that joined an
+    existing cluster; they do not need to be scored.
+    """
+    start = window_start()
+    rows = list(Article.objects.filter(hash__in=list(hashes), publication_date__gte=start)
+                .values_list('id', 'hash', 'title', 'publication_date').order_by('publication_date', 'id'))
+    if not rows:
+        return set()
+
+    prepared = []
+    for article_id, article_hash, title, publication_date in rows:
+        title_shingles = shingles(title)
+        prepared.append((article_id, article_hash, publication_date, title_shingles,
+                         band_keys(minhash_signature(title_shingles))))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Batches clustered at the same time must see each other's bands, or two near-duplicates both start a
+        # cluster. A batch has NUM_BANDS band keys per article, too many to lock one by one within the server's
+        # lock table, so batches take turns; the signatures above are computed outside the lock.
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"{TitleBand._meta.db_table} clusters"])
+        clusters, joined, bands = match_clusters(prepared, start)
+        articles = [Article(id=article_id, cluster_id=clusters[article_hash][0],
+                            cluster_date=clusters[article_hash][1]) for article_id, article_hash, *_ in prepared]
+        Article.objects.bulk_update(articles, fields=['cluster_id', 'cluster_date'], batch_size=1000)
+        TitleBand.objects.bulk_create(bands, batch_size=1000)
+
+    copied = propagate_cluster_scores({clusters[article_hash][0] for article_hash in joined}) if joined else 0
+    logger.info(f"[assign_clusters] {len(joined)} of {len(prepared)} new articles joined an existing cluster, "
+                f"{copied} got a score without an LLM call")
+    return joined
+
+
+def match_clusters(prepared, start):
+    """
+    The (cluster_id, cluster_date) of each prepared article by hash, the hashes that joined an existing cluster,
+    and the TitleBand rows to store.
+    """
+    # Stored articles sharing a band with any of the new ones; their cluster is read from the articles
+    # themselves, so bands left behind by deleted articles match nothing
+    hashes_by_band = {}
+    for band, article_hash in (TitleBand.objects.filter(band__in={key for *_, keys in prepared for key in keys},
+                                                        publication_date__gte=start)
+                               .values_list('band', 'article_hash')):
+        hashes_by_band.setdefault(band, []).append(article_hash)
+    candidate_hashes = {article_hash for band_hashes in hashes_by_band.values() for article_hash in band_hashes}
+    shingles_by_hash = {}
+    clusters = {}
+    # Band rows carry their article's publication_date, so the candidates lie in the window's partitions too
+    stored = Article.objects.filter(hash__in=list(candidate_hashes), cluster_id__isnull=False,
+                                    publication_date__gte=start)
+    for article_hash, title, cluster_id, cluster_date in stored.values_list('hash', 'title', 'cluster_id',
+                                                                            'cluster_date'):
+        shingles_by_hash[article_hash] = shingles(title)
+        clusters[article_hash] = (cluster_id, cluster_date)
+
+    threshold = settings.CLUSTER_SIMILARITY_THRESHOLD
+    joined = set()
+    bands = []
+    for article_id, article_hash, publication_date, title_shingles, keys in prepared:
+        candidates = {candidate for key in keys for candidate in hashes_by_band.get(key, ()) if candidate in clusters}
+        best_cluster, best_similarity = None, threshold
+        for candidate_hash in candidates:
+            similarity = jaccard(title_shingles, shingles_by_hash[candidate_hash])
+            if similarity >= best_similarity:
+                best_cluster, best_similarity = clusters[candidate_hash], similarity
+        if best_cluster is None:
+            clusters[article_hash] = (article_id, publication_date)
+        else:
+            clusters[article_hash] = best_cluster
+            joined.add(article_hash)
+
+        # Later articles of the same batch can match this one
+        shingles_by_hash[article_hash] = title_shingles
+        for key in keys:
+            hashes_by_band.setdefault(key, []).append(article_hash)
+            bands.append(TitleBand(band=key, article_hash=article_hash, publication_date=publication_date))
+    return clusters, joined, bands
+
+
+def propagate_cluster_scores(cluster_ids=None):
+    """
+    Copy each scored cluster representative's score to its unscored members, for the given clusters or all.
+    Returns the number of members that got a score.
+    """
+    members = Article.objects.filter(score__isnull=True, cluster_id__isnull=False).exclude(id=F('cluster_id'))
+    if cluster_ids is not None:
+        members = members.filter(cluster_id__in=list(cluster_ids))
+    members = list(members.values_list('hash', 'cluster_id'))
+    if not members:
+        return 0
+    representative_scores = dict(Article.objects.filter(id__in={cluster_id for _, cluster_id in members},
+                                                        score__isnull=False).values_list('id', 'score'))
+    scores = [(article_hash, representative_scores[cluster_id]) for article_hash, cluster_id in members
+              if cluster_id in representative_scores]
+    return len(update_scores(scores)) if scores else 0
+
+
+def represented_clusters(hashes):
+    """Ids of the clusters represented by the articles with the given hashes."""
+    return set(Article.objects.filter(hash__in=list(hashes), cluster_id=F('id')).values_list('cluster_id', flat=True))
+
+
+def representative_filter(archived_months=()):
+    """
+    Articles outside any cluster, first in their cluster, or left without their cluster's first article. The
+    first article is looked up by its publication_date too, so only the partition of its month is read. One
+    published in archived_months (rssapp/archive.py) is still stored, though no longer in the table.
+    """
+    left = ~Exists(Article.objects.filter(id=OuterRef('cluster_id'), publication_date=OuterRef('cluster_date')))
+    for month in archived_months:
+        left &= ~Q(cluster_date__gte=month, cluster_date__lt=add_months(month, 1))
+    return Q(cluster_id__isnull=True) | Q(cluster_id=F('id')) | left
+
+
+def prune_title_bands(now=None):
+    """Drop the bands of articles that fell out of the clustering window."""
+    deleted, _ = TitleBand.objects.filter(publication_date__lt=window_start(now)).delete()
+    if deleted:
+        logger.info(f"[prune_title_bands] Deleted {deleted} title bands older than {settings.CLUSTER_WINDOW_HOURS}h")
+    return deleted
@@ -0,0 +1,99 @@
+# rssapp/db_backend/base.py
+# Django's PostgreSQL backend with connections borrowed from a bounded psycopg_pool.ConnectionPool per process.
+# connection.close() gives the connection back to the pool instead of closing it, so the close-per-task
+# signal handlers of the Celery worker no longer cost a new Postgres connection per task, and a burst of
+# threads waits for a free connection instead of exhausting max_connections.
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base, creation
+from django.utils.asyncio import async_unsafe
+from ..metrics import DB_POOL_WAIT_SECONDS, observe_pool
+
+try:
+    from psycopg import IsolationLevel
+    from psycopg_pool import ConnectionPool
+except ImportError as e:
+    raise ImproperlyConfigured(f"rssapp.db_backend requires psycopg 3 and psycopg_pool: {e}")
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def close_pools(name):
+    """Close this process's pools of the database with the given name."""
+    pid = os.getpid()
+    with _pools_lock:
+        keys = [key for key in _pools if key[0] == pid and key[2] == name]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections to the test database would keep it from being dropped
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        """
+        The pool of this database in the current process. Pools are keyed by process so a forked worker never
+        reuses its parent's connections, and by database name so the test database gets its own.
+        """
+        key = (os.getpid(), self.alias, self.settings_dict['NAME'])
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(
+                    kwargs=conn_params,
+                    min_size=settings.DB_POOL_MIN_SIZE,
+                    max_size=settings.DB_POOL_MAX_SIZE,
+                    timeout=settings.DB_POOL_TIMEOUT,
+                    max_idle=settings.DB_POOL_MAX_IDLE,
+                    max_lifetime=settings.DB_POOL_MAX_LIFETIME,
+                    # A connection is checked before it is handed out, so one the server dropped is replaced
+                    check=ConnectionPool.check_connection,
+                    name=self.alias,
+                    open=True,
+                )
+                _pools[key] = pool
+        return pool
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        started = time.perf_counter()
+        try:
+            # Raises PoolTimeout, an OperationalError, after DB_POOL_TIMEOUT seconds without a free connection
+            connection = pool.getconn()
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(self.alias).observe(time.perf_counter() - started)
+            observe_pool(self.alias, pool.get_stats())
+
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        try:
+            self.isolation_level = IsolationLevel(isolation_level or IsolationLevel.READ_COMMITTED)
+        except ValueError:
+            pool.putconn(connection)
+            raise ImproperlyConfigured(f"Invalid transaction isolation level {isolation_level} specified.")
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            pool = self.connection._pool
+            with self.wrap_database_errors:
+                # The pool rolls back an open transaction and discards a broken connection
+                pool.putconn(self.connection)
+            observe_pool(self.alias, pool.get_stats())
+            # The connection belongs to the pool again, even when closed inside an atomic block
+            self.connection = None
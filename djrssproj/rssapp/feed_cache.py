@@ -0,0 +1,81 @@
+# rssapp/feed_cache.py
+import hashlib
+import logging
+from datetime import datetime, timezone
+from .models import FeedState
+
+logger = logging.getLogger(__name__)
+
+
+def load_feed_states(urls):
+    """Load the stored HTTP cache state for the given feed URLs, keyed by URL."""
+    return {state.xml_url: state for state in FeedState.objects.filter(xml_url__in=list(urls))}
+
+
+def conditional_headers(state):
+    """Build If-None-Match/If-Modified-Since headers from a feed's stored state."""
+    headers = {}
+    if state is None:
+        return headers
+    if state.etag:
+        headers['If-None-Match'] = state.etag
+    if state.last_modified:
+        headers['If-Modified-Since'] = state.last_modified
+    return headers
+
+
+def body_digest(body):
+    """Digest of a feed body, used to detect unchanged feeds served without validators."""
+    if isinstance(body, str):
+        body = body.encode()
+    return hashlib.md5(body).hexdigest()
+
+
+def refresh_feed_state(states, url, headers, body):
+    """
+    Update the in-memory state for a fetched feed and report whether its body changed.
+    The caller is responsible for saving the states with save_feed_states.
+    """
+    digest = body_digest(body)
+    state = get_feed_state(states, url)
+    changed = state.digest != digest
+
+    state.etag = headers.get('ETag')
+    state.last_modified = headers.get('Last-Modified')
+    state.digest = digest
+    state.last_fetched = datetime.now(timezone.utc)
+    return changed
+
+
+def get_feed_state(states, url):
+    """Get the in-memory state for a feed, adding a new one if it has none yet."""
+    state = states.get(url)
+    if state is None:
+        state = states[url] = FeedState(xml_url=url)
+    return state
+
+
+def forget_feed_body(states, url):
+    """Drop the stored validators and digest so the feed is downloaded and processed in full next time."""
+    state = get_feed_state(states, url)
+    state.etag = state.last_modified = state.digest = None
+
+
+def touch_feed_state(states, url):
+    """Record a 304 Not Modified response for a feed."""
+    state = states.get(url)
+    if state is not None:
+        state.last_fetched = datetime.now(timezone.utc)
+
+
+def save_feed_states(states):
+    """Upsert the given feed states in a single statement."""
+    if not states:
+        return
+    FeedState.objects.bulk_create(
+        list(states.values()),
+        update_conflicts=True,
+        unique_fields=['xml_url'],
+        update_fields=['etag', 'last_modified', 'digest', 'last_fetched', 'source', 'poll_interval', 'next_poll',
+                       'consecutive_failures'],
+    )
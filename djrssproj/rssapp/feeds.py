@@ -0,0 +1,126 @@
+# rssapp/feeds.py
+# The feed registry: the Feed table mirrors the OPML file through sync_feeds, and the fetch tasks are
+# dispatched with feed ids instead of the OPML document.
+import logging
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from datetime import datetime, timezone
+from django.db import transaction
+from django.db.models import F
+from .models import Feed
+
+logger = logging.getLogger(__name__)
+
+OPMLFeed = namedtuple('OPMLFeed', ['xml_url', 'title', 'html_url', 'category'])
+
+
+def outline_title(outline):
+    return outline.get('title') or outline.get('text') or None
+
+
+def parse_opml(content):
+    """
+    Feeds of an OPML document (text or bytes) in document order, each with the title of the outline it is
+    nested in as its category. A URL listed twice keeps its first entry.
+    """
+    root = ET.fromstring(content)
+    feeds = {}
+
+    def walk(element, category):
+        for outline in element.findall('outline'):
+            xml_url = outline.get('xmlUrl')
+            if xml_url:
+                feeds.setdefault(xml_url, OPMLFeed(xml_url, outline_title(outline), outline.get('htmlUrl') or None,
+                                                   category))
+            else:
+                walk(outline, outline_title(outline) or category)
+
+    body = root.find('body')
+    walk(body if body is not None else root, None)
+    return list(feeds.values())
+
+
+class FeedSync:
+    """URLs added, re-enabled, disabled, moved to another category and retitled by a sync."""
+    def __init__(self):
+        self.added = []
+        self.enabled = []
+        self.disabled = []
+        self.recategorized = []
+        self.retitled = []
+
+    def __str__(self):
+        return ', '.join(f"{len(urls)} {name}" for name, urls in vars(self).items())
+
+
+def sync_feeds(entries, dry_run=False):
+    """
+    Bring the Feed table in line with a list of OPMLFeed: add new feeds, re-enable listed feeds that were
+    disabled, disable feeds that are no longer listed and update categories and titles. Returns a FeedSync;
+    with dry_run nothing is written.
+    """
+    entries = {entry.xml_url: entry for entry in entries}
+    now = datetime.now(timezone.utc)
+    sync = FeedSync()
+    with transaction.atomic():
+        existing = {feed.xml_url: feed for feed in Feed.objects.select_for_update()}
+        changed = []
+        for url, feed in existing.items():
+            entry = entries.get(url)
+            if entry is None:
+                if feed.enabled:
+                    feed.enabled, feed.disabled_since = False, now
+                    sync.disabled.append(url)
+                    changed.append(feed)
+                continue
+
+            dirty = False
+            if not feed.enabled:
+                feed.enabled, feed.disabled_since = True, None
+                sync.enabled.append(url)
+                dirty = True
+            if feed.category != entry.category:
+                feed.category = entry.category
+                sync.recategorized.append(url)
+                dirty = True
+            if (feed.title, feed.html_url) != (entry.title, entry.html_url):
+                feed.title, feed.html_url = entry.title, entry.html_url
+                sync.retitled.append(url)
+                dirty = True
+            if dirty:
+                changed.append(feed)
+
+        new = [Feed(xml_url=url, title=entry.title, html_url=entry.html_url, category=entry.category)
+               for url, entry in entries.items() if url not in existing]
+        sync.added = [feed.xml_url for feed in new]
+        if not dry_run:
+            Feed.objects.bulk_create(new, batch_size=1000)
+            Feed.objects.bulk_update(changed, fields=['enabled', 'disabled_since', 'category', 'title', 'html_url'],
+                                     batch_size=1000)
+    if not dry_run:
+        logger.info(f"[sync_feeds] {sync}")
+    return sync
+
+
+def enabled_feeds(feed_ids=None):
+    """
+    The enabled feeds with the given ids, or every enabled feed. feed_ids may also be an OPML document, as
+    queued by older versions of download_rss_feeds; its feeds are then looked up by URL.
+    """
+    feeds = Feed.objects.filter(enabled=True)
+    if isinstance(feed_ids, (str, bytes)):
+        feeds = feeds.filter(xml_url__in=[entry.xml_url for entry in parse_opml(feed_ids)])
+    elif feed_ids is not None:
+        feeds = feeds.filter(id__in=list(feed_ids))
+    return list(feeds.only('id', 'xml_url').order_by('id'))
+
+
+def count_feed_articles(feed_id, count):
+    """Add newly inserted articles to a feed's article count."""
+    Feed.objects.filter(id=feed_id).update(article_count=F('article_count') + count)
+
+
+def count_feed_errors(urls):
+    """Add one failed fetch or parse to the error count of each feed."""
+    if urls:
+        Feed.objects.filter(xml_url__in=list(urls)).update(error_count=F('error_count') + 1)
@@ -0,0 +1,129 @@
+# rssapp/fetcher.py
+import asyncio
+import logging
+import time
+from collections import defaultdict
+
+import aiohttp
+
+from .metrics import observe_fetch, url_host
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of feed requests in flight at once
+MAX_CONCURRENT_FETCHES = 50
+# Keep-alive connections kept per host (several feeds share a host, e.g. feedburner)
+MAX_CONNECTIONS_PER_HOST = 4
+# Per-feed timeout in seconds, counted from when the feed gets its connection slots
+FETCH_TIMEOUT = 10
+
+# aiohttp only decodes brotli bodies when a brotli package is installed
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+USER_AGENT = 'djrssproj/1.0 (+feed fetcher)'
+
+
+class FetchResult:
+    """The outcome of fetching a single feed."""
+    def __init__(self, url, status=None, body=None, headers=None, error=None):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None and self.status is not None and 200 <= self.status < 300
+
+    @property
+    def not_modified(self):
+        return self.error is None and self.status == 304
+
+
+class FetchStats:
+    """Counters for a single fetch run."""
+    def __init__(self):
+        self.feeds = 0
+        self.failed = 0
+        self.not_modified = 0
+        self.bytes_transferred = 0
+        self.bytes_decoded = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def feeds_per_second(self):
+        return self.feeds / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (f"{self.feeds} feeds ({self.not_modified} not modified, {self.failed} failed) in {self.elapsed:.2f}s "
+                f"({self.feeds_per_second:.1f} feeds/s), {self.bytes_transferred} bytes transferred, "
+                f"{self.bytes_decoded} bytes decoded")
+
+
+async def fetch_one(session, semaphore, host_semaphore, url, stats, timeout, headers=None):
+    """
+    Fetch a single feed on a shared session, bounded by the global and the per-host semaphore. The timeout
+    starts once both are held, so time spent queued behind other feeds of the same host does not count.
+    """
+    async with host_semaphore, semaphore:
+        started = time.perf_counter()
+        try:
+            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                body = await response.read()
+                response.raise_for_status()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            stats.feeds += 1
+            stats.failed += 1
+            observe_fetch(url, time.perf_counter() - started, 'error')
+            return FetchResult(url, error=str(e) or e.__class__.__name__)
+        elapsed = time.perf_counter() - started
+
+    stats.feeds += 1
+    if response.status == 304:
+        stats.not_modified += 1
+    # Content-Length is the compressed size on the wire; fall back to the body size for chunked responses
+    size = response.content_length or len(body)
+    stats.bytes_transferred += size
+    stats.bytes_decoded += len(body)
+    observe_fetch(url, elapsed, 'not_modified' if response.status == 304 else 'ok', size=size)
+    return FetchResult(url, status=response.status, body=body, headers=response.headers.copy())
+
+
+async def fetch_all(urls, concurrency=MAX_CONCURRENT_FETCHES, timeout=FETCH_TIMEOUT, headers_by_url=None):
+    """
+    Fetch all URLs concurrently over pooled keep-alive connections.
+    headers_by_url optionally maps a URL to extra request headers, e.g. conditional GET validators.
+    """
+    headers_by_url = headers_by_url or {}
+    stats = FetchStats()
+    semaphore = asyncio.Semaphore(concurrency)
+    # Taken before the global semaphore, so feeds waiting for a busy host do not hold slots other hosts could use,
+    # and a request never waits inside the connector for a connection
+    host_semaphores = defaultdict(lambda: asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST))
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=MAX_CONNECTIONS_PER_HOST, ttl_dns_cache=300)
+    headers = {'Accept-Encoding': ACCEPT_ENCODING, 'User-Agent': USER_AGENT}
+
+    async with aiohttp.ClientSession(connector=connector, headers=headers) as session:
+        results = await asyncio.gather(*(fetch_one(session, semaphore, host_semaphores[url_host(url)], url, stats,
+                                                   timeout, headers_by_url.get(url)) for url in urls))
+
+    stats.finish()
+    return results, stats
+
+
+def fetch_feeds(urls, concurrency=MAX_CONCURRENT_FETCHES, timeout=FETCH_TIMEOUT, headers_by_url=None):
+    """Fetch a batch of feeds in one event loop and return (results, stats)."""
+    return asyncio.run(fetch_all(list(urls), concurrency=concurrency, timeout=timeout, headers_by_url=headers_by_url))
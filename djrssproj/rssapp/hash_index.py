@@ -0,0 +1,141 @@
+# rssapp/hash_index.py
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'DJRSBLM1'
+# magic, number of bits, number of hash functions, capacity, items added
+HEADER = struct.Struct('<8sQQQQ')
+
+
+class BloomFilter:
+    """
+    Bloom filter over article hashes, stored in a memory-mapped file shared by every process on the host.
+
+    Membership checks cost a fixed number of bit probes regardless of how many articles are stored.
+    A false positive skips a new article, so the filter is sized for a very low error rate; a false
+    negative (e.g. two processes racing on the same byte) only sends a known article on to
+    insert_articles_to_db, where the hash registry still rejects it.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, self.num_bits, self.num_hashes, self.capacity, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an article hash index")
+        self.inode = os.fstat(self._file.fileno()).st_ino
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, path, capacity, error_rate):
+        """Create an empty filter file sized for capacity items at the given false positive rate."""
+        capacity = max(int(capacity), 1)
+        num_bits = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        num_hashes = max(int(round(num_bits / capacity * math.log(2))), 1)
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, num_bits, num_hashes, capacity, 0))
+            f.truncate(HEADER.size + (num_bits + 7) // 8)
+        return cls(path)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    @property
+    def count(self):
+        return HEADER.unpack_from(self._map, 0)[4]
+
+    def _positions(self, article_hash):
+        # Article hashes are MD5 hex digests; use the two halves for double hashing
+        if len(article_hash) != 32:
+            article_hash = hashlib.md5(article_hash.encode()).hexdigest()
+        h1 = int(article_hash[:16], 16)
+        h2 = int(article_hash[16:], 16) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, article_hash):
+        data = self._map
+        return all(data[HEADER.size + (pos >> 3)] & (1 << (pos & 7)) for pos in self._positions(article_hash))
+
+    def add(self, article_hash):
+        self.update([article_hash])
+
+    def update(self, article_hashes):
+        """Add article hashes to the filter."""
+        data = self._map
+        added = 0
+        with self._lock:
+            for article_hash in article_hashes:
+                new = False
+                for pos in self._positions(article_hash):
+                    offset = HEADER.size + (pos >> 3)
+                    bit = 1 << (pos & 7)
+                    if not data[offset] & bit:
+                        data[offset] |= bit
+                        new = True
+                added += new
+            if added:
+                count = self.count + added
+                struct.pack_into('<Q', data, HEADER.size - 8, count)
+                if count > self.capacity >= count - added:
+                    logger.warning(f"[hash_index] {self.path} holds more than its capacity of {self.capacity}"
+                                   f" hashes; run 'rebuild_hash_index' to resize it")
+
+
+def build_hash_index(path=None, capacity=None):
+    """
+    Build a new index from the article hash registry, which also holds the hashes of detached partitions, and
+    atomically swap it into place.
+    """
+    from .models import ArticleHash
+
+    path = path or settings.HASH_INDEX_PATH
+    hashes = ArticleHash.objects.values_list('hash', flat=True)
+    # Leave room to grow before the false positive rate degrades
+    capacity = max(capacity or settings.HASH_INDEX_CAPACITY, hashes.count() * 2)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    index = BloomFilter.create(tmp_path, capacity, settings.HASH_INDEX_ERROR_RATE)
+    try:
+        index.update(hashes.iterator(chunk_size=10000))
+        index._map.flush()
+    finally:
+        index.close()
+    os.replace(tmp_path, path)
+    logger.info(f"[hash_index] Built {path} with capacity {capacity}")
+    return BloomFilter(path)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_hash_index():
+    """
+    Get this process's handle on the shared article hash index, building it from the database
+    if it does not exist yet and reopening it if it was rebuilt by another process.
+    """
+    global _index
+    path = settings.HASH_INDEX_PATH
+    with _index_lock:
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            inode = None
+
+        if _index is not None and _index.inode == inode:
+            return _index
+        # The previous handle is left for the garbage collector, other threads may still be reading it
+        _index = BloomFilter(path) if inode is not None else build_hash_index(path)
+        return _index
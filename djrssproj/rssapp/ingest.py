@@ -0,0 +1,151 @@
+# rssapp/ingest.py
+import logging
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from .models import Article, ArticleHash
+from .page_cache import ARTICLES, bump_generation
+from .partitions import ensure_partitions
+from .source_stats import record_inserted, record_score_changes
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement, keeps the parameter count well below the protocol limit of 65535
+BULK_INSERT_CHUNK_SIZE = 1000
+
+ARTICLE_FIELDS = ['hash', 'publication_date', 'title', 'link', 'source', 'author', 'description', 'image',
+                  'source_url', 'source_image']
+
+
+def insert_articles(articles):
+    """
+    Insert a batch of article dicts, skipping hashes that already exist.
+    Returns the set of hashes that were actually inserted.
+    """
+    if connection.vendor != 'postgresql':
+        return insert_articles_rowwise(articles)
+    try:
+        return bulk_insert_articles(articles)
+    except DatabaseError as e:
+        # A single bad row fails the whole statement; retry row by row so the rest still go in
+        logger.error(f"[ingest] Bulk insert of {len(articles)} articles failed, falling back to per-row inserts: {e}")
+        return insert_articles_rowwise(articles)
+
+
+def bulk_insert_articles(articles):
+    """
+    Insert a batch with INSERT ... RETURNING hash (PostgreSQL only). The hash registry trigger skips rows whose
+    hash already exists, as ON CONFLICT (hash) DO NOTHING did before articles was partitioned.
+    """
+    # Keep the first occurrence of each hash within the batch
+    unique_articles = list({article['hash']: article for article in reversed(articles)}.values())[::-1]
+    if not unique_articles:
+        return set()
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(Article._meta.get_field(name).column) for name in ARTICLE_FIELDS)
+    row_placeholder = '(' + ', '.join(['%s'] * len(ARTICLE_FIELDS)) + ')'
+    hash_column = quote(Article._meta.get_field('hash').column)
+
+    ensure_partitions(article['publication_date'] for article in unique_articles)
+    inserted = set()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT set_config('rssapp.skip_duplicate_hashes', 'on', true)")
+        for start in range(0, len(unique_articles), BULK_INSERT_CHUNK_SIZE):
+            chunk = unique_articles[start:start + BULK_INSERT_CHUNK_SIZE]
+            sql = (f"INSERT INTO {quote(Article._meta.db_table)} ({columns}) "
+                   f"VALUES {', '.join([row_placeholder] * len(chunk))} RETURNING {hash_column}")
+            params = [article.get(name) for article in chunk for name in ARTICLE_FIELDS]
+            cursor.execute(sql, params)
+            inserted.update(row[0] for row in cursor.fetchall())
+        if inserted:
+            record_inserted([article for article in unique_articles if article['hash'] in inserted])
+            bump_generation(ARTICLES)
+    return inserted
+
+
+def insert_articles_rowwise(articles):
+    """Insert a batch one row at a time with get_or_create, each in its own transaction."""
+    inserted = set()
+    for article_data in articles:
+        try:
+            with transaction.atomic():
+                _, created = Article.objects.get_or_create(
+                    hash=article_data['hash'],
+                    defaults=article_data
+                )
+                if created:
+                    record_inserted([article_data])
+                    bump_generation(ARTICLES)
+            if created:
+                inserted.add(article_data['hash'])
+        except IntegrityError as e:
+            logger.error(f"[ingest] Error inserting article {article_data['hash']}: {e}")
+    return inserted
+
+
+def update_scores(scores):
+    """
+    Write a batch of (hash, score) pairs, the last pair winning for a repeated hash.
+    Returns the set of hashes that matched an article.
+    """
+    scores = dict(scores)
+    if not scores:
+        return set()
+    if connection.vendor != 'postgresql':
+        return update_scores_orm(scores)
+
+    quote = connection.ops.quote_name
+    table = quote(Article._meta.db_table)
+    hash_column = quote(Article._meta.get_field('hash').column)
+    score_column = quote(Article._meta.get_field('score').column)
+
+    source_column = quote(Article._meta.get_field('source').column)
+    id_column = quote(Article._meta.pk.column)
+    date_column = quote(Article._meta.get_field('publication_date').column)
+    registry = quote(ArticleHash._meta.db_table)
+
+    updated = set()
+    changes = []
+    items = list(scores.items())
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(items), BULK_INSERT_CHUNK_SIZE):
+            chunk = items[start:start + BULK_INSERT_CHUNK_SIZE]
+            # Only the score column is written, the rest of the row (e.g. description) is left alone.
+            # The self-join reads the row as it was before the update, for the source statistics. The
+            # publication_date from the hash registry lets each lookup skip the partitions of other months.
+            sql = (f"UPDATE {table} AS a SET {score_column} = v.score "
+                   f"FROM (VALUES {', '.join(['(%s, %s::integer)'] * len(chunk))}) AS v(hash, score) "
+                   f"JOIN {registry} AS h ON h.hash = v.hash, {table} AS old "
+                   f"WHERE a.{hash_column} = v.hash AND a.{date_column} = h.publication_date "
+                   f"AND old.{id_column} = a.{id_column} AND old.{date_column} = a.{date_column} "
+                   f"RETURNING a.{hash_column}, a.{source_column}, old.{score_column}, a.{score_column}")
+            cursor.execute(sql, [value for pair in chunk for value in pair])
+            for hash_value, source, old_score, new_score in cursor.fetchall():
+                updated.add(hash_value)
+                changes.append((source, old_score, new_score))
+        if updated:
+            record_score_changes(changes)
+            bump_generation(ARTICLES)
+    return updated
+
+
+def mark_score_requested(hashes, now):
+    """Record that the articles with the given hashes were queued for scoring at now."""
+    hashes = list(hashes)
+    for start in range(0, len(hashes), BULK_INSERT_CHUNK_SIZE):
+        Article.objects.filter(hash__in=hashes[start:start + BULK_INSERT_CHUNK_SIZE]).update(score_requested=now)
+
+
+def update_scores_orm(scores):
+    """Write a dict of hash -> score with bulk_update, for backends without UPDATE ... FROM (VALUES ...)."""
+    with transaction.atomic():
+        articles = list(Article.objects.select_for_update().filter(hash__in=list(scores))
+                        .only('id', 'hash', 'source', 'score'))
+        changes = []
+        for article in articles:
+            changes.append((article.source, article.score, scores[article.hash]))
+            article.score = scores[article.hash]
+        Article.objects.bulk_update(articles, fields=['score'], batch_size=BULK_INSERT_CHUNK_SIZE)
+        if articles:
+            record_score_changes(changes)
+            bump_generation(ARTICLES)
+    return {article.hash for article in articles}
@@ -0,0 +1,43 @@
+# djrssproj/rssapp/management/commands/archive_articles.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from rssapp.archive import DATE_COLUMNS, archive_month, lookup, months_to_archive, segment_path
+from rssapp.partitions import partition_name
+from rssapp.renderers import encode_json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = (f'Move the articles of every month that ended more than ARTICLE_ARCHIVE_HORIZON_DAYS '
+            f'({settings.ARTICLE_ARCHIVE_HORIZON_DAYS}) days ago from the articles table to compressed segments in '
+            f'ARTICLE_ARCHIVE_DIR. The article list and export read them back for date ranges that reach them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the months that would be archived')
+        parser.add_argument('--lookup', metavar='HASH', help='Print the archived article with this hash and exit')
+
+    def handle(self, *args, **options):
+        if options['lookup']:
+            row = lookup(options['lookup'])
+            if row is None:
+                raise CommandError(f"No archived article has the hash {options['lookup']}")
+            self.stdout.write(encode_json({**row, **{name: row[name].isoformat() for name in DATE_COLUMNS if row.get(name)}}))
+            return
+
+        months = months_to_archive()
+        if not months:
+            self.stdout.write(f"No months ended more than {settings.ARTICLE_ARCHIVE_HORIZON_DAYS} days ago")
+            return
+        for month in months:
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {partition_name(month)}")
+                continue
+            try:
+                count = archive_month(month)
+            except (OperationalError, ValueError) as e:
+                raise CommandError(f"Could not archive {partition_name(month)}: {e}")
+            self.stdout.write(f"Archived {count} articles of {partition_name(month)} to {segment_path(month)} "
+                              f"({os.path.getsize(segment_path(month)) / 1024 / 1024:.1f} MiB)")
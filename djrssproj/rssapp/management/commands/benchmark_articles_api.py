@@ -0,0 +1,87 @@
+# djrssproj/rssapp/management/commands/benchmark_articles_api.py
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+from rssapp.benchmarks import synthetic_articles
+from rssapp.ingest import insert_articles, update_scores
+from rssapp.models import Article
+from rssapp.source_stats import delete_articles
+from rssapp.views import ArticleListView
+import json
+import random
+import time
+import uuid
+
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+class Command(BaseCommand):
+    help = ('Compare the serializer and fast /api/articles/ rendering paths at page sizes of 10, 100 and 1000 on '
+            'synthetic articles, checking that both return the same bytes. Inserted rows are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=3000, help='Number of synthetic articles')
+        parser.add_argument('--sizes', default='10,100,1000', help='Comma-separated page sizes (the i parameter)')
+        parser.add_argument('--repeat', type=int, default=20, help='Requests per measurement')
+        parser.add_argument('--fields', action='append', default=None,
+                            help='fields parameter to measure, repeatable (default: full and compact)')
+        parser.add_argument('--timezone', default='Africa/Nairobi', help='timezone parameter of the requests')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        run_source = f"Benchmark API {uuid.uuid4().hex[:8]}"
+        articles = synthetic_articles(options['rows'])
+        for i, article in enumerate(articles):
+            article['source'] = f"{run_source} {i % 10}"
+            if i % 7 == 0:
+                # Exercise non-ASCII output and the characters DRF escapes
+                article['title'] += ' – Nairobi ✓  '
+        insert_articles(articles)
+        update_scores([(article['hash'], rng.randint(0, 100)) for article in articles])
+
+        sources = ','.join(f"{run_source} {i}" for i in range(10))
+        self.stdout.write(f"{options['rows']} articles, {options['repeat']} requests per measurement")
+        self.stdout.write(f"{'page size':>9} {'sort':>5} {'fields':>10} {'bytes':>9} {'serializer ms':>14} {'fast ms':>8} "
+                          f"{'speedup':>8}")
+        try:
+            with override_settings(CACHES=NO_CACHE):
+                for size in [int(size) for size in options['sizes'].split(',')]:
+                    for sort in ('date', 'score'):
+                        for fields in options['fields'] or ['full', 'compact']:
+                            params = {'i': size, 's': sort, 'source': sources, 'timezone': options['timezone'],
+                                      'fields': fields}
+                            page_bytes = self.check_pages(params)
+                            slow = self.measure(params, fast=False, repeat=options['repeat'])
+                            fast = self.measure(params, fast=True, repeat=options['repeat'])
+                            self.stdout.write(f"{size:>9} {sort:>5} {fields:>10} {page_bytes:>9} {slow * 1000:>14.2f} "
+                                              f"{fast * 1000:>8.2f} {slow / fast:>7.1f}x")
+        finally:
+            delete_articles(Article.objects.filter(hash__in=[article['hash'] for article in articles]))
+
+    def request(self, params, fast):
+        request = APIRequestFactory(SERVER_NAME='localhost').get('/api/articles/', params, HTTP_ACCEPT='application/json')
+        with override_settings(ARTICLE_LIST_FAST_PATH=fast):
+            return ArticleListView.as_view()(request).content
+
+    def check_pages(self, params):
+        """
+        Both paths must return the same bytes on the first page and on the page its next_cursor points to.
+        Returns the size of the first page.
+        """
+        page_bytes = None
+        for _ in range(2):
+            slow, fast = self.request(params, fast=False), self.request(params, fast=True)
+            if slow != fast:
+                raise AssertionError(f"Fast path output differs for {params}:\n{slow[:500]}\n{fast[:500]}")
+            if page_bytes is None:
+                page_bytes = len(fast)
+            next_cursor = json.loads(fast)['next_cursor']
+            if not next_cursor:
+                break
+            params = {**params, 'c': next_cursor}
+        return page_bytes
+
+    def measure(self, params, fast, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            self.request(params, fast)
+        return (time.perf_counter() - started) / repeat
@@ -0,0 +1,114 @@
+# djrssproj/rssapp/management/commands/benchmark_db_pool.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.test import override_settings
+from rssapp.async_db import database_conninfo
+from rssapp.metrics import REGISTRY
+from rssapp.models import Article
+from concurrent.futures import ThreadPoolExecutor
+import psycopg
+import statistics
+import threading
+import time
+
+APPLICATION_NAME = 'benchmark_db_pool'
+
+class Command(BaseCommand):
+    help = ('Run short database tasks on many threads, closing the connection after each task as the Celery worker '
+            'does, once with a new Postgres connection per task and once on the connection pool of rssapp.db_backend. '
+            'Reports tasks per second, task latency and the peak number of server connections, then terminates the '
+            "pool's idle connections and checks that the next tasks still succeed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=200, help='Concurrent threads, like the worker --concurrency')
+        parser.add_argument('--tasks', type=int, default=5000, help='Tasks per run')
+        parser.add_argument('--queries', type=int, default=2, help='Queries per task')
+        parser.add_argument('--pool-size', type=int, default=settings.DB_POOL_MAX_SIZE, help='DB_POOL_MAX_SIZE of the pooled run')
+
+    def handle(self, *args, **options):
+        database = settings.DATABASES['default']
+        handler = ConnectionHandler({
+            'default': database,
+            'direct': {**database, 'ENGINE': 'django.db.backends.postgresql',
+                       'OPTIONS': {**database.get('OPTIONS', {}), 'application_name': APPLICATION_NAME}},
+            'pooled': {**database, 'ENGINE': 'rssapp.db_backend',
+                       'OPTIONS': {**database.get('OPTIONS', {}), 'application_name': APPLICATION_NAME}},
+        })
+        hashes = list(Article.objects.order_by('-id').values_list('hash', flat=True)[:1000])
+        if not hashes:
+            raise CommandError('No articles to query')
+
+        self.stdout.write(f"{options['tasks']} tasks of {options['queries']} queries on {options['threads']} threads, "
+                          f"pool of at most {options['pool_size']}")
+        self.stdout.write(f"{'connections':<12} {'tasks/s':>9} {'failed':>7} {'p50 ms':>8} {'p99 ms':>8} {'server peak':>12}")
+        with override_settings(DB_POOL_MAX_SIZE=options['pool_size']):
+            for alias in ('direct', 'pooled'):
+                rate, failed, p50, p99, peak = self.run(handler, alias, hashes, options)
+                self.stdout.write(f"{alias:<12} {rate:>9.0f} {failed:>7} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {peak:>12}")
+            waited = REGISTRY.get_sample_value('rssapp_db_pool_wait_seconds_sum', {'pool': 'pooled'})
+            self.stdout.write(f"Waited {waited:.2f}s in total for a pooled connection")
+
+            # Stale connection recovery: the server drops every idle pooled connection
+            killed = self.terminate_idle()
+            _, failed, _, _, _ = self.run(handler, 'pooled', hashes, {**options, 'tasks': options['threads'] * 2})
+            if failed:
+                raise CommandError(f"{failed} tasks failed after {killed} idle pooled connections were terminated")
+            self.stdout.write(f"Terminated {killed} idle pooled connections, the next "
+                              f"{options['threads'] * 2} tasks succeeded")
+
+    def run(self, handler, alias, hashes, options):
+        table = Article._meta.db_table
+        sql = f'SELECT id, score FROM "{table}" WHERE hash = %s'
+        latencies = []
+        failures = []
+        lock = threading.Lock()
+
+        def task(i):
+            started = time.perf_counter()
+            connection = handler[alias]
+            try:
+                with connection.cursor() as cursor:
+                    for q in range(options['queries']):
+                        cursor.execute(sql, [hashes[(i + q) % len(hashes)]])
+                        cursor.fetchall()
+            except OperationalError as e:
+                # e.g. too many clients, or no pooled connection within DB_POOL_TIMEOUT
+                with lock:
+                    failures.append(e)
+                return
+            finally:
+                connection.close()
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+        peak = [0]
+        done = threading.Event()
+        monitor = threading.Thread(target=self.watch_connections, args=(peak, done))
+        monitor.start()
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(options['threads']) as executor:
+                list(executor.map(task, range(options['tasks'])))
+        finally:
+            elapsed = time.perf_counter() - started
+            done.set()
+            monitor.join()
+        if failures:
+            self.stderr.write(f"{alias}: {len(failures)} tasks failed, first error: {failures[0]}")
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) >= 2 else [float('nan')] * 99
+        return len(latencies) / elapsed, len(failures), percentiles[49], percentiles[98], peak[0]
+
+    def watch_connections(self, peak, done):
+        """Sample the number of server connections of this benchmark until done is set."""
+        with psycopg.connect(database_conninfo(), autocommit=True) as conn:
+            while not done.wait(0.02):
+                count = conn.execute('SELECT count(*) FROM pg_stat_activity WHERE application_name = %s',
+                                     [APPLICATION_NAME]).fetchone()[0]
+                peak[0] = max(peak[0], count)
+
+    def terminate_idle(self):
+        with psycopg.connect(database_conninfo(), autocommit=True) as conn:
+            return len(conn.execute("SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                                    "WHERE application_name = %s AND state = 'idle'", [APPLICATION_NAME]).fetchall())
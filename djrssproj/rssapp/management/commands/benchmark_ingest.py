@@ -0,0 +1,45 @@
+# djrssproj/rssapp/management/commands/benchmark_ingest.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rssapp.benchmarks import synthetic_articles
+from rssapp.ingest import bulk_insert_articles, insert_articles_rowwise
+from rssapp.models import Article
+from rssapp.source_stats import delete_articles
+import time
+
+class Command(BaseCommand):
+    help = 'Compare the bulk and per-row article ingest paths on synthetic articles. Inserted rows are deleted afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000, help='Number of articles per run')
+        parser.add_argument('--batch-size', type=int, default=50, help='Articles per insert_articles_to_db call (a typical feed)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write('The bulk ingest path requires PostgreSQL.')
+            return
+
+        rows, batch_size = options['rows'], options['batch_size']
+        self.stdout.write(f"{rows} rows in batches of {batch_size}")
+        self.stdout.write(f"{'path':<10} {'new rows/s':>12} {'duplicate rows/s':>18}")
+        for name, insert in (('per-row', insert_articles_rowwise), ('bulk', bulk_insert_articles)):
+            articles = synthetic_articles(rows)
+            try:
+                # First pass inserts new rows, the second pass hits the conflict-skip path for every row
+                new_rate = self.run(insert, articles, batch_size, expect_new=True)
+                duplicate_rate = self.run(insert, articles, batch_size, expect_new=False)
+            finally:
+                delete_articles(Article.objects.filter(hash__in=[article['hash'] for article in articles]))
+            self.stdout.write(f"{name:<10} {new_rate:>12.0f} {duplicate_rate:>18.0f}")
+
+    def run(self, insert, articles, batch_size, expect_new):
+        inserted = 0
+        started = time.perf_counter()
+        for start in range(0, len(articles), batch_size):
+            inserted += len(insert(articles[start:start + batch_size]))
+        elapsed = time.perf_counter() - started
+
+        expected = len(articles) if expect_new else 0
+        if inserted != expected:
+            raise AssertionError(f"{insert.__name__} inserted {inserted} rows, expected {expected}")
+        return len(articles) / elapsed
@@ -0,0 +1,50 @@
+# djrssproj/rssapp/management/commands/benchmark_normalizer.py
+from django.core.management.base import BaseCommand, CommandError
+from rssapp.benchmarks import load_corpus, synthetic_feed
+from rssapp.parsing import PARSE_STAGES, process_feed
+from datetime import datetime, timedelta, timezone
+import os
+import time
+
+class Command(BaseCommand):
+    help = ('Measure process_feed on a saved corpus of feed documents: throughput and time per stage. Its output '
+            'is checked against the implementation it replaced by the tests in rssapp/tests.py.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help='Directory holding one feed document per file (see benchmark_parse --save)')
+        parser.add_argument('--generate', type=int, default=0, metavar='N', help='Write N synthetic feeds into the corpus directory first')
+        parser.add_argument('--repeat', type=int, default=3, help='Times the corpus is parsed per measurement')
+        parser.add_argument('--hours', type=int, default=24 * 365, help='Entry cutoff in hours')
+
+    def handle(self, *args, **options):
+        corpus_dir = options['corpus']
+        if options['generate']:
+            os.makedirs(corpus_dir, exist_ok=True)
+            for seed in range(options['generate']):
+                with open(os.path.join(corpus_dir, f"synthetic-{seed}.xml"), 'w') as f:
+                    f.write(synthetic_feed(seed))
+        if not os.path.isdir(corpus_dir):
+            raise CommandError(f"Corpus directory {corpus_dir} does not exist, use --generate or benchmark_parse --save")
+
+        corpus = load_corpus(corpus_dir)
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=options['hours'])
+        self.stdout.write(f"{len(corpus)} feed documents ({sum(len(body) for _, body in corpus)} bytes)")
+
+        timings = {}
+        failed = 0
+        started = time.perf_counter()
+        for _ in range(options['repeat']):
+            for name, body in corpus:
+                try:
+                    process_feed(body, cutoff_time, timings=timings)
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{name}: {e!r}")
+        seconds = time.perf_counter() - started
+
+        feeds = len(corpus) * options['repeat']
+        self.stdout.write(f"process_feed {feeds / seconds:>10.1f} feeds/s ({failed} failed)")
+        total = sum(timings.values())
+        for stage in PARSE_STAGES:
+            self.stdout.write(f"  {stage:<14} {timings.get(stage, 0.0) / feeds * 1000:>8.3f} ms/feed "
+                              f"{timings.get(stage, 0.0) / total:>6.1%}")
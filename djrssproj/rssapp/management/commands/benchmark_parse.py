@@ -0,0 +1,84 @@
+# djrssproj/rssapp/management/commands/benchmark_parse.py
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from rssapp.benchmarks import load_corpus, synthetic_feed
+from rssapp.fetcher import fetch_feeds
+from rssapp.parse_pool import create_parse_pool, parse_feeds
+from rssapp.parsing import parse_feed_batch
+from datetime import datetime, timedelta, timezone
+import hashlib
+import os
+import time
+import xml.etree.ElementTree as ET
+
+class Command(BaseCommand):
+    help = 'Measure feed parse throughput in the parse process pool at several pool sizes on a saved corpus of feed documents.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', help='Directory holding one feed document per file')
+        parser.add_argument('--save', action='store_true', help='Download the feeds in OPML_FILE_PATH into the corpus directory first')
+        parser.add_argument('--generate', type=int, default=0, metavar='N', help='Write N synthetic feeds into the corpus directory first')
+        parser.add_argument('--processes', default=None, help='Comma-separated pool sizes (default: 1, 2, 4, ... up to the CPU count)')
+        parser.add_argument('--repeat', type=int, default=3, help='Times the corpus is parsed per measurement')
+        parser.add_argument('--hours', type=int, default=24 * 365, help='Entry cutoff in hours')
+
+    def handle(self, *args, **options):
+        corpus_dir = options['corpus']
+        if options['save']:
+            self.save_corpus(corpus_dir)
+        if options['generate']:
+            self.generate_corpus(corpus_dir, options['generate'])
+        if not os.path.isdir(corpus_dir):
+            raise CommandError(f"Corpus directory {corpus_dir} does not exist, use --save or --generate")
+
+        corpus = load_corpus(corpus_dir) * options['repeat']
+        cutoff_time = datetime.now(timezone.utc) - timedelta(hours=options['hours'])
+        cpus = os.cpu_count()
+        sizes = [int(size) for size in options['processes'].split(',')] if options['processes'] else self.default_sizes(cpus)
+        self.stdout.write(f"{len(corpus)} feed documents ({sum(len(body) for _, body in corpus)} bytes), {cpus} CPUs")
+
+        # Baseline: everything parsed on this thread, as the thread pool used to do
+        started = time.perf_counter()
+        entries = sum(len(articles) for _, articles, *_ in parse_feed_batch(corpus, cutoff_time))
+        baseline = time.perf_counter() - started
+        self.stdout.write(f"{'processes':>9} {'feeds/s':>10} {'entries/s':>11} {'speedup':>8}")
+        self.stdout.write(f"{'inline':>9} {len(corpus) / baseline:>10.1f} {entries / baseline:>11.0f} {1.0:>8.2f}")
+
+        for size in sizes:
+            pool = create_parse_pool(size)
+            try:
+                # Start the workers before timing
+                list(pool.map(abs, range(size)))
+                started = time.perf_counter()
+                entries = sum(len(articles) for _, articles, _ in parse_feeds(corpus, cutoff_time, pool=pool))
+                elapsed = time.perf_counter() - started
+            finally:
+                pool.shutdown()
+            self.stdout.write(f"{size:>9} {len(corpus) / elapsed:>10.1f} {entries / elapsed:>11.0f} {baseline / elapsed:>8.2f}")
+
+    def default_sizes(self, cpus):
+        sizes = [1]
+        while sizes[-1] * 2 <= cpus:
+            sizes.append(sizes[-1] * 2)
+        if sizes[-1] != cpus:
+            sizes.append(cpus)
+        return sizes
+
+    def save_corpus(self, corpus_dir):
+        with open(settings.OPML_FILE_PATH, 'rb') as opml_file:
+            root = ET.fromstring(opml_file.read())
+        urls = [outline.get('xmlUrl') for outline in root.findall(".//outline") if outline.get('xmlUrl')]
+        results, stats = fetch_feeds(urls)
+        os.makedirs(corpus_dir, exist_ok=True)
+        for result in results:
+            if result.ok:
+                with open(os.path.join(corpus_dir, hashlib.md5(result.url.encode()).hexdigest() + '.xml'), 'wb') as f:
+                    f.write(result.body)
+        self.stdout.write(f"Saved {stats.feeds - stats.failed} feeds to {corpus_dir}: {stats}")
+
+    def generate_corpus(self, corpus_dir, count):
+        os.makedirs(corpus_dir, exist_ok=True)
+        for seed in range(count):
+            with open(os.path.join(corpus_dir, f"synthetic-{seed:05d}.xml"), 'w', encoding='utf-8') as f:
+                f.write(synthetic_feed(seed))
+        self.stdout.write(f"Wrote {count} synthetic feeds to {corpus_dir}")
@@ -0,0 +1,222 @@
+# djrssproj/rssapp/management/commands/benchmark_pipeline.py
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.utils import CursorWrapper
+from django.test.utils import override_settings
+from djrssproj.celery import app
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from unittest import mock
+from rssapp import tasks
+from rssapp.benchmarks import BenchmarkServer, synthetic_feed, synthetic_opml
+from rssapp.hash_index import get_hash_index
+from rssapp.feeds import parse_opml
+from rssapp.models import Article, Feed, FeedState, ScoreMemo, SourceStats, TitleBand
+from rssapp.score_memo import title_digest
+from rssapp.source_stats import delete_articles
+from datetime import datetime, timezone
+import json
+import logging
+import random
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = ('Run download_rss_feeds end to end against local stand-ins for the feed hosts and the OpenAI API, '
+            'and report throughput, time to first score, database round trips and peak memory. '
+            'Articles and feed state created by the run are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--feeds', type=int, default=500, help='Number of synthetic feeds')
+        parser.add_argument('--entries', type=int, default=30, help='Entries per feed')
+        parser.add_argument('--hosts', type=int, default=8,
+                            help='Local addresses the feeds are spread over (the fetcher limits connections per host)')
+        parser.add_argument('--feed-latency-ms', type=int, nargs=2, default=[20, 300], metavar=('MIN', 'MAX'),
+                            help='Range of the feed hosts\' response latency')
+        parser.add_argument('--llm-latency-ms', type=int, nargs=2, default=[500, 3000], metavar=('MIN', 'MAX'),
+                            help='Range of the stand-in API\'s response latency')
+        parser.add_argument('--scoring-workers', type=int, default=8,
+                            help='Scoring requests in flight at once, like the Celery workers of the scoring queue')
+        parser.add_argument('--hours', type=int, default=tasks.DEFAULT_HOURS, help='Cutoff passed to download_rss_feeds')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for feed contents and latencies')
+        parser.add_argument('--output', help='Write the results as JSON to this file, to compare across commits')
+        parser.add_argument('--keep', action='store_true', help='Keep the articles and feed state created by the run')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stderr.write('The ingest pipeline requires PostgreSQL.')
+            return
+
+        # Seeds unique to this run, so every title is new to the database and to the score memo
+        run_id = uuid.uuid4().hex[:8]
+        rng = random.Random(options['seed'])
+        feeds = {f"{run_id}-{n}.xml": synthetic_feed(rng.getrandbits(48), options['entries'],
+                                                      title=f"Pipeline Benchmark {run_id} {n}").encode()
+                 for n in range(options['feeds'])}
+
+        servers = [BenchmarkServer(feeds, feed_latency=[ms / 1000 for ms in options['feed_latency_ms']],
+                                   llm_latency=[ms / 1000 for ms in options['llm_latency_ms']],
+                                   seed=options['seed'], host=f"127.0.0.{n + 1}")
+                   for n in range(options['hosts'])]
+        base_urls = [server.start() for server in servers]
+        urls = [f"{base_urls[n % len(base_urls)]}/feeds/{name}" for n, name in enumerate(feeds)]
+        self.stdout.write(f"{len(feeds)} feeds of {options['entries']} entries "
+                          f"({sum(map(len, feeds.values())) / len(feeds) / 1024:.0f} KiB each) on {len(servers)} hosts")
+
+        try:
+            # Registered directly rather than synced, which would disable every feed not in the synthetic OPML
+            feed_ids = [feed.id for feed in Feed.objects.bulk_create(Feed(**entry._asdict())
+                                                                     for entry in parse_opml(synthetic_opml(urls)))]
+            with tempfile.TemporaryDirectory() as directory:
+                results = self.run(feed_ids, servers[0], directory, options)
+        finally:
+            for server in servers:
+                server.stop()
+            if not options['keep']:
+                self.clean_up(urls, f"Pipeline Benchmark {run_id} ")
+
+        results.update({
+            'commit': self.git_commit(),
+            'date': datetime.now(timezone.utc).isoformat(),
+            'options': {name: options[name] for name in ('feeds', 'entries', 'hosts', 'feed_latency_ms',
+                                                         'llm_latency_ms', 'scoring_workers', 'hours', 'seed')},
+            'feed_bytes': sum(map(len, feeds.values())),
+        })
+        for name, value in results.items():
+            if name != 'options':
+                self.stdout.write(f"{name:<24} {value:.3f}" if isinstance(value, float) else f"{name:<24} {value}")
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def run(self, feed_ids, llm_server, directory, options):
+        counts = {'articles': 0, 'round_trips': 0, 'scoring_requests': 0}
+        fetch_stats = []
+        first_score = []
+        lock = threading.Lock()
+        executor = ThreadPoolExecutor(max_workers=options['scoring_workers'])
+        pending = []
+
+        def count(name, n=1):
+            with lock:
+                counts[name] += n
+
+        def counted(method):
+            def wrapper(self, *args, **kwargs):
+                count('round_trips')
+                return method(self, *args, **kwargs)
+            return wrapper
+
+        def fetch_feeds(*args, **kwargs):
+            results, stats = real_fetch_feeds(*args, **kwargs)
+            fetch_stats.append(stats)
+            return results, stats
+
+        def insert_articles(articles):
+            new_hashes = real_insert_articles(articles)
+            count('articles', len(new_hashes))
+            return new_hashes
+
+        def update_scores(scores):
+            updated = real_update_scores(scores)
+            if updated and not first_score:
+                first_score.append(time.perf_counter())
+            return updated
+
+        def query_openai_api(articles):
+            try:
+                tasks.query_openai_api.apply(args=[articles, tasks.settings.PROMPT])
+            finally:
+                connection.close()
+
+        def dispatch_scoring_batch(articles):
+            # Eager tasks run on the calling thread; a pool stands in for the scoring workers
+            count('scoring_requests')
+            with lock:
+                pending.append(executor.submit(query_openai_api, articles))
+
+        real_fetch_feeds, real_insert_articles, real_update_scores = tasks.fetch_feeds, tasks.insert_articles, tasks.update_scores
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(OPENAI_API_URL=f"{llm_server.base_url}/v1/chat/completions",
+                                                  OPENAI_API_KEY='benchmark',
+                                                  # The stand-in API has no quota to share
+                                                  LLM_REQUESTS_PER_MINUTE=10 ** 9, LLM_TOKENS_PER_MINUTE=10 ** 12,
+                                                  HASH_INDEX_PATH=f"{directory}/article_hashes.bloom"))
+            # Run every task in this process, whatever the Celery settings
+            stack.callback(setattr, app.conf, 'task_always_eager', app.conf.task_always_eager)
+            app.conf.task_always_eager = True
+            stack.enter_context(mock.patch.object(tasks, 'fetch_feeds', fetch_feeds))
+            stack.enter_context(mock.patch.object(tasks, 'insert_articles', insert_articles))
+            stack.enter_context(mock.patch.object(tasks, 'update_scores', update_scores))
+            stack.enter_context(mock.patch.object(tasks, 'dispatch_scoring_batch', dispatch_scoring_batch))
+            # The score batcher holds the dispatch function it was created with
+            stack.enter_context(mock.patch.object(tasks, '_score_batcher', None))
+            stack.enter_context(mock.patch.object(CursorWrapper, 'execute', counted(CursorWrapper.execute)))
+            stack.enter_context(mock.patch.object(CursorWrapper, 'executemany', counted(CursorWrapper.executemany)))
+
+            # Build the hash index of the existing articles outside the measured time
+            get_hash_index()
+            counts['round_trips'] = 0
+
+            started = time.perf_counter()
+            tasks.download_rss_feeds(feed_ids, options['hours'])
+            ingested = time.perf_counter()
+
+            # Send the partial batch, then wait for every scoring request and the writes they queued
+            tasks.get_score_batcher().flush()
+            while True:
+                with lock:
+                    waiting = [future for future in pending if not future.done()]
+                if not waiting:
+                    break
+                for future in waiting:
+                    future.result()
+            tasks.get_score_writer().flush()
+            finished = time.perf_counter()
+            executor.shutdown()
+
+        articles = counts['articles']
+        self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        feeds_fetched = fetch_stats[0].feeds if fetch_stats else 0
+        return {
+            'feeds_fetched': feeds_fetched,
+            'articles_inserted': articles,
+            'scoring_requests': counts['scoring_requests'],
+            'llm_titles_scored': llm_server.llm_titles,
+            'ingest_seconds': ingested - started,
+            'total_seconds': finished - started,
+            'feeds_per_second': feeds_fetched / (ingested - started),
+            'articles_per_second': articles / (ingested - started),
+            'time_to_first_score': first_score[0] - started if first_score else None,
+            'db_round_trips': counts['round_trips'],
+            'round_trips_per_article': counts['round_trips'] / articles if articles else None,
+            # ru_maxrss is in KiB on Linux; children covers the parse pool processes that have exited
+            'peak_rss_mib': self_rss / 1024,
+            'peak_children_rss_mib': children_rss / 1024,
+        }
+
+    def clean_up(self, urls, source_prefix):
+        articles = Article.objects.filter(source__startswith=source_prefix)
+        titles = list(articles.values_list('hash', 'title'))
+        delete_articles(articles)
+        TitleBand.objects.filter(article_hash__in=[article_hash for article_hash, _ in titles]).delete()
+        ScoreMemo.objects.filter(title_digest__in=[title_digest(title) for _, title in titles]).delete()
+        SourceStats.objects.filter(source__startswith=source_prefix).delete()
+        FeedState.objects.filter(xml_url__in=urls).delete()
+        Feed.objects.filter(xml_url__in=urls).delete()
+        self.stdout.write(f"Deleted the {len(titles)} articles of the run")
+
+    def git_commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,48 @@
+# djrssproj/rssapp/management/commands/cluster_report.py
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db.models import Count, F
+from rssapp.clustering import window_start
+from rssapp.models import Article
+from rssapp.scoring import count_tokens, create_score_batcher, format_title_line
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Report near-duplicate clusters and the LLM scoring calls saved by copying scores within them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Report on articles published in the last N days')
+        parser.add_argument('--top', type=int, default=10, help='Number of largest clusters to list')
+
+    def handle(self, *args, **options):
+        since = datetime.now(timezone.utc) - timedelta(days=options['days'])
+        articles = Article.objects.filter(publication_date__gte=since)
+        # Members are never sent for scoring, they wait for their representative's score
+        members = articles.filter(cluster_id__isnull=False).exclude(id=F('cluster_id'))
+        member_titles = list(members.values_list('hash', 'title'))
+
+        batches = []
+        batcher = create_score_batcher(batches.append, settings.PROMPT)
+        batcher.add(member_titles)
+        batcher.flush()
+        tokens = sum(count_tokens(format_title_line(article_hash, title)) for article_hash, title in member_titles)
+
+        total = articles.count()
+        clustered = articles.filter(cluster_id__isnull=False).count()
+        multi = (articles.filter(cluster_id__isnull=False).values('cluster_id').annotate(size=Count('id'))
+                 .filter(size__gt=1).order_by('-size'))
+        self.stdout.write(f"Articles published since {since:%Y-%m-%d %H:%M}: {total}, clustered: {clustered} "
+                          f"(articles published before {window_start():%Y-%m-%d %H:%M} at insert time are not)")
+        self.stdout.write(f"Clusters with more than one article: {multi.count()}")
+        self.stdout.write(f"Titles not sent for scoring: {len(member_titles)}, "
+                          f"of which already scored from their cluster: {members.filter(score__isnull=False).count()}")
+        self.stdout.write(f"Prompt tokens saved: {tokens}, scoring calls saved: {len(batches)} "
+                          f"(packed like the scoring batcher, SCORING_TOKEN_BUDGET={settings.SCORING_TOKEN_BUDGET})")
+
+        representatives = dict(Article.objects.filter(id__in=[row['cluster_id'] for row in multi[:options['top']]])
+                               .values_list('id', 'title'))
+        for row in multi[:options['top']]:
+            self.stdout.write(f"{row['size']:>5}  {representatives.get(row['cluster_id'], '(representative removed)')}")
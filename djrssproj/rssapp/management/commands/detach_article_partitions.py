@@ -0,0 +1,34 @@
+# djrssproj/rssapp/management/commands/detach_article_partitions.py
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from rssapp.partitions import attached_months, detach_partition, month_start, partition_name
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = ('Take the articles of every month before --before out of the articles table by detaching their monthly '
+            'partitions, and out of the per-source statistics. The detached tables are kept unless --drop is given.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help='First month to keep, as YYYY-MM')
+        parser.add_argument('--drop', action='store_true', help='Drop the detached partitions')
+
+    def handle(self, *args, **options):
+        try:
+            before = month_start(f"{options['before']}-01T00:00:00Z")
+        except (TypeError, ValueError):
+            raise CommandError(f"--before must be a month like 2025-01, not {options['before']!r}")
+
+        months = [month for month in attached_months() if month < before]
+        if not months:
+            self.stdout.write(f"No partitions before {before:%Y-%m}")
+            return
+        for month in months:
+            try:
+                detached = detach_partition(month, drop=options['drop'])
+            except OperationalError as e:
+                # lock_timeout: queries on articles held the table for longer than ARTICLE_PARTITION_LOCK_TIMEOUT
+                raise CommandError(f"Could not detach {partition_name(month)}: {e}")
+            self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} {partition_name(month)} "
+                              f"with {detached} articles")
@@ -0,0 +1,113 @@
+# djrssproj/rssapp/management/commands/load_test_api.py
+from django.core.management.base import BaseCommand, CommandError
+import aiohttp
+import asyncio
+import json
+import random
+import statistics
+import time
+
+DEFAULT_PATHS = [
+    '/api/articles/',
+    '/api/articles/?s=score',
+    '/api/articles/?i=50&fields=compact',
+    '/api/sources/',
+    '/api/score-range/',
+    '/api/date-range/',
+    '/api/source-counts/?min_score=50',
+]
+
+class Command(BaseCommand):
+    help = ('Load test the read API of one or more running servers, e.g. uWSGI (WSGI) and uvicorn (ASGI): '
+            'p50/p99 latency, requests per second and errors at each number of concurrent clients.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', required=True, metavar='NAME=URL',
+                            help='Base URL of a server, optionally named (asgi=http://127.0.0.1:8001), repeatable')
+        parser.add_argument('--concurrency', default='100,250,500,1000', help='Comma-separated numbers of clients')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds per measurement')
+        parser.add_argument('--warmup', type=float, default=3, help='Seconds of load before each measurement')
+        parser.add_argument('--path', action='append', default=None,
+                            help='Path to request, repeatable; clients pick one at random per request')
+        parser.add_argument('--host', default='localhost', help='Host header of the requests')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as an error')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        servers = []
+        for value in options['url']:
+            name, url = value.split('=', 1) if '=' in value.split('://')[0] else (value, value)
+            servers.append((name, url.rstrip('/')))
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        paths = options['path'] or DEFAULT_PATHS
+
+        results = []
+        self.stdout.write(f"{'server':<12} {'clients':>7} {'requests':>9} {'errors':>7} {'req/s':>9} "
+                          f"{'p50 ms':>8} {'p99 ms':>8}")
+        for name, url in servers:
+            for clients in levels:
+                result = asyncio.run(self.measure(url, paths, clients, options))
+                result.update(server=name, url=url, clients=clients)
+                results.append(result)
+                self.stdout.write(f"{name:<12} {clients:>7} {result['requests']:>9} {result['errors']:>7} "
+                                  f"{result['requests_per_second']:>9.1f} {result['p50_ms']:>8.1f} "
+                                  f"{result['p99_ms']:>8.1f}")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'duration': options['duration'], 'paths': paths, 'results': results}, f, indent=2)
+
+    async def measure(self, base_url, paths, clients, options):
+        """Run clients that each send one request after another, and summarize the measured window."""
+        rng = random.Random(options['seed'])
+        # As Nginx forwards them, so SECURE_SSL_REDIRECT does not redirect plain HTTP requests to the server
+        headers = {'Host': options['host'], 'X-Forwarded-Proto': 'https'}
+        latencies = []
+        errors = []
+        measuring = False
+        stop = False
+
+        async def client(session):
+            while not stop:
+                path = rng.choice(paths)
+                started = time.perf_counter()
+                try:
+                    async with session.get(base_url + path, headers=headers) as response:
+                        await response.read()
+                        ok = response.status == 200
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    ok = False
+                if measuring:
+                    (latencies if ok else errors).append(time.perf_counter() - started)
+
+        connector = aiohttp.TCPConnector(limit=0, ssl=False)
+        timeout = aiohttp.ClientTimeout(total=options['timeout'])
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            try:
+                async with session.get(base_url + paths[0], headers=headers) as response:
+                    await response.read()
+            except aiohttp.ClientError as e:
+                raise CommandError(f"{base_url} is not reachable: {e}")
+            tasks = [asyncio.create_task(client(session)) for _ in range(clients)]
+            await asyncio.sleep(options['warmup'])
+            measuring = True
+            started = time.perf_counter()
+            await asyncio.sleep(options['duration'])
+            measuring = False
+            elapsed = time.perf_counter() - started
+            stop = True
+            await asyncio.gather(*tasks)
+
+        if len(latencies) >= 2:
+            percentiles = statistics.quantiles(latencies, n=100)
+            p50, p99 = percentiles[49], percentiles[98]
+        else:
+            p50 = p99 = latencies[0] if latencies else float('nan')
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'requests_per_second': len(latencies) / elapsed,
+            'p50_ms': p50 * 1000,
+            'p99_ms': p99 * 1000,
+        }
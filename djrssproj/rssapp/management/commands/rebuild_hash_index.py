@@ -0,0 +1,20 @@
+# djrssproj/rssapp/management/commands/rebuild_hash_index.py
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from rssapp.hash_index import build_hash_index
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Rebuild the shared article hash index from the article hash registry, e.g. to resize it or repair drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capacity', type=int, default=None,
+                            help=f'Number of hashes to size the index for (default: {settings.HASH_INDEX_CAPACITY} or twice the article count)')
+
+    def handle(self, *args, **options):
+        logger.info(f"Rebuilding article hash index at {settings.HASH_INDEX_PATH}")
+        index = build_hash_index(capacity=options['capacity'])
+        self.stdout.write(f"Indexed {index.count} article hashes in {settings.HASH_INDEX_PATH} "
+                          f"({index.num_bits // 8} bytes, {index.num_hashes} hash functions, capacity {index.capacity})")
@@ -0,0 +1,14 @@
+# djrssproj/rssapp/management/commands/rebuild_source_stats.py
+from django.core.management.base import BaseCommand
+from rssapp.source_stats import rebuild_source_stats
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Recompute the per-source statistics table from the articles table, e.g. to repair drift.'
+
+    def handle(self, *args, **options):
+        logger.info("Rebuilding per-source statistics")
+        sources = rebuild_source_stats()
+        self.stdout.write(f"Rebuilt statistics for {sources} sources")
@@ -0,0 +1,34 @@
+# djrssproj/rssapp/management/commands/sync_feeds.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rssapp.feeds import parse_opml, sync_feeds
+import xml.etree.ElementTree as ET
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = ('Bring the feed registry in line with an OPML file: add its new feeds, update categories and titles, '
+            're-enable listed feeds and disable the feeds it no longer lists. Disabled feeds keep their counts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=settings.OPML_FILE_PATH, help='OPML file to sync from')
+        parser.add_argument('--dry-run', action='store_true', help='Show the changes without writing them')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], 'rb') as opml_file:
+                entries = parse_opml(opml_file.read())
+        except (OSError, ET.ParseError) as e:
+            raise CommandError(f"Could not read {options['file']}: {e}")
+        # An empty or truncated file would otherwise disable every feed
+        if not entries:
+            raise CommandError(f"{options['file']} lists no feeds, nothing synced")
+
+        sync = sync_feeds(entries, dry_run=options['dry_run'])
+        if options['verbosity'] > 1:
+            for name, urls in vars(sync).items():
+                for url in urls:
+                    self.stdout.write(f"{name:<14} {url}")
+        self.stdout.write(f"{'Would sync' if options['dry_run'] else 'Synced'} {len(entries)} feeds from "
+                          f"{options['file']}: {sync}")
@@ -1,37 +1,55 @@
 # djrssproj/rssapp/management/commands/update_articles.py
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from rssapp.tasks import query_articles_with_null_score, download_rss_feeds, update_articles_command
+from rssapp.clustering import prune_title_bands
+from rssapp.partitions import ensure_upcoming_partitions
+from rssapp.tasks import (query_articles_with_null_score, download_rss_feeds, requeue_update_articles,
+                          start_update_articles_loop)
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
     help = 'Update articles by downloading RSS feeds and starting the update articles loop.'
+    # Generation of the update articles loop calling the command, which queues its next pass once the feeds
+    # are downloaded
+    stealth_options = ('requeue',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-loop', dest='loop', action='store_false',
+                            help='Do not start the update articles loop, e.g. when called from within it')
 
     def handle(self, *args, **options):
+        # Queued after the download rather than now, when the polled feeds' next poll times have moved forward
+        # and a slow download cannot overlap the next pass
+        requeue = requeue_update_articles.si(options['requeue']) if options.get('requeue') is not None else None
+
         # Obtain scores for articles that were not sent to API
         logger.info("Calling query_articles_with_null_score")
         query_articles_with_null_score()
 
+        # Drop near-duplicate lookup entries of articles that are too old to match new ones
+        prune_title_bands()
+
+        # Create the article partitions of the coming months before articles are published in them
+        ensure_upcoming_partitions()
+
         # Ensure the OpenAI API key is set
         if not hasattr(settings, 'OPENAI_API_KEY'):
             logger.error('The OpenAI API key has not been set in the Django settings.')
+            if requeue:
+                requeue.delay()
             return
 
-        # Read the OPML file content
-        logger.info(f"Opening OPML file at {settings.OPML_FILE_PATH}")
-        with open(settings.OPML_FILE_PATH, 'rb') as opml_file:
-            opml_content = opml_file.read()
-
-        # Call the task to download and process RSS feeds asynchronously
+        # Call the task to download and process the enabled feeds of the registry asynchronously
         logger.info("Calling download_rss_feeds asynchronously")
-        download_rss_feeds.apply_async(args=[opml_content.decode('utf-8'), 99])
+        download_rss_feeds.apply_async(args=[None, 99], link=requeue, link_error=requeue)
 
         logger.info("Calling query_openai_api for articles that were not scored")
 
         # Start the update articles loop
-        logger.info("Starting the update articles loop")
-        update_articles_command.delay()
+        if options['loop']:
+            logger.info("Starting the update articles loop")
+            start_update_articles_loop()
 
         logger.info('Update articles command completed.')
\ No newline at end of file
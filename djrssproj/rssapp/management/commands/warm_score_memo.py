@@ -0,0 +1,44 @@
+# djrssproj/rssapp/management/commands/warm_score_memo.py
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db.models import F, Q
+from rssapp.models import Article
+from rssapp.score_memo import MEMO_CHUNK_SIZE, prompt_version, remember_titles
+from rssapp.scoring import OPENAI_MODEL
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = ('Fill the score memo from the scores already stored on articles outside a cluster or first in theirs, '
+            'attributing them to the current prompt and model unless told otherwise. Existing memo entries are kept.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prompt-file', default=None,
+                            help='File holding the prompt the stored scores were given with (default: settings.PROMPT)')
+        parser.add_argument('--model', default=OPENAI_MODEL, help=f'Model the stored scores came from (default: {OPENAI_MODEL})')
+
+    def handle(self, *args, **options):
+        if options['prompt_file']:
+            with open(options['prompt_file'], 'r') as prompt_file:
+                prompt = prompt_file.read()
+        else:
+            prompt = settings.PROMPT
+        version = prompt_version(prompt)
+        logger.info(f"Warming the score memo for prompt version {version} and model {options['model']}")
+
+        # Members of a cluster carry their first article's score (propagate_cluster_scores), not one the model
+        # gave their own title
+        rows = (Article.objects.filter(Q(cluster_id__isnull=True) | Q(cluster_id=F('id')), score__isnull=False)
+                .values_list('title', 'score').order_by())
+        chunk = []
+        stored = 0
+        for row in rows.iterator(chunk_size=MEMO_CHUNK_SIZE * 10):
+            chunk.append(row)
+            if len(chunk) >= MEMO_CHUNK_SIZE * 10:
+                stored += remember_titles(chunk, version, options['model'])
+                chunk = []
+        if chunk:
+            stored += remember_titles(chunk, version, options['model'])
+        self.stdout.write(f"Offered {stored} distinct titles to the score memo for prompt version {version} "
+                          f"and model {options['model']}")
@@ -0,0 +1,226 @@
+# rssapp/metrics.py
+# Prometheus metrics of the ingest pipeline and the API. With PROMETHEUS_MULTIPROC_DIR set, as under uWSGI's
+# worker processes, every process writes its values to that directory and a scrape adds them up; the directory
+# must be emptied whenever the server starts.
+import atexit
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess, start_http_server
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+REGISTRY = CollectorRegistry()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+FEED_FETCH_SECONDS = Histogram('rssapp_feed_fetch_seconds', 'Feed download time', ['host'],
+                               buckets=LATENCY_BUCKETS, registry=REGISTRY)
+FEED_FETCH_BYTES = Histogram('rssapp_feed_fetch_bytes', 'Feed body size on the wire', ['host'],
+                             buckets=SIZE_BUCKETS, registry=REGISTRY)
+FEED_FETCHES = Counter('rssapp_feed_fetches_total', 'Feed downloads by outcome (ok, not_modified, error)',
+                       ['host', 'outcome'], registry=REGISTRY)
+FEED_PARSE_SECONDS = Histogram('rssapp_feed_parse_seconds', 'process_feed time per feed',
+                               buckets=LATENCY_BUCKETS, registry=REGISTRY)
+FEED_ENTRIES = Histogram('rssapp_feed_entries', 'Articles within the cutoff per parsed feed',
+                         buckets=COUNT_BUCKETS, registry=REGISTRY)
+ARTICLES_INSERTED = Counter('rssapp_articles_inserted_total', 'Articles inserted by insert_articles_to_db',
+                            registry=REGISTRY)
+ARTICLES_SKIPPED = Counter('rssapp_articles_skipped_total', 'Articles insert_articles_to_db found already stored',
+                           registry=REGISTRY)
+LLM_REQUEST_SECONDS = Histogram('rssapp_llm_request_seconds', 'Scoring API request time by outcome (ok, error)',
+                                ['outcome'], buckets=LATENCY_BUCKETS, registry=REGISTRY)
+LLM_TOKENS = Counter('rssapp_llm_tokens_total', 'Tokens reported by the scoring API (prompt, completion)',
+                     ['kind'], registry=REGISTRY)
+LLM_RETRIES = Counter('rssapp_llm_retries_total', 'Scoring requests scheduled for a retry', registry=REGISTRY)
+LLM_RATE_LIMIT_WAIT_SECONDS = Histogram('rssapp_llm_rate_limit_wait_seconds',
+                                        'Time a scoring request waited for the shared rate limiter',
+                                        buckets=LATENCY_BUCKETS, registry=REGISTRY)
+LLM_DEFERRED = Counter('rssapp_llm_deferred_total', 'Scoring requests re-queued to wait for the shared rate limiter',
+                       registry=REGISTRY)
+PAGE_CACHE_LOOKUPS = Counter('rssapp_page_cache_lookups_total', 'Page cache lookups by data set and outcome (hit, miss)',
+                             ['cache', 'outcome'], registry=REGISTRY)
+SCORE_MEMO_LOOKUPS = Counter('rssapp_score_memo_lookups_total',
+                             'Titles looked up in the score memo by outcome (hit, miss)', ['outcome'], registry=REGISTRY)
+VIEW_SECONDS = Histogram('rssapp_view_seconds', 'Request time by URL name, method and status',
+                         ['view', 'method', 'status'], buckets=LATENCY_BUCKETS, registry=REGISTRY)
+DB_POOL_WAIT_SECONDS = Histogram('rssapp_db_pool_wait_seconds', 'Time waited for a pooled database connection',
+                                 ['pool'], buckets=LATENCY_BUCKETS, registry=REGISTRY)
+# get_stats() of the database connection pools (rssapp/db_backend), set whenever a connection is taken or given
+# back. Under PROMETHEUS_MULTIPROC_DIR a scrape sums the processes still running; the counts of errors are
+# since each process started.
+DB_POOL_STATS = {
+    stat: Gauge(name, documentation, ['pool'], multiprocess_mode='livesum', registry=REGISTRY)
+    for stat, name, documentation in (
+        ('pool_size', 'rssapp_db_pool_connections', 'Connections held by the pools, idle or in use'),
+        ('pool_available', 'rssapp_db_pool_idle_connections', 'Idle connections in the pools'),
+        ('requests_waiting', 'rssapp_db_pool_waiting', 'Threads waiting for a connection'),
+        ('requests_errors', 'rssapp_db_pool_timeouts', 'Requests that found no free connection in time'),
+        ('connections_lost', 'rssapp_db_pool_connections_lost', 'Connections found broken by the check before use'),
+        ('returns_bad', 'rssapp_db_pool_returns_bad', 'Connections discarded when returned broken'),
+        ('connections_errors', 'rssapp_db_pool_connect_errors', 'Failed connection attempts'),
+    )
+}
+# Depth of a priority queue by priority is published minus started; RabbitMQ only reports a queue's total
+TASKS_PUBLISHED = Counter('rssapp_tasks_published_total', 'Celery tasks sent to the broker', ['task', 'priority'],
+                          registry=REGISTRY)
+TASKS_STARTED = Counter('rssapp_tasks_started_total', 'Celery tasks started by a worker', ['task', 'priority'],
+                        registry=REGISTRY)
+
+
+def url_host(url):
+    """Host label of a feed URL."""
+    return urlparse(url).hostname or 'unknown'
+
+
+def observe_fetch(url, seconds, outcome, size=None):
+    """Record one feed download."""
+    host = url_host(url)
+    FEED_FETCH_SECONDS.labels(host).observe(seconds)
+    FEED_FETCHES.labels(host, outcome).inc()
+    if size is not None:
+        FEED_FETCH_BYTES.labels(host).observe(size)
+
+
+def observe_parse(seconds, entries):
+    """Record the parse time and article count of one feed."""
+    FEED_PARSE_SECONDS.observe(seconds)
+    FEED_ENTRIES.observe(entries)
+
+
+class PipelineCollector:
+    """Gauges read when metrics are scraped: unscored articles and messages waiting in the broker queues."""
+
+    def collect(self):
+        from django.db import DatabaseError, connection
+        from .models import Article
+
+        backlog = GaugeMetricFamily('rssapp_unscored_articles', 'Stored articles without a score')
+        try:
+            backlog.add_metric([], Article.objects.filter(score__isnull=True).count())
+        except DatabaseError as e:
+            logger.error(f"[metrics] Could not count unscored articles: {e}")
+        finally:
+            # The worker exporter scrapes on a new thread each time
+            connection.close()
+        yield backlog
+
+        depth = GaugeMetricFamily('rssapp_queue_depth', 'Messages waiting in a Celery queue', labels=['queue'])
+        for queue, messages in queue_depths().items():
+            depth.add_metric([queue], messages)
+        yield depth
+
+
+def queue_depths():
+    """Messages waiting in each configured broker queue; empty when tasks run eagerly or the broker is down."""
+    from celery import current_app
+
+    if current_app.conf.task_always_eager:
+        return {}
+    depths = {}
+    try:
+        with current_app.connection_for_read() as conn:
+            conn.ensure_connection(max_retries=1)
+            with conn.channel() as channel:
+                for queue in current_app.conf.task_queues or ():
+                    depths[queue.name] = channel.queue_declare(queue=queue.name, passive=True).message_count
+    except Exception as e:
+        logger.error(f"[metrics] Could not read queue depths: {e}")
+    return depths
+
+
+REGISTRY.register(PipelineCollector())
+
+_exit_hooks = set()
+
+
+def observe_pool(alias, stats):
+    """Publish the get_stats() of this process's pool of a database alias."""
+    pid = os.getpid()
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ and pid not in _exit_hooks:
+        # Drop the live gauges of a worker that exits, or a scrape would keep adding its last values
+        _exit_hooks.add(pid)
+        atexit.register(multiprocess.mark_process_dead, pid)
+    for stat, gauge in DB_POOL_STATS.items():
+        gauge.labels(alias).set(stats.get(stat, 0))
+
+
+_multiprocess_registry = None
+_multiprocess_lock = threading.Lock()
+
+
+def metrics_registry():
+    """The registry to scrape: this process's metrics, or those of every process sharing PROMETHEUS_MULTIPROC_DIR."""
+    global _multiprocess_registry
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    with _multiprocess_lock:
+        if _multiprocess_registry is None:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+            registry.register(PipelineCollector())
+            _multiprocess_registry = registry
+    return _multiprocess_registry
+
+
+def counter_total(counter, **labels):
+    """
+    Value of a counter summed over the children matching the given labels, and over every process sharing
+    PROMETHEUS_MULTIPROC_DIR when it is set. Only the counter is read, not the collectors that query the database
+    and the broker.
+    """
+    name = counter.describe()[0].name
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        families = multiprocess.MultiProcessCollector(None).collect()
+    else:
+        families = counter.collect()
+    return sum(sample.value for family in families if family.name == name for sample in family.samples
+               if sample.name == f"{name}_total" and labels.items() <= sample.labels.items())
+
+
+def render_metrics():
+    """Metrics in the Prometheus text format."""
+    return generate_latest(metrics_registry())
+
+
+def start_worker_exporter(port, addr='127.0.0.1'):
+    """Serve the metrics of a Celery worker over HTTP on a background thread."""
+    start_http_server(port, addr=addr, registry=metrics_registry())
+    logger.info(f"[metrics] Serving worker metrics on {addr}:{port}")
+
+
+class ViewMetricsMiddleware:
+    """Record the time of every request routed to a named URL. Works in both the WSGI and ASGI handlers."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, started)
+        return response
+
+    def observe(self, request, response, started):
+        match = request.resolver_match
+        if match is not None and match.url_name:
+            VIEW_SECONDS.labels(match.url_name, request.method, response.status_code).observe(
+                time.perf_counter() - started)
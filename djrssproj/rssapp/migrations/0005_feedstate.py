@@ -0,0 +1,27 @@
+# Generated by Django 4.2.8 on 2026-10-18 13:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0004_article_score_pubdate_id_idx_article_pubdate_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('xml_url', models.TextField(unique=True)),
+                ('etag', models.TextField(blank=True, null=True)),
+                ('last_modified', models.TextField(blank=True, null=True)),
+                ('digest', models.CharField(blank=True, max_length=32, null=True)),
+                ('last_fetched', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'feed_states',
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.8 on 2026-10-18 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0005_feedstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedstate',
+            name='consecutive_failures',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='feedstate',
+            name='next_poll',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='feedstate',
+            name='poll_interval',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='feedstate',
+            name='source',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
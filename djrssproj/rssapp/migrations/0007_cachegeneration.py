@@ -0,0 +1,24 @@
+# Generated by Django 4.2.8 on 2026-10-18 13:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0006_feedstate_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('generation', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'cache_generations',
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.8 on 2026-10-18 13:13
+
+from collections import defaultdict
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_source_stats(apps, schema_editor):
+    Article = apps.get_model('rssapp', 'Article')
+    SourceStats = apps.get_model('rssapp', 'SourceStats')
+    stats = defaultdict(lambda: {'total_count': 0, 'scored_count': 0, 'histogram': {}})
+    for row in Article.objects.values('source', 'score').annotate(count=Count('id')).order_by():
+        entry = stats[row['source']]
+        entry['total_count'] += row['count']
+        if row['score'] is not None:
+            entry['scored_count'] += row['count']
+            entry['histogram'][str(row['score'])] = row['count']
+    SourceStats.objects.bulk_create([SourceStats(source=source, **entry) for source, entry in stats.items()],
+                                    batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0007_cachegeneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.TextField(unique=True)),
+                ('total_count', models.IntegerField(default=0)),
+                ('scored_count', models.IntegerField(default=0)),
+                ('histogram', models.JSONField(default=dict)),
+            ],
+            options={
+                'db_table': 'source_stats',
+            },
+        ),
+        migrations.RunPython(backfill_source_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# The vector is a stored generated column, kept up to date by PostgreSQL on every insert and update, so
+# ingest code never writes it. It is not declared on the Article model; queries reach it through
+# rssapp.search. Adding it rewrites the articles table once.
+SEARCH_VECTOR_SQL = """
+ALTER TABLE articles ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english'::regconfig, coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(author, '')), 'B') ||
+    setweight(to_tsvector('english'::regconfig, coalesce(description, '')), 'C')
+) STORED;
+CREATE INDEX articles_search_vector_idx ON articles USING GIN (search_vector);
+-- Keep more word frequencies so the planner can tell rare search terms from common ones
+ALTER TABLE articles ALTER COLUMN search_vector SET STATISTICS 1000;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0008_sourcestats'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            SEARCH_VECTOR_SQL,
+            reverse_sql="DROP INDEX articles_search_vector_idx; ALTER TABLE articles DROP COLUMN search_vector;",
+        ),
+    ]
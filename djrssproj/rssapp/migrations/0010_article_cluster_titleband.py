@@ -0,0 +1,30 @@
+# Generated by Django 4.2.8 on 2026-10-18 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0009_article_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.BigIntegerField(db_index=True)),
+                ('article_hash', models.CharField(max_length=32)),
+                ('publication_date', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'title_bands',
+            },
+        ),
+        migrations.AddField(
+            model_name='article',
+            name='cluster_id',
+            field=models.BigIntegerField(blank=True, db_index=True, default=None, null=True),
+        ),
+    ]
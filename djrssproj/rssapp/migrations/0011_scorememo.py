@@ -0,0 +1,31 @@
+# Generated by Django 4.2.8 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0010_article_cluster_titleband'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreMemo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title_digest', models.CharField(max_length=32)),
+                ('prompt_version', models.CharField(max_length=32)),
+                ('model', models.CharField(max_length=64)),
+                ('score', models.IntegerField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'score_memos',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='scorememo',
+            constraint=models.UniqueConstraint(fields=('title_digest', 'prompt_version', 'model'), name='score_memo_key'),
+        ),
+    ]
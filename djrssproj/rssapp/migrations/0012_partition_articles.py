@@ -0,0 +1,147 @@
+from django.db import migrations, models
+
+# Rebuilds articles as a table range-partitioned by month of publication_date, with one partition for every
+# month from the oldest article to three months from now; rssapp/partitions.py creates the later ones. The
+# rows are copied, so the migration holds the old table for as long as the copy takes. Partitions cannot
+# carry a unique index without the partition key, so the uniqueness of hash moves to article_hashes, filled
+# by triggers: a duplicate raises unique_violation like the old constraint did, unless the transaction sets
+# rssapp.skip_duplicate_hashes, in which case the row is skipped as with ON CONFLICT DO NOTHING. The
+# primary key becomes (id, publication_date); ids still come from one sequence.
+PARTITION_SQL = """
+ALTER TABLE articles RENAME TO articles_unpartitioned;
+
+CREATE TABLE articles (
+    LIKE articles_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING IDENTITY
+) PARTITION BY RANGE (publication_date);
+
+DO $$
+DECLARE
+    month timestamp := date_trunc('month', coalesce((SELECT min(publication_date) FROM articles_unpartitioned), now())
+                                           AT TIME ZONE 'UTC');
+    last_month timestamp := date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months';
+BEGIN
+    WHILE month <= last_month LOOP
+        EXECUTE format('CREATE TABLE %I PARTITION OF articles FOR VALUES FROM (%L) TO (%L)',
+                       'articles_' || to_char(month, '"y"YYYY"m"MM'),
+                       month AT TIME ZONE 'UTC', (month + interval '1 month') AT TIME ZONE 'UTC');
+        month := month + interval '1 month';
+    END LOOP;
+END
+$$;
+
+INSERT INTO articles (id, hash, title, publication_date, source, link, description, source_image, image, score,
+                      author, source_url, cluster_id)
+SELECT id, hash, title, publication_date, source, link, description, source_image, image, score,
+       author, source_url, cluster_id
+FROM articles_unpartitioned;
+
+INSERT INTO article_hashes (hash, publication_date)
+SELECT hash, publication_date FROM articles_unpartitioned;
+
+SELECT setval(pg_get_serial_sequence('articles', 'id'), coalesce(max(id), 0) + 1, false) FROM articles_unpartitioned;
+
+DROP TABLE articles_unpartitioned;
+
+ALTER TABLE articles ADD CONSTRAINT articles_pkey PRIMARY KEY (id, publication_date);
+CREATE INDEX articles_hash_idx ON articles (hash);
+CREATE INDEX score_pubdate_id_idx ON articles (score, publication_date, id);
+CREATE INDEX pubdate_id_idx ON articles (publication_date, id);
+CREATE INDEX articles_cluster_id_f0c189ac ON articles (cluster_id);
+CREATE INDEX articles_search_vector_idx ON articles USING GIN (search_vector);
+ALTER TABLE articles ALTER COLUMN search_vector SET STATISTICS 1000;
+
+CREATE FUNCTION articles_register_hash() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO article_hashes (hash, publication_date) VALUES (NEW.hash, NEW.publication_date)
+    ON CONFLICT (hash) DO NOTHING;
+    IF FOUND THEN
+        RETURN NEW;
+    END IF;
+    IF current_setting('rssapp.skip_duplicate_hashes', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    RAISE unique_violation USING
+        MESSAGE = 'duplicate key value violates unique constraint "article_hashes_pkey"',
+        DETAIL = format('Key (hash)=(%s) already exists.', NEW.hash),
+        TABLE = 'articles', CONSTRAINT = 'article_hashes_pkey';
+END
+$$;
+
+CREATE FUNCTION articles_unregister_hash() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM article_hashes WHERE hash = OLD.hash;
+    RETURN NULL;
+END
+$$;
+
+-- A changed publication_date could move the row to another partition, which is a delete and an insert
+CREATE FUNCTION articles_keep_key() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.hash IS DISTINCT FROM OLD.hash OR NEW.publication_date IS DISTINCT FROM OLD.publication_date THEN
+        RAISE check_violation USING MESSAGE = 'The hash and publication_date of a stored article cannot change',
+            TABLE = 'articles';
+    END IF;
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER articles_register_hash BEFORE INSERT ON articles
+    FOR EACH ROW EXECUTE FUNCTION articles_register_hash();
+CREATE TRIGGER articles_unregister_hash AFTER DELETE ON articles
+    FOR EACH ROW EXECUTE FUNCTION articles_unregister_hash();
+CREATE TRIGGER articles_keep_key BEFORE UPDATE OF hash, publication_date ON articles
+    FOR EACH ROW EXECUTE FUNCTION articles_keep_key();
+
+ANALYZE articles;
+"""
+
+UNPARTITION_SQL = """
+ALTER TABLE articles RENAME TO articles_partitioned;
+
+CREATE TABLE articles (
+    LIKE articles_partitioned INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING IDENTITY
+);
+
+INSERT INTO articles (id, hash, title, publication_date, source, link, description, source_image, image, score,
+                      author, source_url, cluster_id)
+SELECT id, hash, title, publication_date, source, link, description, source_image, image, score,
+       author, source_url, cluster_id
+FROM articles_partitioned;
+
+SELECT setval(pg_get_serial_sequence('articles', 'id'), coalesce(max(id), 0) + 1, false) FROM articles_partitioned;
+
+DROP TABLE articles_partitioned;
+DROP FUNCTION articles_register_hash();
+DROP FUNCTION articles_unregister_hash();
+DROP FUNCTION articles_keep_key();
+
+ALTER TABLE articles ADD CONSTRAINT article_titles_db_pkey PRIMARY KEY (id);
+ALTER TABLE articles ADD CONSTRAINT article_titles_db_hash_key UNIQUE (hash);
+CREATE INDEX article_titles_db_hash_5cdd02b3_like ON articles (hash varchar_pattern_ops);
+CREATE INDEX score_pubdate_id_idx ON articles (score, publication_date, id);
+CREATE INDEX pubdate_id_idx ON articles (publication_date, id);
+CREATE INDEX articles_cluster_id_f0c189ac ON articles (cluster_id);
+CREATE INDEX articles_search_vector_idx ON articles USING GIN (search_vector);
+ALTER TABLE articles ALTER COLUMN search_vector SET STATISTICS 1000;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0011_scorememo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleHash',
+            fields=[
+                ('hash', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('publication_date', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'article_hashes',
+            },
+        ),
+        migrations.RunSQL(PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.8 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0012_partition_articles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('xml_url', models.TextField(unique=True)),
+                ('title', models.TextField(blank=True, null=True)),
+                ('html_url', models.TextField(blank=True, null=True)),
+                ('category', models.TextField(blank=True, null=True)),
+                ('enabled', models.BooleanField(default=True)),
+                ('added', models.DateTimeField(auto_now_add=True)),
+                ('disabled_since', models.DateTimeField(blank=True, null=True)),
+                ('article_count', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'feeds',
+            },
+        ),
+    ]
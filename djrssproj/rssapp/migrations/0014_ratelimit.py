@@ -0,0 +1,28 @@
+# Generated by Django 4.2.8 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0013_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimit',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('requests', models.FloatField()),
+                ('tokens', models.FloatField()),
+                ('updated', models.DateTimeField()),
+                ('blocked_until', models.DateTimeField(null=True)),
+                ('reported_request_limit', models.IntegerField(null=True)),
+                ('reported_token_limit', models.IntegerField(null=True)),
+            ],
+            options={
+                'db_table': 'rate_limits',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+
+# Migration 0012 replaced the unique constraint on articles.hash, which a partitioned table cannot have, with
+# the article_hashes registry and its triggers, and created articles_hash_idx. This brings the model state in
+# line without touching the database.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0014_ratelimit'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='article',
+                    name='hash',
+                    field=models.CharField(db_index=True, max_length=32),
+                ),
+            ],
+        ),
+    ]
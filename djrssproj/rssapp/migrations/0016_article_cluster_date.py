@@ -0,0 +1,29 @@
+# Generated by Django 4.2.8 on 2026-10-18 14:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0015_article_hash_not_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='cluster_date',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+        # Members whose first article is no longer stored keep a null cluster_date, which
+        # representative_filter() treats the same way
+        migrations.RunSQL(
+            sql="""
+                UPDATE articles AS member
+                SET cluster_date = first.publication_date
+                FROM articles AS first
+                WHERE first.id = member.cluster_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
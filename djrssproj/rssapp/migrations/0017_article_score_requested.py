@@ -0,0 +1,18 @@
+# Generated by Django 4.2.8 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rssapp', '0016_article_cluster_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='score_requested',
+            field=models.DateTimeField(blank=True, default=None, null=True),
+        ),
+    ]
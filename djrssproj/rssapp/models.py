@@ -2,7 +2,10 @@
 from django.db import models
 
 class Article(models.Model):
-    hash = models.CharField(max_length=32, unique=True)
+    # The table is partitioned by month of publication_date (rssapp/partitions.py), which PostgreSQL's unique
+    # indexes cannot span; hash is kept unique across partitions by the ArticleHash registry instead, and only
+    # indexed here (migration 0015)
+    hash = models.CharField(max_length=32, db_index=True)
     publication_date = models.DateTimeField()
     title = models.TextField()
     link = models.TextField()
@@ -13,10 +16,113 @@ class Article(models.Model):
     image = models.TextField(blank=True, null=True)
     source_url = models.TextField(blank=True, null=True)
     source_image = models.TextField(blank=True, null=True)
+    # Id of the first article of this article's near-duplicate cluster; equal to id for the representative
+    cluster_id = models.BigIntegerField(blank=True, null=True, default=None, db_index=True)
+    # publication_date of that first article, so looking it up only reads the partition of its month
+    cluster_date = models.DateTimeField(blank=True, null=True, default=None)
+    # When the title was last queued for scoring; the sweep of unscored articles leaves it to its batch, retries
+    # and rate limit deferrals for SCORING_RESEND_SECONDS
+    score_requested = models.DateTimeField(blank=True, null=True, default=None)
 
     class Meta:
         db_table = 'articles'
         indexes = [
             models.Index(fields=['score', 'publication_date', 'id'], name='score_pubdate_id_idx'),
             models.Index(fields=['publication_date', 'id'], name='pubdate_id_idx'),
-        ]
\ No newline at end of file
+        ]
+
+class ArticleHash(models.Model):
+    # Every stored article's hash, registered by a trigger on insert into articles and removed on delete.
+    # Hashes of detached partitions stay registered, so those articles are not ingested again.
+    hash = models.CharField(max_length=32, primary_key=True)
+    publication_date = models.DateTimeField()
+
+    class Meta:
+        db_table = 'article_hashes'
+
+class FeedState(models.Model):
+    xml_url = models.TextField(unique=True)
+    etag = models.TextField(blank=True, null=True)
+    last_modified = models.TextField(blank=True, null=True)
+    digest = models.CharField(max_length=32, blank=True, null=True)
+    last_fetched = models.DateTimeField(blank=True, null=True)
+    source = models.TextField(blank=True, null=True)
+    poll_interval = models.IntegerField(blank=True, null=True)
+    next_poll = models.DateTimeField(blank=True, null=True)
+    consecutive_failures = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'feed_states'
+
+class Feed(models.Model):
+    # A feed of the OPML file, kept in step with it by the sync_feeds command (rssapp/feeds.py). Feeds dropped
+    # from the file are disabled rather than deleted, keeping their counts; a feed's HTTP cache and polling
+    # state is the FeedState with the same xml_url
+    xml_url = models.TextField(unique=True)
+    title = models.TextField(blank=True, null=True)
+    html_url = models.TextField(blank=True, null=True)
+    # Title of the outline the feed is listed under
+    category = models.TextField(blank=True, null=True)
+    enabled = models.BooleanField(default=True)
+    added = models.DateTimeField(auto_now_add=True)
+    disabled_since = models.DateTimeField(blank=True, null=True)
+    article_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'feeds'
+
+class CacheGeneration(models.Model):
+    name = models.CharField(max_length=64, unique=True)
+    generation = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'cache_generations'
+
+class SourceStats(models.Model):
+    source = models.TextField(unique=True)
+    total_count = models.IntegerField(default=0)
+    scored_count = models.IntegerField(default=0)
+    # Number of scored articles per score, keyed by the score as a string
+    histogram = models.JSONField(default=dict)
+
+    class Meta:
+        db_table = 'source_stats'
+
+class TitleBand(models.Model):
+    # One LSH band of an article title's MinHash signature, for finding near-duplicate titles
+    band = models.BigIntegerField(db_index=True)
+    article_hash = models.CharField(max_length=32)
+    publication_date = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = 'title_bands'
+
+class ScoreMemo(models.Model):
+    # Score an LLM gave a title under a given prompt and model, reused instead of asking again
+    title_digest = models.CharField(max_length=32)
+    prompt_version = models.CharField(max_length=32)
+    model = models.CharField(max_length=64)
+    score = models.IntegerField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'score_memos'
+        constraints = [
+            models.UniqueConstraint(fields=['title_digest', 'prompt_version', 'model'], name='score_memo_key'),
+        ]
+
+class RateLimit(models.Model):
+    # Token buckets of an external API's request and token quotas, shared by every worker (rssapp/rate_limit.py)
+    name = models.CharField(max_length=64, primary_key=True)
+    requests = models.FloatField()
+    tokens = models.FloatField()
+    updated = models.DateTimeField()
+    # Set from Retry-After and exhausted quotas reported by the API: no reservation is ready before then
+    blocked_until = models.DateTimeField(null=True)
+    # Per-minute limits last reported by the API, used when lower than the configured ones
+    reported_request_limit = models.IntegerField(null=True)
+    reported_token_limit = models.IntegerField(null=True)
+
+    class Meta:
+        db_table = 'rate_limits'
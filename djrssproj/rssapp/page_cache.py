@@ -0,0 +1,126 @@
+# rssapp/page_cache.py
+import hashlib
+import json
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db.models import F
+from .async_db import fetch_rows
+from .metrics import PAGE_CACHE_LOOKUPS, counter_total
+from .models import CacheGeneration
+
+logger = logging.getLogger(__name__)
+
+ARTICLES = 'articles'
+
+# Query parameters that select an article page, with the value used when they are missing
+ARTICLE_PAGE_PARAMS = {
+    's': 'date',
+    'source': '',
+    'min_score': '',
+    'max_score': '',
+    'start_date': '',
+    'end_date': '',
+    'timezone': 'UTC',
+    'i': '',
+    'c': '',
+    'fields': '',
+    'q': '',
+    'collapse': '',
+}
+# Search results are ordered by rank unless s is given (SearchCursorPagination)
+SEARCH_PAGE_PARAMS = {**ARTICLE_PAGE_PARAMS, 's': 'rank'}
+PAGE_PARAMS = {'list': ARTICLE_PAGE_PARAMS, 'search': SEARCH_PAGE_PARAMS}
+
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+def get_generation(name):
+    """
+    Get the current generation of a cached data set. The counter lives in the database, so writes from
+    Celery workers invalidate every web process whatever the cache backend; it is re-read at most every
+    PAGE_CACHE_GENERATION_TTL seconds per process.
+    """
+    generation = _cached_generation(name)
+    if generation is None:
+        generation = CacheGeneration.objects.filter(name=name).values_list('generation', flat=True).first() or 0
+        _remember_generation(name, generation)
+    return generation
+
+
+async def aget_generation(name):
+    """get_generation for async views."""
+    generation = _cached_generation(name)
+    if generation is None:
+        rows = await fetch_rows(CacheGeneration.objects.filter(name=name).values_list('generation')[:1])
+        generation = rows[0][0] if rows else 0
+        _remember_generation(name, generation)
+    return generation
+
+
+def _cached_generation(name):
+    with _generations_lock:
+        cached = _generations.get(name)
+        if cached and time.monotonic() - cached[1] < settings.PAGE_CACHE_GENERATION_TTL:
+            return cached[0]
+    return None
+
+
+def _remember_generation(name, generation):
+    with _generations_lock:
+        _generations[name] = (generation, time.monotonic())
+
+
+def bump_generation(name):
+    """Invalidate every cached page of a data set. Call it in the transaction that changed the data."""
+    if not CacheGeneration.objects.filter(name=name).update(generation=F('generation') + 1):
+        _, created = CacheGeneration.objects.get_or_create(name=name, defaults={'generation': 1})
+        if not created:
+            CacheGeneration.objects.filter(name=name).update(generation=F('generation') + 1)
+
+
+def article_page_key(query_params, view='list'):
+    """
+    Cache key for the JSON bytes of an article page, from its view ('list' for /api/articles/, 'search' for
+    /api/search/) and its normalized query parameters and cursor.
+    """
+    return _page_key(query_params, view, get_generation(ARTICLES))
+
+
+async def aarticle_page_key(query_params, view='list'):
+    """article_page_key for async views."""
+    return _page_key(query_params, view, await aget_generation(ARTICLES))
+
+
+def _page_key(query_params, view, generation):
+    params = {name: query_params.get(name) or default for name, default in PAGE_PARAMS[view].items()}
+    if params['source']:
+        params['source'] = ','.join(sorted(params['source'].split(',')))
+    digest = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f"page:{ARTICLES}:{view}:json:{generation}:{digest}"
+
+
+def record_lookup(name, hit, count=1):
+    """
+    Count cache hits or misses for a data set. The counts are Prometheus counters, so they add up over every
+    process sharing PROMETHEUS_MULTIPROC_DIR whatever the cache backend.
+    """
+    PAGE_CACHE_LOOKUPS.labels(name, 'hit' if hit else 'miss').inc(count)
+
+
+def lookup_stats(name):
+    """Hits, misses and hit ratio recorded for a data set by the processes that share the metrics directory."""
+    hits = int(counter_total(PAGE_CACHE_LOOKUPS, cache=name, outcome='hit'))
+    misses = int(counter_total(PAGE_CACHE_LOOKUPS, cache=name, outcome='miss'))
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+def cache_stats(name):
+    """Lookup statistics of a cached data set, with its current generation."""
+    return {**lookup_stats(name), 'generation': get_generation(name)}
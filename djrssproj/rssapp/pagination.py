@@ -1,5 +1,5 @@
 # rssapp/pagination.py
-from rest_framework.pagination import CursorPagination
+from rest_framework.pagination import CursorPagination, _reverse_ordering
 from rest_framework.response import Response
 from urllib.parse import urlparse, parse_qs
 
@@ -26,4 +26,74 @@ class ArticleCursorPagination(CursorPagination):
         if link:
             query_params = parse_qs(urlparse(link).query)
             return query_params.get(self.cursor_query_param, [None])[0]
-        return None
\ No newline at end of file
+        return None
+
+    async def apaginate_queryset(self, queryset, request, fetch, view=None):
+        """
+        paginate_queryset for async views: DRF's cursor logic, with the page read by awaiting fetch(queryset)
+        instead of evaluating the queryset.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith('-')
+            order_attr = order.lstrip('-')
+            if self.cursor.reverse != is_reversed:
+                kwargs = {order_attr + '__lt': current_position}
+            else:
+                kwargs = {order_attr + '__gt': current_position}
+            queryset = queryset.filter(**kwargs)
+
+        # One extra row tells whether a page follows
+        results = await fetch(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+        return self.page
+
+class SearchCursorPagination(ArticleCursorPagination):
+    ordering = '-rank'
+
+    def get_ordering(self, request, queryset, view):
+        # Relevance by default; s=date and s=score order like the article list
+        if request.query_params.get('s') in ('date', 'score'):
+            return super().get_ordering(request, queryset, view)
+        return ['-rank', '-publication_date', '-id']
@@ -0,0 +1,76 @@
+# rssapp/parse_pool.py
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from .metrics import observe_parse
+from .parsing import parse_feed_batch
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def create_parse_pool(processes=None):
+    """
+    Create a process pool for CPU-bound feed parsing.
+    Workers come from a fork server (or are spawned) rather than forked from the multi-threaded Celery worker.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=processes or settings.FEED_PARSE_PROCESSES or os.cpu_count(),
+                               mp_context=context)
+
+
+def get_parse_pool():
+    """Get the process-wide parse pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_parse_pool()
+    return _pool
+
+
+def parse_feeds(feeds, cutoff_time, pool=None, batch_size=None):
+    """
+    Parse (key, feed_data) pairs in the parse pool, handing them over in batches.
+    Yields (key, articles, error) per feed as soon as its batch is parsed.
+    """
+    pool = pool or get_parse_pool()
+    batch_size = batch_size or settings.FEED_PARSE_BATCH_SIZE
+    feeds = list(feeds)
+
+    futures = {}
+    for start in range(0, len(feeds), batch_size):
+        batch = feeds[start:start + batch_size]
+        futures[pool.submit(parse_feed_batch, batch, cutoff_time)] = batch
+
+    for future in as_completed(futures):
+        try:
+            results = future.result()
+        except Exception as e:
+            # A worker died or the batch could not be pickled; report every feed in it as failed
+            logger.error(f"[parse_pool] Parse batch failed: {e}")
+            if isinstance(e, BrokenProcessPool):
+                reset_parse_pool(pool)
+            for key, _ in futures[future]:
+                yield key, [], f"{e.__class__.__name__}: {e}"
+            continue
+        # Parse times are measured in the pool processes and recorded here, where the metrics are served
+        for key, articles, error, seconds in results:
+            if not error:
+                observe_parse(seconds, len(articles))
+            yield key, articles, error
+
+
+def reset_parse_pool(broken_pool):
+    """Drop the process-wide pool if it is the broken one, so the next call starts a fresh pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken_pool:
+            _pool = None
+    broken_pool.shutdown(wait=False)
@@ -0,0 +1,214 @@
+# rssapp/parsing.py
+# Feed parsing and normalization. This module must not import Django models: it is imported
+# by the parse pool's worker processes, which do not set up Django.
+import feedparser
+import hashlib
+import logging
+import re
+import time
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+CDATA_RE = re.compile(r'<!\[CDATA\[(.*?)\]\]>', re.DOTALL)
+FILENAME_UNSAFE_RE = re.compile(r'[\\/*?:"<>|]')
+IMG_TAG_RE = re.compile(r'<img\b', re.IGNORECASE)
+
+# Stages of process_feed reported in timings
+PARSE_STAGES = ('feedparser', 'filter', 'author', 'image', 'fields')
+
+class StageClock:
+    """Add the time since the previous lap to a stage in a timings dict; does nothing without one."""
+    def __init__(self, timings):
+        self.timings = timings
+        self.last = time.perf_counter() if timings is not None else None
+
+    def lap(self, stage):
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self.last
+        self.last = now
+
+def process_feed(feed_data, cutoff_time, timings=None):
+    """
+    Process a single feed, skipping entries without a parseable publication date and entries published before
+    cutoff_time. Each derived field is computed once per entry, the feed-level fields once per feed. When timings
+    is a dict, the seconds spent in each of PARSE_STAGES are added to it.
+    """
+    logger.info("Calling 'process_feed'")
+
+    clock = StageClock(timings)
+    feed = feedparser.parse(feed_data)
+    clock.lap('feedparser')
+
+    articles = []
+    source = source_image = None
+    for entry in feed.entries:
+        published = entry.get('published_parsed') if 'published' in entry else None
+        if published is None:
+            continue
+        publication_date = datetime(*published[:6], tzinfo=timezone.utc)
+        if publication_date < cutoff_time:
+            continue
+        title = entry.title
+        article_hash = hashlib.md5(title.encode()).hexdigest()
+        clock.lap('filter')
+
+        author = extract_author(entry)
+        clock.lap('author')
+        image = extract_first_image_link(entry)
+        clock.lap('image')
+
+        if source is None:
+            source = sanitize_filename(feed.feed.title)
+            source_image = feed.feed.get('image', {}).get('href', '')
+        link = entry.link
+        articles.append({
+            'hash': article_hash,
+            'publication_date': publication_date,
+            'title': title,
+            'author': author,
+            'link': link,
+            'description': entry.get('description', ''),
+            'image': image,
+            'source': source,
+            'source_url': extract_base_url(link),
+            'source_image': source_image,
+        })
+        clock.lap('fields')
+    # Entries skipped after the last stored one
+    clock.lap('filter')
+    return articles
+
+def extract_author(entry):
+    """Extract the author from an RSS feed entry."""
+    authors = []
+
+    # Handle <dc:creator> tags (with or without CDATA)
+    dc_creators = entry.get('dc_creator') or []
+    if not isinstance(dc_creators, list):
+        dc_creators = [dc_creators]
+    for creator in dc_creators:
+        if isinstance(creator, str):
+            authors.append(strip_cdata(creator))
+
+    # Handle multiple <author> tags, before author_detail, which only repeats one of them
+    if 'authors' in entry:
+        for author in entry['authors']:
+            if 'name' in author and isinstance(author['name'], str):
+                authors.append(strip_cdata(author['name']))
+
+    # Handle <author> tags (with or without CDATA, with or without nested <name> tags)
+    author_elements = entry.get('author_detail') or []
+    if not isinstance(author_elements, list):
+        author_elements = [author_elements]
+    for author_element in author_elements:
+        if 'name' in author_element and isinstance(author_element['name'], str):
+            authors.append(author_element['name'])
+        elif isinstance(author_element, str):
+            authors.append(strip_cdata(author_element))
+
+    # Remove duplicates, keeping the order the authors were found in
+    unique_authors = dict.fromkeys(authors)
+
+    # Join multiple authors with commas and an Oxford comma before the last author
+    return join_authors_with_oxford_comma(unique_authors)
+
+def strip_cdata(text):
+    """Strip CDATA tags from a string."""
+    if not isinstance(text, (str, bytes)):
+        return text  # Return the original input if it's not a string or bytes
+    return CDATA_RE.sub(r'\1', text)
+
+def join_authors_with_oxford_comma(authors):
+    """Join authors with commas and an Oxford comma before the last author."""
+    authors_list = list(filter(None, authors))  # Filter out empty strings
+    if len(authors_list) > 2:
+        return ', '.join(authors_list[:-1]) + ', and ' + authors_list[-1]
+    elif len(authors_list) == 2:
+        return ' and '.join(authors_list)
+    elif authors_list:
+        return authors_list[0]
+    return None  # Return None instead of an empty string
+
+def extract_first_image_link(entry):
+    """Extract the first image link from an RSS feed entry."""
+    # Check for media:content or enclosure tags
+    if 'media_content' in entry:
+        media_content = entry.get('media_content', [])
+        if media_content and 'url' in media_content[0]:
+            return media_content[0]['url']
+    elif 'enclosures' in entry:
+        enclosures = entry.get('enclosures', [])
+        if enclosures and 'url' in enclosures[0]:
+            return enclosures[0]['url']
+
+    # Check for image links in description or content:encoded
+    if 'description' in entry:
+        image_url = find_image_url_in_html(entry['description'])
+        if image_url:
+            return image_url
+    for content in entry.get('content') or []:
+        image_url = find_image_url_in_html(content.get('value'))
+        if image_url:
+            return image_url
+
+    return None
+
+def sanitize_filename(filename):
+    """Sanitize the filename by removing special characters."""
+    return FILENAME_UNSAFE_RE.sub('', filename)
+
+class FirstImageFound(Exception):
+    pass
+
+class FirstImageParser(HTMLParser):
+    """Tolerant HTML tokenizer that stops at the first <img> tag and keeps its attributes."""
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.image_attrs = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'img':
+            self.image_attrs = dict(attrs)
+            raise FirstImageFound
+
+def find_image_url_in_html(html_content):
+    """Find the URL of the first image in an HTML string: its src, or else the first URL of its srcset."""
+    # Most descriptions have no image; skip tokenizing them
+    if not isinstance(html_content, str) or not IMG_TAG_RE.search(html_content):
+        return None
+    parser = FirstImageParser()
+    try:
+        parser.feed(html_content)
+    except FirstImageFound:
+        pass
+    attrs = parser.image_attrs
+    if not attrs:
+        return None
+    if attrs.get('src'):
+        return attrs['src']
+    srcset = (attrs.get('srcset') or '').split(',')[0].split()
+    return srcset[0] if srcset else None
+
+def extract_base_url(url):
+    """Extract the base URL from a full URL."""
+    parsed_url = urlparse(url)
+    return f"{parsed_url.scheme}://{parsed_url.netloc}/"
+
+def parse_feed_batch(feeds, cutoff_time):
+    """
+    Parse a batch of (key, feed_data) pairs in a parse pool worker.
+    Returns (key, articles, error, seconds) for each feed, so one malformed feed does not fail the batch.
+    """
+    results = []
+    for key, feed_data in feeds:
+        started = time.perf_counter()
+        try:
+            results.append((key, process_feed(feed_data, cutoff_time), None, time.perf_counter() - started))
+        except Exception as e:
+            results.append((key, [], f"{e.__class__.__name__}: {e}", time.perf_counter() - started))
+    return results
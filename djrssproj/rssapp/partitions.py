@@ -0,0 +1,108 @@
+# rssapp/partitions.py
+# Monthly range partitions of the articles table (migration 0012). A partition covers one calendar month of
+# publication_date in UTC and is named articles_yYYYYmMM. Queries bounded by publication_date are pruned to
+# the partitions of their months; an old month leaves the table by detaching its partition instead of a
+# DELETE of every row.
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from .models import Article
+from .page_cache import ARTICLES, bump_generation
+from .source_stats import SourceDelta, apply_deltas
+
+logger = logging.getLogger(__name__)
+
+def month_start(value):
+    """First instant of the UTC month of a datetime or ISO 8601 string."""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    """The month count months after month (before it when negative)."""
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(month):
+    return f"{Article._meta.db_table}_y{month.year}m{month.month:02d}"
+
+
+def attached_months():
+    """Start of the month of every attached partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                       "WHERE i.inhparent = %s::regclass", [Article._meta.db_table])
+        names = [name for name, in cursor.fetchall()]
+    prefix = f"{Article._meta.db_table}_y"
+    return sorted(datetime(int(name[len(prefix):len(prefix) + 4]), int(name[-2:]), 1, tzinfo=timezone.utc)
+                  for name in names if name.startswith(prefix))
+
+
+def ensure_partitions(dates):
+    """
+    Create the partitions of any months of the given publication dates that do not have one yet. The catalog is
+    read on every call rather than remembered, since another process may have detached a partition since.
+    """
+    months = {month_start(value) for value in dates if value}
+    if not months or months <= set(attached_months()):
+        return []
+
+    created = []
+    quote = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Creating partitions locks the parent table; one process at a time is enough
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"{Article._meta.db_table} partitions"])
+        existing = set(attached_months())
+        for month in sorted(months - existing):
+            name = partition_name(month)
+            cursor.execute(f"CREATE TABLE {quote(name)} PARTITION OF {quote(Article._meta.db_table)} "
+                           f"FOR VALUES FROM (%s) TO (%s)", [month, add_months(month, 1)])
+            created.append(name)
+    if created:
+        logger.info(f"[ensure_partitions] Created partitions {created}")
+    return created
+
+
+def ensure_upcoming_partitions(now=None):
+    """Create the partitions of this month and the next ARTICLE_PARTITION_MONTHS_AHEAD months."""
+    month = month_start(now or datetime.now(timezone.utc))
+    return ensure_partitions([add_months(month, ahead) for ahead in range(settings.ARTICLE_PARTITION_MONTHS_AHEAD + 1)])
+
+
+def detach_partition(month, drop=False):
+    """
+    Take one month of articles out of the table by detaching its partition, and out of the source statistics
+    in the same transaction. The detached table is kept under its name unless drop is set. Hashes of its
+    articles stay in the ArticleHash registry, so they are not ingested again.
+    """
+    month = month_start(month)
+    name = partition_name(month)
+    quote = connection.ops.quote_name
+    source, score = (quote(Article._meta.get_field(field).column) for field in ('source', 'score'))
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Detaching waits for every query on articles; give up rather than queue all new ones behind it
+        cursor.execute("SET LOCAL lock_timeout = %s", [f"{settings.ARTICLE_PARTITION_LOCK_TIMEOUT}s"])
+        cursor.execute(f"ALTER TABLE {quote(Article._meta.db_table)} DETACH PARTITION {quote(name)}")
+        cursor.execute(f"SELECT {source}, {score}, count(*) FROM {quote(name)} GROUP BY 1, 2")
+        deltas = defaultdict(SourceDelta)
+        detached = 0
+        for row_source, row_score, count in cursor.fetchall():
+            delta = deltas[row_source]
+            delta.total -= count
+            if row_score is not None:
+                delta.scored -= count
+                delta.histogram[str(row_score)] -= count
+            detached += count
+        apply_deltas(deltas)
+        if drop:
+            cursor.execute(f"DROP TABLE {quote(name)}")
+        bump_generation(ARTICLES)
+    logger.info(f"[detach_partition] {'Dropped' if drop else 'Detached'} {name} with {detached} articles")
+    return detached
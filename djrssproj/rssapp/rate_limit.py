@@ -0,0 +1,210 @@
+# rssapp/rate_limit.py
+# Requests-per-minute and tokens-per-minute limits of an external API, enforced across every worker process and
+# node. Each limiter is one row of rate_limits holding two token buckets that refill continuously at the
+# per-minute rate and hold at most burst_seconds of it. A reservation takes from both buckets in one statement,
+# timed by the database clock, and may leave them below zero: the reservation is ready once the buckets have
+# refilled past what it took, so concurrent callers are spaced out in the order they reserved. Headers of the
+# API's replies adapt the buckets: Retry-After and exhausted quotas block every worker, and reported limits and
+# remaining counts lower the buckets to the provider's own accounting.
+import logging
+import re
+from collections import namedtuple
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from django.conf import settings
+from django.db import connection
+from .models import RateLimit
+
+logger = logging.getLogger(__name__)
+
+# granted: whether the buckets were taken from; delay: seconds until the reservation is ready, or when it was
+# not granted, until one of the same size would be
+Reservation = namedtuple('Reservation', ['granted', 'delay', 'requests', 'tokens'])
+
+TABLE = RateLimit._meta.db_table
+
+# Locks the limiter's row and computes both buckets refilled up to now
+REFILLED_SQL = f"""
+locked AS (
+    SELECT name, requests, tokens, updated, blocked_until, clock_timestamp() AS now,
+           least(%(request_limit)s::float8, coalesce(reported_request_limit, %(request_limit)s::float8)) / 60
+               AS request_rate,
+           least(%(token_limit)s::float8, coalesce(reported_token_limit, %(token_limit)s::float8)) / 60
+               AS token_rate
+    FROM {TABLE} WHERE name = %(name)s::text FOR UPDATE
+), refilled AS (
+    SELECT name, now, blocked_until, request_rate, token_rate,
+           least(request_rate * %(burst)s::float8,
+                 requests + request_rate * greatest(extract(epoch FROM now - updated)::float8, 0)) AS requests,
+           least(token_rate * %(burst)s::float8,
+                 tokens + token_rate * greatest(extract(epoch FROM now - updated)::float8, 0)) AS tokens
+    FROM locked
+)"""
+
+RESERVE_SQL = f"""
+WITH {REFILLED_SQL}, reservation AS (
+    SELECT *, greatest(0, (%(requests)s::float8 - requests) / request_rate, (%(tokens)s::float8 - tokens) / token_rate,
+                       extract(epoch FROM blocked_until - now)::float8) AS delay
+    FROM refilled
+)
+UPDATE {TABLE} AS bucket SET
+    requests = r.requests - CASE WHEN r.delay <= %(max_wait)s::float8 THEN %(requests)s::float8 ELSE 0 END,
+    tokens = r.tokens - CASE WHEN r.delay <= %(max_wait)s::float8 THEN %(tokens)s::float8 ELSE 0 END,
+    updated = r.now
+FROM reservation AS r WHERE bucket.name = r.name
+RETURNING r.delay <= %(max_wait)s::float8, r.delay
+"""
+
+OBSERVE_SQL = f"""
+WITH {REFILLED_SQL}
+UPDATE {TABLE} AS bucket SET
+    requests = least(r.requests, coalesce(%(remaining_requests)s::float8, r.requests)),
+    tokens = least(r.tokens, coalesce(%(remaining_tokens)s::float8, r.tokens)),
+    updated = r.now,
+    reported_request_limit = coalesce(%(limit_requests)s::integer, bucket.reported_request_limit),
+    reported_token_limit = coalesce(%(limit_tokens)s::integer, bucket.reported_token_limit),
+    blocked_until = greatest(bucket.blocked_until, r.now + %(block)s::float8 * interval '1 second')
+FROM refilled AS r WHERE bucket.name = r.name
+"""
+
+# A refund is capped like a refill, so unused reservations never leave more than burst_seconds of tokens
+SETTLE_SQL = f"""
+WITH {REFILLED_SQL}
+UPDATE {TABLE} AS bucket SET
+    requests = r.requests,
+    tokens = least(r.token_rate * %(burst)s::float8, r.tokens + %(refund)s::float8),
+    updated = r.now
+FROM refilled AS r WHERE bucket.name = r.name
+"""
+
+CREATE_SQL = (f"INSERT INTO {TABLE} (name, requests, tokens, updated) "
+              f"VALUES (%(name)s::text, %(request_limit)s::float8 / 60 * %(burst)s::float8, "
+              f"%(token_limit)s::float8 / 60 * %(burst)s::float8, clock_timestamp()) ON CONFLICT (name) DO NOTHING")
+
+# Durations of the x-ratelimit-reset-* headers, like 1s, 6m0s, 20ms or 1h2m3.5s
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value):
+    """Seconds of a Go-style duration, or None when it cannot be read."""
+    value = value.strip()
+    parts = DURATION_PART.findall(value)
+    if not parts or ''.join(number + unit for number, unit in parts) != value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers):
+    """Seconds to wait from the retry-after-ms or Retry-After header (delay in seconds or HTTP date), or None."""
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_int(value):
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def parse_rate_limit_headers(headers):
+    """
+    Read the rate limit headers of an API reply (x-ratelimit-limit-*, x-ratelimit-remaining-*,
+    x-ratelimit-reset-* for requests and tokens, and Retry-After) into the parameters of OBSERVE_SQL.
+    """
+    headers = {name.lower(): value for name, value in headers.items()}
+    observed = {}
+    block = parse_retry_after(headers)
+    for kind in ('requests', 'tokens'):
+        observed[f'limit_{kind}'] = parse_int(headers.get(f'x-ratelimit-limit-{kind}'))
+        remaining = observed[f'remaining_{kind}'] = parse_int(headers.get(f'x-ratelimit-remaining-{kind}'))
+        # An exhausted quota is only given back when the provider resets it
+        reset = headers.get(f'x-ratelimit-reset-{kind}')
+        if remaining is not None and remaining <= 0 and reset:
+            reset = parse_duration(reset)
+            if reset is not None:
+                block = max(block or 0, reset)
+    observed['block'] = block
+    return observed
+
+
+class RateLimiter:
+    """
+    Requests and tokens per minute of one API, shared through the database by every process using it.
+    Limits are given per minute; the buckets hold burst_seconds worth of each, which is as much as an idle
+    limiter lets through at once. Calls that would wait longer than max_wait seconds are refused instead.
+    """
+    def __init__(self, name, requests_per_minute, tokens_per_minute, burst_seconds=60, max_wait=60):
+        if requests_per_minute <= 0 or tokens_per_minute <= 0:
+            raise ValueError(f"Rate limits of {name} must be positive")
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+        self.max_wait = max_wait
+
+    def _params(self, **params):
+        return {'name': self.name, 'request_limit': self.requests_per_minute, 'token_limit': self.tokens_per_minute,
+                'burst': self.burst_seconds, **params}
+
+    def _reserve_params(self, tokens, requests, max_wait):
+        return self._params(requests=requests, tokens=tokens, max_wait=self.max_wait if max_wait is None else max_wait)
+
+    def _reservation(self, row, tokens, requests):
+        granted, delay = row
+        return Reservation(granted, delay, requests if granted else 0, tokens if granted else 0)
+
+    def reserve(self, tokens, requests=1, max_wait=None):
+        """
+        Reserve requests and tokens. A granted reservation is ready after reservation.delay seconds; one that
+        would have to wait longer than max_wait is refused and takes nothing.
+        """
+        params = self._reserve_params(tokens, requests, max_wait)
+        with connection.cursor() as cursor:
+            cursor.execute(RESERVE_SQL, params)
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(CREATE_SQL, params)
+                cursor.execute(RESERVE_SQL, params)
+                row = cursor.fetchone()
+        return self._reservation(row, tokens, requests)
+
+    def settle(self, reservation, used_tokens):
+        """Give back the reserved tokens a call did not use, or take the ones it used beyond its reservation."""
+        if reservation.granted and used_tokens is not None and used_tokens != reservation.tokens:
+            with connection.cursor() as cursor:
+                cursor.execute(SETTLE_SQL, self._params(refund=reservation.tokens - used_tokens))
+
+    def observe(self, headers):
+        """Adapt the buckets to the rate limit headers of an API reply."""
+        observed = parse_rate_limit_headers(headers)
+        if not any(value is not None for value in observed.values()):
+            return
+        if observed['block']:
+            logger.warning(f"[rate_limit] {self.name} asked to wait {observed['block']:.1f}s, pausing every worker")
+        with connection.cursor() as cursor:
+            cursor.execute(OBSERVE_SQL, self._params(**observed))
+
+
+def llm_limiter():
+    """The limiter of the scoring API, configured by the LLM_* rate limit settings."""
+    return RateLimiter('openai', settings.LLM_REQUESTS_PER_MINUTE, settings.LLM_TOKENS_PER_MINUTE,
+                       burst_seconds=settings.LLM_RATE_LIMIT_BURST_SECONDS, max_wait=settings.LLM_RATE_LIMIT_MAX_WAIT)
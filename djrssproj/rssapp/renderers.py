@@ -0,0 +1,104 @@
+# rssapp/renderers.py
+import json
+from operator import attrgetter
+from django.utils import timezone
+
+# Columns read for an article row, in the order ArticleSerializer (fields='__all__') outputs them
+ARTICLE_COLUMNS = ['id', 'hash', 'publication_date', 'title', 'link', 'source', 'score', 'author', 'description',
+                   'image', 'source_url', 'source_image', 'cluster_id']
+
+# Output fields of an article, in the order ArticleSerializer outputs them
+ARTICLE_OUTPUT_FIELDS = ['id', 'local_publication_date', 'hash', 'publication_date', 'title', 'link', 'source', 'score',
+                         'author', 'description', 'image', 'source_url', 'source_image', 'cluster_id']
+
+# Named sets for the fields= parameter; compact leaves out description and the other fields list views do not show
+ARTICLE_FIELD_PRESETS = {
+    'full': ARTICLE_OUTPUT_FIELDS,
+    'compact': ['id', 'local_publication_date', 'hash', 'publication_date', 'title', 'link', 'source', 'score'],
+}
+
+# Columns every query reads, whatever the fields: the cursor is built from the ordering columns
+ARTICLE_ORDERING_COLUMNS = ['id', 'publication_date', 'score']
+
+# Same settings as DRF's JSONRenderer (UNICODE_JSON, COMPACT_JSON), so both paths produce the same bytes
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def parse_fields(value):
+    """
+    Resolve a fields= parameter (comma-separated field names and preset names) to the output fields,
+    in output order. Raises ValueError naming the unknown entries.
+    """
+    if not value:
+        return ARTICLE_OUTPUT_FIELDS
+    requested = set()
+    unknown = []
+    for name in value.split(','):
+        name = name.strip()
+        if name in ARTICLE_FIELD_PRESETS:
+            requested.update(ARTICLE_FIELD_PRESETS[name])
+        elif name in ARTICLE_OUTPUT_FIELDS:
+            requested.add(name)
+        elif name:
+            unknown.append(name)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(ARTICLE_OUTPUT_FIELDS)} "
+                         f"or the presets {', '.join(ARTICLE_FIELD_PRESETS)}")
+    return [name for name in ARTICLE_OUTPUT_FIELDS if name in requested]
+
+
+def article_columns(fields):
+    """Model columns to read for the given output fields, including the ordering columns."""
+    columns = {'publication_date' if name == 'local_publication_date' else name for name in fields}
+    columns.update(ARTICLE_ORDERING_COLUMNS)
+    return [name for name in ARTICLE_COLUMNS if name in columns]
+
+
+def format_datetime(value, tz):
+    """Format a datetime like DRF's DateTimeField: in the given timezone, with 'Z' for UTC."""
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def article_dicts(rows, client_tz, fields=ARTICLE_OUTPUT_FIELDS):
+    """
+    Output dicts of rows (named tuples with the article_columns of fields), as ArticleSerializer would produce them.
+    client_tz is resolved once by the caller instead of once per article.
+    """
+    server_tz = timezone.get_current_timezone()
+    if fields == ARTICLE_OUTPUT_FIELDS:
+        return [{
+            'id': row.id,
+            'local_publication_date': row.publication_date.astimezone(client_tz).isoformat(),
+            'hash': row.hash,
+            'publication_date': format_datetime(row.publication_date, server_tz),
+            'title': row.title,
+            'link': row.link,
+            'source': row.source,
+            'score': row.score,
+            'author': row.author,
+            'description': row.description,
+            'image': row.image,
+            'source_url': row.source_url,
+            'source_image': row.source_image,
+            'cluster_id': row.cluster_id,
+        } for row in rows]
+    getters = {
+        'local_publication_date': lambda row: row.publication_date.astimezone(client_tz).isoformat(),
+        'publication_date': lambda row: format_datetime(row.publication_date, server_tz),
+    }
+    selected = [(name, getters.get(name, attrgetter(name))) for name in fields]
+    return [{name: get(row) for name, get in selected} for row in rows]
+
+
+def encode_json(value):
+    """Encode a value to compact JSON text, with U+2028 and U+2029 escaped like DRF does for JavaScript."""
+    return _encoder.encode(value).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+
+
+def render_article_page(rows, client_tz, next_cursor, previous_cursor, fields=ARTICLE_OUTPUT_FIELDS):
+    """Render a page of rows (named tuples with the article_columns of fields) to the JSON bytes ArticleListView returns."""
+    results = article_dicts(rows, client_tz, fields)
+    return encode_json({'next_cursor': next_cursor, 'previous_cursor': previous_cursor, 'results': results}).encode()
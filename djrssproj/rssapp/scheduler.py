@@ -0,0 +1,86 @@
+# rssapp/scheduler.py
+import logging
+import random
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Min
+from .models import Article, Feed, FeedState
+
+logger = logging.getLogger(__name__)
+
+
+def due_feeds(urls, states, now):
+    """Return the URLs that are due for polling; feeds never polled before are always due."""
+    due = []
+    for url in urls:
+        state = states.get(url)
+        if state is None or state.next_poll is None or state.next_poll <= now:
+            due.append(url)
+    return due
+
+
+def rate_window_start(now):
+    """Start of the window the publishing rate is learned from."""
+    return now - timedelta(days=settings.FEED_RATE_WINDOW_DAYS)
+
+
+def count_recent(articles, now):
+    """Count the parsed articles of a feed that fall in the publishing rate window."""
+    start = rate_window_start(now)
+    return sum(1 for article in articles if article['publication_date'] >= start)
+
+
+def article_counts(sources, now):
+    """Count the stored articles of each source published in the last FEED_RATE_WINDOW_DAYS."""
+    counts = (Article.objects.filter(source__in=sources, publication_date__gte=rate_window_start(now))
+              .values('source').annotate(count=Count('id')))
+    return {row['source']: row['count'] for row in counts}
+
+
+def base_poll_interval(count):
+    """Poll about twice per expected article, within the configured bounds."""
+    if count is None:
+        return settings.FEED_POLL_DEFAULT_SECONDS
+    if not count:
+        # Nothing published in the window, check in rarely
+        return settings.FEED_POLL_MAX_SECONDS
+    interval = timedelta(days=settings.FEED_RATE_WINDOW_DAYS).total_seconds() / count
+    return min(max(interval / 2, settings.FEED_POLL_MIN_SECONDS), settings.FEED_POLL_MAX_SECONDS)
+
+
+def schedule_feeds(states, polled, failed, now, recent_counts=None):
+    """
+    Set the next poll time of every polled feed: learned from its publishing rate when the poll
+    succeeded, backed off exponentially while it keeps failing, with random jitter in both cases.
+
+    The rate comes from the publication dates of the feed's stored articles, or from recent_counts
+    (URL -> entries just parsed in the window) when that is higher, e.g. before a new feed's articles
+    have been inserted.
+    """
+    recent_counts = recent_counts or {}
+    polled_states = [states[url] for url in polled if url in states]
+    stored_counts = article_counts({state.source for state in polled_states if state.source}, now)
+
+    for state in polled_states:
+        if state.xml_url in failed:
+            state.consecutive_failures += 1
+            interval = min(settings.FEED_POLL_MIN_SECONDS * 2 ** (state.consecutive_failures - 1),
+                           settings.FEED_POLL_MAX_BACKOFF_SECONDS)
+        else:
+            state.consecutive_failures = 0
+            count = max(stored_counts.get(state.source, 0), recent_counts.get(state.xml_url, 0))
+            interval = base_poll_interval(count if state.source else None)
+
+        jitter = settings.FEED_POLL_JITTER
+        state.poll_interval = int(interval * random.uniform(1 - jitter, 1 + jitter))
+        state.next_poll = now + timedelta(seconds=state.poll_interval)
+
+
+def seconds_until_next_poll(now):
+    """Seconds until the next enabled feed is due, clamped to the scheduler's tick bounds."""
+    enabled = Feed.objects.filter(enabled=True).values('xml_url')
+    next_poll = FeedState.objects.filter(xml_url__in=enabled).aggregate(next_poll=Min('next_poll'))['next_poll']
+    if next_poll is None:
+        return settings.SCHEDULER_MIN_TICK_SECONDS
+    seconds = (next_poll - now).total_seconds()
+    return int(min(max(seconds, settings.SCHEDULER_MIN_TICK_SECONDS), settings.SCHEDULER_MAX_TICK_SECONDS))
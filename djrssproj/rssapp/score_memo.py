@@ -0,0 +1,64 @@
+# rssapp/score_memo.py
+import hashlib
+import logging
+from .clustering import normalize_title
+from .models import Article, ScoreMemo
+from .metrics import SCORE_MEMO_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+# Rows per bulk statement
+MEMO_CHUNK_SIZE = 1000
+
+
+def title_digest(title):
+    """Digest of a normalized title; case, punctuation and a trailing outlet name do not change it."""
+    return hashlib.md5(normalize_title(title).encode()).hexdigest()
+
+
+def prompt_version(prompt):
+    """Digest identifying a scoring prompt; any edit to the prompt is a new version."""
+    return hashlib.md5(prompt.encode()).hexdigest()
+
+
+def lookup_scores(articles, version, model):
+    """
+    Split (hash, title) pairs into remembered scores and titles never scored under this prompt version and model.
+    Returns ([(hash, score)], [(hash, title)]).
+    """
+    digests = {article_hash: title_digest(title) for article_hash, title in articles}
+    memo = {}
+    unique_digests = list(set(digests.values()))
+    for start in range(0, len(unique_digests), MEMO_CHUNK_SIZE):
+        memo.update(ScoreMemo.objects.filter(title_digest__in=unique_digests[start:start + MEMO_CHUNK_SIZE],
+                                             prompt_version=version, model=model)
+                    .values_list('title_digest', 'score'))
+
+    hits, misses = [], []
+    for article_hash, title in articles:
+        score = memo.get(digests[article_hash])
+        if score is None:
+            misses.append((article_hash, title))
+        else:
+            hits.append((article_hash, score))
+    # Counted in Prometheus rather than the cache: lookups happen in every Celery worker and web process
+    SCORE_MEMO_LOOKUPS.labels('hit').inc(len(hits))
+    SCORE_MEMO_LOOKUPS.labels('miss').inc(len(misses))
+    return hits, misses
+
+
+def remember_scores(scores, version, model):
+    """Store (hash, score) pairs of stored articles under a prompt version and model, keeping existing entries."""
+    scores = dict(scores)
+    titles = Article.objects.filter(hash__in=list(scores)).values_list('hash', 'title')
+    return remember_titles(((title, scores[article_hash]) for article_hash, title in titles), version, model)
+
+
+def remember_titles(title_scores, version, model):
+    """Store (title, score) pairs under a prompt version and model, keeping existing entries."""
+    memos = {}
+    for title, score in title_scores:
+        digest = title_digest(title)
+        memos.setdefault(digest, ScoreMemo(title_digest=digest, prompt_version=version, model=model, score=score))
+    ScoreMemo.objects.bulk_create(list(memos.values()), batch_size=MEMO_CHUNK_SIZE, ignore_conflicts=True)
+    return len(memos)
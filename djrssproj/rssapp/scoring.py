@@ -0,0 +1,93 @@
+# rssapp/scoring.py
+import logging
+from django.conf import settings
+from .batching import BatchBuffer
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MODEL = 'gpt-4-1106-preview'
+
+# Conservative bytes-per-token ratio used when the tiktoken encoding cannot be loaded
+FALLBACK_BYTES_PER_TOKEN = 3
+
+_encoding = None
+
+
+def get_encoding():
+    """
+    Load the tiktoken encoding for the scoring model once per process.
+    Returns None when it cannot be loaded (tiktoken downloads its BPE files on first use).
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+        except Exception as e:
+            logger.warning(f"Could not load the tiktoken encoding for {OPENAI_MODEL}, estimating token counts: {e}")
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text):
+    """Count the tokens the scoring model will see for the given text."""
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text.encode()) // FALLBACK_BYTES_PER_TOKEN + 1
+    return len(encoding.encode(text))
+
+
+def format_title_line(article_hash, title):
+    """Format one title for the scoring prompt, one title per line after 'TITLES:'."""
+    return f"Title: `{title}` Hash (\"id\"): `{article_hash}`"
+
+
+def build_scoring_message(prompt, articles):
+    """Build the user message scoring a batch of (hash, title) pairs."""
+    return prompt + '\n' + '\n'.join(format_title_line(article_hash, title) for article_hash, title in articles)
+
+
+def estimate_request_tokens(message, articles):
+    """
+    Tokens a scoring request counts against the tokens per minute quota: the prompt, and a reply of
+    LLM_COMPLETION_TOKENS_PER_TITLE tokens per title.
+    """
+    return count_tokens(message) + len(articles) * settings.LLM_COMPLETION_TOKENS_PER_TITLE
+
+
+def create_score_batcher(dispatch, prompt):
+    """
+    Create a buffer packing (hash, title) pairs into requests that fit settings.SCORING_TOKEN_BUDGET
+    together with the prompt. dispatch is called with each packed batch.
+    """
+    budget = settings.SCORING_TOKEN_BUDGET - count_tokens(prompt)
+    if budget <= 0:
+        raise ValueError(f"SCORING_TOKEN_BUDGET ({settings.SCORING_TOKEN_BUDGET}) does not fit the prompt")
+
+    return BatchBuffer(
+        dispatch,
+        max_weight=budget,
+        max_wait=settings.SCORING_FLUSH_SECONDS,
+        # One extra token for the newline separating titles
+        weight=lambda article: count_tokens(format_title_line(*article)) + 1,
+        max_items=settings.SCORING_MAX_TITLES,
+    )
+
+
+def split_rankings(rankings, articles):
+    """
+    Split a scoring response against the batch it was asked for.
+    Returns the rankings for hashes in the batch, the unknown ids returned, and the (hash, title)
+    pairs that are missing from the response.
+    """
+    titles = dict(articles)
+    scored, unknown = [], []
+    for article_data in rankings.get('articles', []):
+        if isinstance(article_data, dict) and article_data.get('id') in titles:
+            scored.append(article_data)
+        else:
+            unknown.append(article_data.get('id') if isinstance(article_data, dict) else article_data)
+
+    scored_ids = {article_data['id'] for article_data in scored}
+    missing = [(article_hash, title) for article_hash, title in titles.items() if article_hash not in scored_ids]
+    return scored, unknown, missing
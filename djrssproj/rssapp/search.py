@@ -0,0 +1,38 @@
+# rssapp/search.py
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db.models.expressions import Col, Expression
+from .models import Article
+
+# Text search configuration of the articles.search_vector column (migration 0009), queries must use the same one
+SEARCH_CONFIG = 'english'
+
+# Stand-in field for the generated articles.search_vector column, which the Article model does not declare
+SEARCH_VECTOR_FIELD = SearchVectorField()
+SEARCH_VECTOR_FIELD.set_attributes_from_name('search_vector')
+SEARCH_VECTOR_FIELD.model = Article
+
+
+class SearchVector(Expression):
+    """Reference to articles.search_vector that resolves to a column of the query's articles table alias."""
+    output_field = SEARCH_VECTOR_FIELD
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None, summarize=False, for_save=False):
+        # A real column keeps the right alias when the query is relabeled as a subquery
+        return Col(query.get_initial_alias(), SEARCH_VECTOR_FIELD)
+
+
+def parse_search_query(text):
+    """Parse user input with websearch syntax: quoted phrases, OR, and -excluded words."""
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def search_articles(queryset, text):
+    """
+    Restrict a filtered article queryset to matches of a search query, annotated with their ts_rank as rank.
+
+    Every match is ranked: the GIN index finds the matching rows, and a page ordered by rank is the top of
+    them, read with the cursor's LIMIT. Queries for very common words cost more as a result, but no match
+    is left out of the ranking however old it is.
+    """
+    query = parse_search_query(text)
+    return queryset.alias(search=SearchVector()).filter(search=query).annotate(rank=SearchRank(SearchVector(), query))
@@ -10,6 +10,14 @@ class ArticleSerializer(serializers.ModelSerializer):
         model = Article
         fields = '__all__'  # Include the new field
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Restrict the output to the fields= selection passed in by the view, if any
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     def get_local_publication_date(self, obj):
         # Get the user's timezone from the context, default to UTC if not provided
         request = self.context.get('request', None)
@@ -0,0 +1,137 @@
+# rssapp/source_stats.py
+import logging
+from collections import Counter, defaultdict
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import Lower
+from .models import Article, SourceStats
+
+logger = logging.getLogger(__name__)
+
+
+class SourceDelta:
+    """Pending change to one source's statistics."""
+    def __init__(self):
+        self.total = 0
+        self.scored = 0
+        self.histogram = Counter()
+
+    def add_score(self, score):
+        if score is not None:
+            self.scored += 1
+            self.histogram[str(score)] += 1
+
+    def remove_score(self, score):
+        if score is not None:
+            self.scored -= 1
+            self.histogram[str(score)] -= 1
+
+
+def record_inserted(articles):
+    """Count newly inserted article dicts. Call it in the transaction that inserted them."""
+    deltas = defaultdict(SourceDelta)
+    for article in articles:
+        delta = deltas[article['source']]
+        delta.total += 1
+        delta.add_score(article.get('score'))
+    apply_deltas(deltas)
+
+
+def record_score_changes(changes):
+    """
+    Move rescored articles between histogram buckets, from (source, old score, new score) triples.
+    Call it in the transaction that wrote the scores.
+    """
+    deltas = defaultdict(SourceDelta)
+    for source, old_score, new_score in changes:
+        if old_score == new_score:
+            continue
+        delta = deltas[source]
+        delta.remove_score(old_score)
+        delta.add_score(new_score)
+    apply_deltas(deltas)
+
+
+def delete_articles(queryset):
+    """Delete articles and take them out of the statistics in the same transaction."""
+    with transaction.atomic():
+        deltas = defaultdict(SourceDelta)
+        for source, score in queryset.select_for_update().values_list('source', 'score'):
+            delta = deltas[source]
+            delta.total -= 1
+            delta.remove_score(score)
+        deleted, _ = queryset.delete()
+        apply_deltas(deltas)
+    return deleted
+
+
+def apply_deltas(deltas):
+    """Apply a dict of source -> SourceDelta to the statistics table."""
+    deltas = {source: delta for source, delta in deltas.items() if delta.total or delta.histogram}
+    if not deltas:
+        return
+    if connection.vendor == 'postgresql' and not any(any(delta.histogram.values()) for delta in deltas.values()):
+        # New unscored articles only move the totals, which a single upsert can add in place
+        return increment_totals(deltas)
+    with transaction.atomic():
+        SourceStats.objects.bulk_create([SourceStats(source=source) for source in deltas], ignore_conflicts=True)
+        # Lock in a fixed order so concurrent writers cannot deadlock on each other's rows
+        rows = list(SourceStats.objects.select_for_update().filter(source__in=list(deltas)).order_by('source'))
+        for stats in rows:
+            delta = deltas[stats.source]
+            stats.total_count += delta.total
+            stats.scored_count += delta.scored
+            histogram = Counter(stats.histogram)
+            histogram.update(delta.histogram)
+            stats.histogram = {score: count for score, count in histogram.items() if count > 0}
+        SourceStats.objects.bulk_update(rows, fields=['total_count', 'scored_count', 'histogram'])
+
+
+def increment_totals(deltas):
+    """Add the deltas' total and scored counts with one INSERT ... ON CONFLICT DO UPDATE (PostgreSQL only)."""
+    quote = connection.ops.quote_name
+    table = quote(SourceStats._meta.db_table)
+    source, total, scored, histogram = (quote(SourceStats._meta.get_field(name).column)
+                                        for name in ('source', 'total_count', 'scored_count', 'histogram'))
+    items = sorted(deltas.items())
+    sql = (f"INSERT INTO {table} ({source}, {total}, {scored}, {histogram}) "
+           f"VALUES {', '.join(['(%s, %s, %s, %s::jsonb)'] * len(items))} "
+           f"ON CONFLICT ({source}) DO UPDATE SET {total} = {table}.{total} + EXCLUDED.{total}, "
+           f"{scored} = {table}.{scored} + EXCLUDED.{scored}")
+    params = [value for name, delta in items for value in (name, delta.total, delta.scored, '{}')]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def count_in_range(histogram, min_score=None, max_score=None):
+    """Count the scored articles of a histogram within an inclusive score range."""
+    return sum(count for score, count in histogram.items()
+               if (min_score is None or int(score) >= min_score) and (max_score is None or int(score) <= max_score))
+
+
+def source_stats():
+    """Statistics of every source with articles, ordered by name like the article queries were."""
+    return SourceStats.objects.filter(total_count__gt=0).order_by(Lower('source'))
+
+
+def rebuild_source_stats():
+    """Recompute the whole statistics table from the articles table."""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Wait for in-flight writers and hold off new ones, so no delta lands between the scan and the rewrite
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {connection.ops.quote_name(SourceStats._meta.db_table)} IN EXCLUSIVE MODE")
+
+        stats = defaultdict(lambda: SourceStats(histogram={}))
+        for row in Article.objects.values('source', 'score').annotate(count=Count('id')).order_by():
+            entry = stats[row['source']]
+            entry.source = row['source']
+            entry.total_count += row['count']
+            if row['score'] is not None:
+                entry.scored_count += row['count']
+                entry.histogram[str(row['score'])] = row['count']
+
+        SourceStats.objects.all().delete()
+        SourceStats.objects.bulk_create(stats.values(), batch_size=1000)
+    logger.info(f"[rebuild_source_stats] Rebuilt statistics for {len(stats)} sources")
+    return len(stats)
@@ -1,266 +1,309 @@
 # rssapp/tasks.py
-from .models import Article
+from .models import Article, CacheGeneration
+from .feed_cache import (conditional_headers, forget_feed_body, get_feed_state, load_feed_states, refresh_feed_state,
+                         save_feed_states, touch_feed_state)
+from .batching import BatchBuffer
+from .clustering import assign_clusters, propagate_cluster_scores, representative_filter, represented_clusters
+from .feeds import count_feed_articles, count_feed_errors, enabled_feeds
+from .fetcher import fetch_feeds
+from .hash_index import get_hash_index
+from .ingest import insert_articles, mark_score_requested, update_scores
+from .metrics import (ARTICLES_INSERTED, ARTICLES_SKIPPED, LLM_DEFERRED, LLM_RATE_LIMIT_WAIT_SECONDS, LLM_REQUEST_SECONDS,
+                      LLM_RETRIES, LLM_TOKENS, TASKS_PUBLISHED, TASKS_STARTED, observe_fetch, observe_parse,
+                      start_worker_exporter)
+from .page_cache import bump_generation
+from .parse_pool import parse_feeds
+from .parsing import process_feed
+from .rate_limit import Reservation, llm_limiter
+from .scheduler import count_recent, due_feeds, schedule_feeds, seconds_until_next_poll
+from .score_memo import lookup_scores, prompt_version, remember_scores
+from .scoring import OPENAI_MODEL, build_scoring_message, create_score_batcher, estimate_request_tokens, split_rankings
 from celery import shared_task
 from django.core.management import call_command
-from django.db import transaction
-from django.db.utils import IntegrityError
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
-import feedparser
-import hashlib
 import json
 import logging
-import re
 import requests
-import xml.etree.ElementTree as ET
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from celery.exceptions import MaxRetriesExceededError
-from celery.signals import task_prerun, task_postrun
-from django.db import connection
-from urllib.parse import urlparse
+from celery.signals import before_task_publish, task_prerun, task_postrun, worker_ready
+from django.db import connection, transaction
+from django.db.models import Q
 
 logger = logging.getLogger(__name__)
 
-# Constants for rate limiting
-MAX_REQUESTS_PER_MINUTE = 250  # Adjust as needed
-NUM_WORKERS = 1
-RATE_LIMIT_PER_WORKER = MAX_REQUESTS_PER_MINUTE / NUM_WORKERS
-
 # Default number of hours to read articles from
 DEFAULT_HOURS = 800
 
+# Every start of the update articles loop takes the next generation of this counter; a pass of an older
+# generation stops instead of running and requeuing, so a restarted worker replaces the loop rather than
+# adding one
+UPDATE_LOOP = 'update_articles_loop'
+
+# Buffer packing unscored articles into scoring requests, created on first use
+_score_batcher = None
+_score_batcher_lock = threading.Lock()
+
+# Score updates from concurrent API responses are coalesced into one statement per batch
+SCORE_WRITE_BATCH_SIZE = 1000
+SCORE_WRITE_FLUSH_SECONDS = 1
+SCORE_WRITE_TIMEOUT = 60
+_score_writer = None
+_score_writer_lock = threading.Lock()
+
 @task_prerun.connect
 def close_old_connections(**kwargs):
-    # Close the old database connections
+    # Return any connection left over from outside a task to the pool (rssapp/db_backend)
     connection.close()
 
 @task_postrun.connect
 def close_connection_again(**kwargs):
-    # Close the database connection again
+    # Return the task's connection to the pool for the next task, on any thread
     connection.close()
 
+@before_task_publish.connect
+def count_published_task(sender=None, properties=None, **kwargs):
+    priority = (properties or {}).get('priority')
+    TASKS_PUBLISHED.labels(sender, str(priority)).inc()
+
+@task_prerun.connect
+def count_started_task(task=None, **kwargs):
+    priority = (task.request.delivery_info or {}).get('priority')
+    TASKS_STARTED.labels(task.name, str(priority)).inc()
+
+@worker_ready.connect
+def start_metrics_exporter(**kwargs):
+    # Serve the worker's metrics; the web processes serve theirs from /metrics
+    if settings.METRICS_WORKER_PORT:
+        start_worker_exporter(settings.METRICS_WORKER_PORT, settings.METRICS_WORKER_ADDR)
+
+@worker_ready.connect
+def start_update_loop(**kwargs):
+    # Started by the worker only, so a manage.py command such as the system check run before the services start
+    # does not queue another loop
+    if settings.USE_CELERY:
+        start_update_articles_loop()
+
+def start_update_articles_loop():
+    """Start the update articles loop, superseding the loop already queued if any."""
+    with transaction.atomic():
+        bump_generation(UPDATE_LOOP)
+        generation = CacheGeneration.objects.get(name=UPDATE_LOOP).generation
+    logger.info(f"Starting update articles loop {generation}")
+    update_articles_command.delay(generation)
+
 @shared_task
-def update_articles_command():
-    """Call 'update_articles' management command."""
+def update_articles_command(generation=None):
+    """Call 'update_articles' management command, which requeues this task once its feed download is done."""
+    current = CacheGeneration.objects.filter(name=UPDATE_LOOP).values_list('generation', flat=True).first()
+    if generation != current:
+        logger.info(f"Stopping update articles loop {generation}, superseded by loop {current}")
+        return
     logger.info("Calling 'update_articles' management command")
 
-    call_command('update_articles')
-    requeue_update_articles.apply_async()
+    call_command('update_articles', loop=False, requeue=generation)
 
 @shared_task
-def requeue_update_articles():
-    """Requeue the 'update_articles_command' task."""
-    logger.info("Requeuing 'update_articles_command'")
-    update_articles_command.apply_async()
+def requeue_update_articles(generation=None):
+    """Requeue the 'update_articles_command' task for when the next feed is due."""
+    countdown = seconds_until_next_poll(datetime.now(timezone.utc))
+    logger.info(f"Requeuing 'update_articles_command' in {countdown}s")
+    update_articles_command.apply_async(args=[generation], countdown=countdown)
 
 @shared_task
 def query_articles_with_null_score():
     """Query all articles with a score of null."""
     logger.info("Querying articles with null score")
 
-    # Filter articles where score is None
-    articles_with_null_score = Article.objects.filter(score__isnull=True)
+    # Members of scored clusters take the representative's score instead of being sent to the API
+    copied = propagate_cluster_scores()
+    if copied:
+        logger.info(f"Copied cluster scores to {copied} articles")
+
+    # Filter articles where score is None, leaving out cluster members that wait for their representative and
+    # titles queued recently enough to still be in a batch, retried or deferred by the rate limiter
+    resend_before = datetime.now(timezone.utc) - timedelta(seconds=settings.SCORING_RESEND_SECONDS)
+    articles_with_null_score = (Article.objects.filter(score__isnull=True).filter(representative_filter())
+                                .filter(Q(score_requested__isnull=True) | Q(score_requested__lt=resend_before)))
+
+    # Pack the articles into token-budgeted scoring requests and send them right away
+    articles = list(articles_with_null_score.values_list('hash', 'title'))
+    logger.info(f"Queueing {len(articles)} articles with null score for scoring")
+    enqueue_for_scoring(articles, flush=True)
+
+def get_score_batcher():
+    """Get the process-wide buffer that packs unscored articles into scoring requests."""
+    global _score_batcher
+    with _score_batcher_lock:
+        if _score_batcher is None:
+            _score_batcher = create_score_batcher(dispatch_scoring_batch, settings.PROMPT)
+    return _score_batcher
+
+def enqueue_for_scoring(articles, flush=False):
+    """
+    Queue (hash, title) pairs for scoring. Titles already scored under the current prompt and model get
+    their remembered score right away; the rest are marked as requested and batched, partial batches being sent
+    after SCORING_FLUSH_SECONDS, or immediately when flush is set.
+    """
+    remembered, articles = lookup_scores(articles, prompt_version(settings.PROMPT), OPENAI_MODEL)
+    if remembered:
+        logger.info(f"[enqueue_for_scoring] Reusing remembered scores for {len(remembered)} articles")
+        write_scores(remembered)
+
+    if articles:
+        mark_score_requested([article_hash for article_hash, _ in articles], datetime.now(timezone.utc))
+    batcher = get_score_batcher()
+    batcher.add(articles)
+    if flush:
+        batcher.flush()
+
+def dispatch_scoring_batch(articles):
+    """Send one packed batch of (hash, title) pairs to the OpenAI API."""
+    logger.info(f"Dispatching scoring request for {len(articles)} articles")
+    query_openai_api.apply_async(args=[articles, settings.PROMPT], priority=3)
 
-    # Perform an action with the articles, e.g., log their titles
-    for article in articles_with_null_score:
-        logger.info(f"Querying article with null score: {article.hash}")
-        query_openai_api.apply_async(args=[article.title, settings.PROMPT, article.hash], priority=3)
-        
 
 @shared_task
-def download_rss_feeds(opml_content, hours=DEFAULT_HOURS):
-    """Download RSS feeds and process them individually."""
+def download_rss_feeds(feed_ids=None, hours=DEFAULT_HOURS):
+    """
+    Download the enabled feeds with the given ids, or all enabled feeds, concurrently and process them.
+    feed_ids may also be an OPML document, from messages queued by older versions.
+    """
     logger.info("Calling 'download_rss_feeds'")
 
-    cutoff_time = datetime.now(timezone.utc) - timedelta(hours=int(hours))
-    root = ET.fromstring(opml_content)
-    outlines = (outline.get('xmlUrl') for outline in root.findall(".//outline") if outline.get('xmlUrl'))
-    
-    # Get the scored article hashes once to avoid repeated database hits
-    scored_hashes = get_scored_article_hashes()
+    now = datetime.now(timezone.utc)
+    cutoff_time = now - timedelta(hours=int(hours))
+    feed_ids_by_url = {feed.xml_url: feed.id for feed in enabled_feeds(feed_ids)}
+    if not feed_ids_by_url:
+        logger.warning("[download_rss_feeds] No enabled feeds, run the 'sync_feeds' command to register the OPML file")
+        return
+    feed_urls = list(feed_ids_by_url)
 
-    # Call fetch_feed asynchronously for each feed URL
-    for url in outlines:
-        # Dispatch fetch_feed task asynchronously for each feed URL
-        fetch_feed.apply_async(args=[url, cutoff_time, scored_hashes], priority=1)
+    # Only poll the feeds whose scheduled time has come
+    states = load_feed_states(feed_urls)
+    urls = due_feeds(feed_urls, states, now)
+    logger.info(f"[download_rss_feeds] {len(urls)} of {len(feed_urls)} feeds are due")
 
-def get_scored_article_hashes():
-    """Get hashes of articles with a score greater than or equal to 0."""
-    logger.info("Calling 'get_scored_article_hashes'")
+    # Send the stored validators so unchanged feeds come back as 304 Not Modified
+    headers_by_url = {url: conditional_headers(states.get(url)) for url in urls}
 
-    return list(Article.objects.filter(score__gte=0).values_list('hash', flat=True))
+    # Download the whole batch concurrently in one event loop over pooled connections, without holding a
+    # database connection
+    connection.close()
+    results, stats = fetch_feeds(urls, headers_by_url=headers_by_url)
+    logger.info(f"[download_rss_feeds] Fetched {stats}")
+
+    unchanged = 0
+    changed = []
+    failed = set()
+    recent_counts = {}
+    for result in results:
+        if result.not_modified:
+            touch_feed_state(states, result.url)
+        elif not result.ok:
+            logger.error(f"Error fetching {result.url}: {result.error}")
+            get_feed_state(states, result.url)
+            failed.add(result.url)
+        elif refresh_feed_state(states, result.url, result.headers, result.body):
+            changed.append((result.url, result.body))
+        else:
+            unchanged += 1
+
+    # Parse the changed feeds in the process pool, this thread only stores the results
+    for url, articles, error in parse_feeds(changed, cutoff_time):
+        if error:
+            # Drop the validators so the feed is downloaded and processed again next time
+            logger.error(f"Error processing {url}: {error}")
+            forget_feed_body(states, url)
+            failed.add(url)
+        else:
+            if articles:
+                states[url].source = articles[0]['source']
+                recent_counts[url] = count_recent(articles, now)
+            store_articles(articles, feed_ids_by_url[url])
+
+    schedule_feeds(states, urls, failed, now, recent_counts)
+    save_feed_states(states)
+    count_feed_errors(failed)
+    logger.info(f"[download_rss_feeds] Skipped {stats.not_modified} not modified and {unchanged} unchanged feeds")
 
 @shared_task
-def fetch_feed(url, cutoff_time, scored_hashes):
-    """Fetch a single feed and process it."""
+def fetch_feed(url, cutoff_time, scored_hashes=None):
+    """
+    Fetch a single feed and process it.
+    scored_hashes is no longer used and is only accepted for messages queued by older versions.
+    """
     logger.info(f"Calling 'fetch_feed' on url: {url}")
 
+    states = load_feed_states([url])
+    # Hand the connection back to the pool for the length of the download
+    connection.close()
+
+    started = time.perf_counter()
     try:
-        response = requests.get(url, timeout=10)
+        response = requests.get(url, headers=conditional_headers(states.get(url)), timeout=10)
         response.raise_for_status()
-        feed_data = response.text
-        # Process the feed data immediately after fetching
-        process_and_store_articles(feed_data, cutoff_time, scored_hashes)
     except requests.RequestException as e:
+        observe_fetch(url, time.perf_counter() - started, 'error')
         logger.error(f"Error fetching {url}: {e}")
+        return
+    observe_fetch(url, time.perf_counter() - started, 'not_modified' if response.status_code == 304 else 'ok',
+                  size=int(response.headers.get('Content-Length') or len(response.content)))
+
+    if response.status_code == 304:
+        logger.info(f"[fetch_feed] Feed not modified: {url}")
+        touch_feed_state(states, url)
+    elif refresh_feed_state(states, url, response.headers, response.content):
+        # Process the feed data immediately after fetching
+        process_and_store_articles(response.content, cutoff_time)
+    else:
+        logger.info(f"[fetch_feed] Feed body unchanged: {url}")
+    save_feed_states(states)
 
-def process_and_store_articles(feed_data, cutoff_time, scored_hashes):
+def process_and_store_articles(feed_data, cutoff_time):
     """Process and store articles from a single feed result."""
     logger.info("Calling 'process_and_store_articles'")
 
     # Process the feed data (assuming feed_data is not a list of results but a single feed's result)
-    articles = process_feed(feed_data, cutoff_time, scored_hashes)
-    
-    # Flatten the list if necessary and insert articles to the database
+    started = time.perf_counter()
+    articles = process_feed(feed_data, cutoff_time)
+    observe_parse(time.perf_counter() - started, len(articles))
+    store_articles(articles)
+
+def store_articles(articles, feed_id=None):
+    """Queue the articles of one feed for insertion, skipping hashes already in the shared index."""
+    known_hashes = get_hash_index()
+    articles = [article for article in articles if article['hash'] not in known_hashes]
     if articles:
-        insert_articles_to_db.apply_async(args=[articles], priority=2)
-
-def process_feed(feed_data, cutoff_time, scored_hashes):
-    """Process a single feed."""
-    logger.info("Calling 'process_feed'")
-
-    feed = feedparser.parse(feed_data)
-
-    return [
-        {
-            'hash': hashlib.md5(entry.title.encode()).hexdigest(),
-            'publication_date': datetime(*entry.published_parsed[:6], tzinfo=timezone.utc),
-            'title': entry.title,
-            'author': extract_author(entry),
-            'link': entry.link,
-            'description': entry.get('description', ''),
-            'image': extract_first_image_link(entry),
-            'source': sanitize_filename(feed.feed.title),
-            'source_url': extract_base_url(entry.link),
-            'source_image': feed.feed.get('image', {}).get('href', ''),
-        }
-        for entry in feed.entries
-        if 'published' in entry
-        and datetime(*entry.published_parsed[:6], tzinfo=timezone.utc) >= cutoff_time
-        and hashlib.md5(entry.title.encode()).hexdigest() not in scored_hashes
-    ]
-
-def extract_author(entry):
-    """Extract the author from an RSS feed entry."""
-    authors = []
-
-    # Handle <dc:creator> tags (with or without CDATA)
-    dc_creators = entry.get('dc_creator') or []
-    if not isinstance(dc_creators, list):
-        dc_creators = [dc_creators]
-    for creator in dc_creators:
-        if isinstance(creator, str):
-            authors.append(strip_cdata(creator))
-
-    # Handle <author> tags (with or without CDATA, with or without nested <name> tags)
-    author_elements = entry.get('author_detail') or []
-    if not isinstance(author_elements, list):
-        author_elements = [author_elements]
-    for author_element in author_elements:
-        if 'name' in author_element and isinstance(author_element['name'], str):
-            authors.append(author_element['name'])
-        elif isinstance(author_element, str):
-            authors.append(strip_cdata(author_element))
-
-    # Handle multiple <author> tags
-    if 'authors' in entry:
-        for author in entry['authors']:
-            if 'name' in author and isinstance(author['name'], str):
-                authors.append(strip_cdata(author['name']))
-
-    # Remove duplicates
-    unique_authors = set(authors)
-
-    # Join multiple authors with commas and an Oxford comma before the last author
-    return join_authors_with_oxford_comma(unique_authors)
-
-def strip_cdata(text):
-    """Strip CDATA tags from a string."""
-    if not isinstance(text, (str, bytes)):
-        return text  # Return the original input if it's not a string or bytes
-    cdata_pattern = re.compile(r'<!\[CDATA\[(.*?)\]\]>', re.DOTALL)
-    return cdata_pattern.sub(r'\1', text)
-
-def join_authors_with_oxford_comma(authors):
-    """Join authors with commas and an Oxford comma before the last author."""
-    authors_list = list(filter(None, authors))  # Filter out empty strings
-    if len(authors_list) > 2:
-        return ', '.join(authors_list[:-1]) + ', and ' + authors_list[-1]
-    elif len(authors_list) == 2:
-        return ' and '.join(authors_list)
-    elif authors_list:
-        return authors_list[0]
-    return None  # Return None instead of an empty string
-
-def extract_first_image_link(entry):
-    """Extract the first image link from an RSS feed entry."""
-    # Check for media:content or enclosure tags
-    if 'media_content' in entry:
-        media_content = entry.get('media_content', [])
-        if media_content and 'url' in media_content[0]:
-            return media_content[0]['url']
-    elif 'enclosures' in entry:
-        enclosures = entry.get('enclosures', [])
-        if enclosures and 'url' in enclosures[0]:
-            return enclosures[0]['url']
-
-    # Check for image links in description or content:encoded
-    if 'description' in entry:
-        image_url = find_image_url_in_html(entry['description'])
-        if image_url:
-            return image_url
-    if 'content' in entry and 'value' in entry['content']:
-        image_url = find_image_url_in_html(entry['content']['value'])
-        if image_url:
-            return image_url
-
-    return None
-
-def sanitize_filename(filename):
-    """Sanitize the filename by removing special characters."""
-    logger.info("Calling 'sanitize_filename'")
-
-    return re.sub(r'[\\/*?:"<>|]', "", filename)
-
-def find_image_url_in_html(html_content):
-    """Find the first image URL in an HTML string."""
-    try:
-        # Parse the HTML content
-        root = ET.fromstring(f'<root>{html_content}</root>')
-        # Find the first img tag and return its src or srcset attribute
-        img_tag = root.find('.//img')
-        if img_tag is not None:
-            # Prefer src attribute, but if not present, look for srcset
-            return img_tag.get('src') or img_tag.get('srcset').split(',')[0].split()[0]
-    except ET.ParseError:
-        # Handle cases where the HTML content is not well-formed
-        pass
-    return None
-
-def extract_base_url(url):
-    """Extract the base URL from a full URL."""
-    parsed_url = urlparse(url)
-    return f"{parsed_url.scheme}://{parsed_url.netloc}/"
+        insert_articles_to_db.apply_async(args=[articles, feed_id], priority=2)
 
 @shared_task
-def insert_articles_to_db(articles):
+def insert_articles_to_db(articles, feed_id=None):
     articles_str = '\n'.join(json.dumps(article, indent=2, cls=CustomJSONEncoder) for article in articles)
     logger.info(f"Calling 'insert_articles_to_db' on articles:\n{articles_str}")
 
-    for article_data in articles:
-        try:
-            with transaction.atomic():
-                article, created = Article.objects.get_or_create(
-                    hash=article_data['hash'],
-                    defaults=article_data
-                )
-            if created:
-                logger.info(f"[insert_articles_to_db] Inserted article with hash: {article_data['hash']}")
-                query_openai_api.apply_async(args=[article.title, settings.PROMPT, article.hash], priority=3)
-            else:
-                logger.error(f"[insert_articles_to_db] Article with hash: {article_data['hash']} already exists in the database, not inserted")
-        except IntegrityError as e:
-            logger.error(f"[insert_articles_to_db] Error inserting article: {e}")
+    # Insert the whole batch in one statement, skipping hashes that already exist
+    new_hashes = insert_articles(articles)
+    inserted = [(article['hash'], article['title']) for article in articles if article['hash'] in new_hashes]
+    ARTICLES_INSERTED.inc(len(inserted))
+    ARTICLES_SKIPPED.inc(len(articles) - len(inserted))
+    if feed_id is not None and inserted:
+        count_feed_articles(feed_id, len(inserted))
+    logger.info(f"[insert_articles_to_db] Inserted {len(inserted)} articles, skipped {len(articles) - len(inserted)} existing: "
+                f"{[article_hash for article_hash, _ in inserted]}")
+
+    # Record new articles, and heal any hashes the shared index missed
+    get_hash_index().update(article['hash'] for article in articles)
+
+    # Only the rows that were actually new need scoring, and only one per near-duplicate cluster
+    if inserted:
+        joined = assign_clusters(new_hashes)
+        to_score = [(article_hash, title) for article_hash, title in inserted if article_hash not in joined]
+        if to_score:
+            enqueue_for_scoring(to_score)
 
 class CustomJSONEncoder(json.JSONEncoder):
     """JSON Encoder that converts datetime objects to ISO format strings."""
@@ -271,11 +314,16 @@ class CustomJSONEncoder(json.JSONEncoder):
         # Let the base class default method raise the TypeError
         return json.JSONEncoder.default(self, obj)
 
-# Set the rate limit to 250 requests per minute (250/m)
-@shared_task(bind=True, rate_limit=f'{RATE_LIMIT_PER_WORKER}/m')
-def query_openai_api(self, title, prompt, article_hash, retry_count=0):
-    """Query the OpenAI API with the given text and prompt."""
-    logger.info(f"Querying OpenAI API for article: {article_hash}")
+# Limited across all workers by the shared rate limiter rather than Celery's per-worker rate_limit
+@shared_task(bind=True)
+def query_openai_api(self, articles, prompt, retry_count=0, reservation=None):
+    """
+    Query the OpenAI API to score a batch of (hash, title) pairs with the given prompt. The request reserves its
+    share of the quota and is re-queued to run when the reservation is ready, instead of holding a worker thread
+    while it waits; reservation is then the one it already holds. When the wait would be longer than
+    LLM_RATE_LIMIT_MAX_WAIT nothing is reserved, and the request is re-queued to try again.
+    """
+    logger.info(f"Querying OpenAI API for {len(articles)} articles")
 
     if not hasattr(settings, 'OPENAI_API_KEY'):
         raise ImproperlyConfigured('The OpenAI API key has not been set in the Django settings.')
@@ -284,33 +332,71 @@ def query_openai_api(self, title, prompt, article_hash, retry_count=0):
         'Authorization': f'Bearer {settings.OPENAI_API_KEY}',
         'Content-Type': 'application/json'
     }
+    message = build_scoring_message(prompt, articles)
     data = {
-        'model': 'gpt-4-1106-preview',
+        'model': OPENAI_MODEL,
         'messages': [
             {'role': 'system', 'content': 'You are a helpful assistant.'},
-            {'role': 'user', 'content': f"{prompt}Title: `{title}` Hash (\"id\"): `{article_hash}`"}
+            {'role': 'user', 'content': message}
         ],
         'temperature': 0,
     }
 
+    limiter = llm_limiter()
+    if reservation is not None:
+        reservation = Reservation(*reservation)
+    else:
+        reservation = limiter.reserve(estimate_request_tokens(message, articles))
+        if reservation.granted:
+            LLM_RATE_LIMIT_WAIT_SECONDS.observe(reservation.delay)
+        if not reservation.granted or reservation.delay > 0:
+            # Re-queued rather than retried, waiting for the quota is not a failure
+            logger.info(f"[query_openai_api] Rate limit {'reserved' if reservation.granted else 'spent'}, "
+                        f"re-queueing {len(articles)} articles in {reservation.delay:.1f}s")
+            LLM_DEFERRED.inc()
+            kwargs = {'retry_count': retry_count}
+            if reservation.granted:
+                kwargs['reservation'] = list(reservation)
+            query_openai_api.apply_async(args=[articles, prompt], kwargs=kwargs, countdown=reservation.delay,
+                                         priority=3)
+            return None
+
+    started = time.perf_counter()
     try:
-        response = requests.post('https://api.openai.com/v1/chat/completions', headers=headers, json=data, timeout=30)
+        response = requests.post(settings.OPENAI_API_URL, headers=headers, json=data, timeout=30)
+        # A 429's Retry-After pauses every worker, not just this retry
+        limiter.observe(response.headers)
         response.raise_for_status()
         response_content = response.json()
+        LLM_REQUEST_SECONDS.labels('ok').observe(time.perf_counter() - started)
+        usage = response_content.get('usage') or {}
+        limiter.settle(reservation, usage.get('total_tokens'))
+        LLM_TOKENS.labels('prompt').inc(usage.get('prompt_tokens', 0))
+        LLM_TOKENS.labels('completion').inc(usage.get('completion_tokens', 0))
         rankings = json.loads(response_content['choices'][0]['message']['content'].strip('`').replace('json\n', '', 1).strip())
 
-        # Check if the 'id' in the response matches the article_hash
-        for article_data in rankings.get('articles', []):
-            if article_data['id'] != article_hash:
-            # If the 'id' does not match, log an error and retry
-                logger.error(f"Mismatched hash in response. Expected: {article_hash}, Received: {rankings.get('id')}")
-                raise ValueError("Mismatched hash in response")
-
-        process_api_response.apply_async(args=[rankings], priority=4)
-        logger.info(f"OpenAI API call successful for article hash: {article_hash}")
+        # Only accept scores for ids that belong to this batch
+        scored, unknown, missing = split_rankings(rankings, articles)
+        if unknown:
+            logger.error(f"Ignoring {len(unknown)} ids in response that are not in the batch: {unknown}")
+        if not scored:
+            raise ValueError("No scores for the batch in response")
+
+        process_api_response.apply_async(args=[{'articles': scored}],
+                                         kwargs={'prompt_version': prompt_version(prompt), 'model': OPENAI_MODEL},
+                                         priority=4)
+        logger.info(f"OpenAI API call successful for {len(scored)} of {len(articles)} articles")
+
+        # Re-queue only the titles the response left out
+        if missing:
+            logger.warning(f"Re-queueing {len(missing)} articles missing from response: {[h for h, _ in missing]}")
+            enqueue_for_scoring(missing)
         return rankings
-    except (requests.exceptions.RequestException, ValueError) as e:
-        logger.error(f"OpenAI API request failed or hash mismatch: {e}")
+    except (requests.exceptions.RequestException, ValueError, KeyError, IndexError) as e:
+        if isinstance(e, requests.exceptions.RequestException):
+            LLM_REQUEST_SECONDS.labels('error').observe(time.perf_counter() - started)
+        logger.error(f"OpenAI API request failed or returned no usable scores: {e}")
+        LLM_RETRIES.inc()
         # Calculate the delay for the exponential backoff
         countdown = min(2 ** retry_count, 3600)  # Cap the delay at 1 hour
         retry_count += 1
@@ -318,28 +404,55 @@ def query_openai_api(self, title, prompt, article_hash, retry_count=0):
         raise self.retry(exc=e, countdown=countdown, max_retries=5, kwargs={'retry_count': retry_count})
 
 @shared_task(bind=True)
-def process_api_response(self, rankings):
-    """Process the API response and update article scores."""
+def process_api_response(self, rankings, prompt_version=None, model=None):
+    """
+    Process the API response and update article scores. The scores are remembered under the prompt version
+    and model they were given with, when the caller passes them.
+    """
     logger.info(f"Processing API response for article rankings: {json.dumps(rankings, indent=4)}")
 
-    # Iterate over the list of articles in the rankings dictionary
+    scores = []
+    invalid = []
     for article_data in rankings.get('articles', []):
-        article_hash = article_data.get('id')
-        article_score = article_data.get('score')
+        try:
+            scores.append((article_data['id'], int(article_data['score'])))
+        except (KeyError, TypeError, ValueError):
+            invalid.append(article_data)
+    if invalid:
+        logger.error(f"[process_api_response] Skipping {len(invalid)} entries with an invalid format: {invalid}")
 
-        # Update the article score in the database
+    # Scores from concurrent responses are coalesced into one UPDATE; wait until ours is written
+    try:
+        for future in get_score_writer().add(scores):
+            future.result(timeout=SCORE_WRITE_TIMEOUT)
+        if prompt_version and model:
+            remember_scores(scores, prompt_version, model)
+    except Exception as e:
+        logger.error(f"[process_api_response] Error updating scores for {len(scores)} articles: {e}")
         try:
-            with transaction.atomic():
-                article = Article.objects.get(hash=article_hash)
-                article.score = article_score
-                article.save()
-                logger.info(f"[process_api_response] Updated score for article with hash: {article_hash}")
-        except KeyError:
-            logger.error(f"[process_api_response] Invalid article data format: {article_data}")
-        except Exception as e:
-            logger.error(f"[process_api_response] Error updating article with hash {article_hash}: {e}")
-            try:
-                # Retry the task with a delay
-                raise self.retry(exc=e, countdown=30, max_retries=3)
-            except MaxRetriesExceededError:
-                logger.error(f"[process_api_response] Max retries exceeded for article with hash {article_hash}")
\ No newline at end of file
+            # Retry the task with a delay
+            raise self.retry(exc=e, countdown=30, max_retries=3)
+        except MaxRetriesExceededError:
+            logger.error(f"[process_api_response] Max retries exceeded for articles: {[h for h, _ in scores]}")
+
+def get_score_writer():
+    """Get the process-wide buffer that coalesces score updates into bulk statements."""
+    global _score_writer
+    with _score_writer_lock:
+        if _score_writer is None:
+            _score_writer = BatchBuffer(write_scores, max_weight=SCORE_WRITE_BATCH_SIZE, max_wait=SCORE_WRITE_FLUSH_SECONDS)
+    return _score_writer
+
+def write_scores(scores):
+    """Write one coalesced batch of (hash, score) pairs."""
+    updated = update_scores(scores)
+    unknown = {article_hash for article_hash, _ in scores} - updated
+    logger.info(f"[write_scores] Updated scores for {len(updated)} articles")
+    # Cluster members share their representative's score
+    clusters = represented_clusters(updated)
+    if clusters:
+        copied = propagate_cluster_scores(clusters)
+        logger.info(f"[write_scores] Copied scores to {copied} cluster members")
+    if unknown:
+        logger.error(f"[write_scores] {len(unknown)} scored hashes match no article: {sorted(unknown)}")
+    return updated
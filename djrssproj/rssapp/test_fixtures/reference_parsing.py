@@ -0,0 +1,140 @@
+# rssapp/test_fixtures/reference_parsing.py
+# process_feed and its helpers as they were before the single-pass normalizer (rssapp/parsing.py), frozen as the
+# reference the equivalence tests compare the current normalizer against. Do not change this module.
+import feedparser
+import hashlib
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+
+def reference_process_feed(feed_data, cutoff_time, known_hashes=()):
+    """process_feed as it was before the single-pass normalizer."""
+    feed = feedparser.parse(feed_data)
+
+    return [
+        {
+            'hash': hashlib.md5(entry.title.encode()).hexdigest(),
+            'publication_date': datetime(*entry.published_parsed[:6], tzinfo=timezone.utc),
+            'title': entry.title,
+            'author': reference_extract_author(entry),
+            'link': entry.link,
+            'description': entry.get('description', ''),
+            'image': reference_extract_first_image_link(entry),
+            'source': reference_sanitize_filename(feed.feed.title),
+            'source_url': reference_extract_base_url(entry.link),
+            'source_image': feed.feed.get('image', {}).get('href', ''),
+        }
+        for entry in feed.entries
+        if 'published' in entry
+        and datetime(*entry.published_parsed[:6], tzinfo=timezone.utc) >= cutoff_time
+        and hashlib.md5(entry.title.encode()).hexdigest() not in known_hashes
+    ]
+
+
+def reference_extract_author(entry):
+    """Extract the author from an RSS feed entry."""
+    authors = []
+
+    # Handle <dc:creator> tags (with or without CDATA)
+    dc_creators = entry.get('dc_creator') or []
+    if not isinstance(dc_creators, list):
+        dc_creators = [dc_creators]
+    for creator in dc_creators:
+        if isinstance(creator, str):
+            authors.append(reference_strip_cdata(creator))
+
+    # Handle <author> tags (with or without CDATA, with or without nested <name> tags)
+    author_elements = entry.get('author_detail') or []
+    if not isinstance(author_elements, list):
+        author_elements = [author_elements]
+    for author_element in author_elements:
+        if 'name' in author_element and isinstance(author_element['name'], str):
+            authors.append(author_element['name'])
+        elif isinstance(author_element, str):
+            authors.append(reference_strip_cdata(author_element))
+
+    # Handle multiple <author> tags
+    if 'authors' in entry:
+        for author in entry['authors']:
+            if 'name' in author and isinstance(author['name'], str):
+                authors.append(reference_strip_cdata(author['name']))
+
+    # Remove duplicates
+    unique_authors = set(authors)
+
+    # Join multiple authors with commas and an Oxford comma before the last author
+    return reference_join_authors_with_oxford_comma(unique_authors)
+
+
+def reference_strip_cdata(text):
+    """Strip CDATA tags from a string."""
+    if not isinstance(text, (str, bytes)):
+        return text  # Return the original input if it's not a string or bytes
+    cdata_pattern = re.compile(r'<!\[CDATA\[(.*?)\]\]>', re.DOTALL)
+    return cdata_pattern.sub(r'\1', text)
+
+
+def reference_join_authors_with_oxford_comma(authors):
+    """Join authors with commas and an Oxford comma before the last author."""
+    authors_list = list(filter(None, authors))  # Filter out empty strings
+    if len(authors_list) > 2:
+        return ', '.join(authors_list[:-1]) + ', and ' + authors_list[-1]
+    elif len(authors_list) == 2:
+        return ' and '.join(authors_list)
+    elif authors_list:
+        return authors_list[0]
+    return None  # Return None instead of an empty string
+
+
+def reference_extract_first_image_link(entry):
+    """Extract the first image link from an RSS feed entry."""
+    # Check for media:content or enclosure tags
+    if 'media_content' in entry:
+        media_content = entry.get('media_content', [])
+        if media_content and 'url' in media_content[0]:
+            return media_content[0]['url']
+    elif 'enclosures' in entry:
+        enclosures = entry.get('enclosures', [])
+        if enclosures and 'url' in enclosures[0]:
+            return enclosures[0]['url']
+
+    # Check for image links in description or content:encoded
+    if 'description' in entry:
+        image_url = reference_find_image_url_in_html(entry['description'])
+        if image_url:
+            return image_url
+    if 'content' in entry and 'value' in entry['content']:
+        image_url = reference_find_image_url_in_html(entry['content']['value'])
+        if image_url:
+            return image_url
+
+    return None
+
+
+def reference_sanitize_filename(filename):
+    """Sanitize the filename by removing special characters."""
+    return re.sub(r'[\\/*?:"<>|]', "", filename)
+
+
+def reference_find_image_url_in_html(html_content):
+    """Find the first image URL in an HTML string."""
+    try:
+        # Parse the HTML content
+        root = ET.fromstring(f'<root>{html_content}</root>')
+        # Find the first img tag and return its src or srcset attribute
+        img_tag = root.find('.//img')
+        if img_tag is not None:
+            # Prefer src attribute, but if not present, look for srcset
+            return img_tag.get('src') or img_tag.get('srcset').split(',')[0].split()[0]
+    except ET.ParseError:
+        # Handle cases where the HTML content is not well-formed
+        pass
+    return None
+
+
+def reference_extract_base_url(url):
+    """Extract the base URL from a full URL."""
+    parsed_url = urlparse(url)
+    return f"{parsed_url.scheme}://{parsed_url.netloc}/"
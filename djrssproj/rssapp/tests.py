@@ -1,3 +1,909 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from aiohttp import web
+import pytz
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import AnonRateThrottle
+from .archive import archive_month, segments
+from .async_db import close_pool
+from .async_views import AsyncDateRangeView
+from .batching import BatchBuffer
+from .checks import check_process_role, planned_connections
+from .clustering import (NUM_BANDS, NUM_PERMUTATIONS, assign_clusters, band_keys, jaccard, minhash_signature,
+                         propagate_cluster_scores, representative_filter, shingles)
+from .feed_cache import conditional_headers, forget_feed_body, refresh_feed_state
+from .feeds import OPMLFeed, parse_opml, sync_feeds
+from .fetcher import fetch_all
+from .ingest import bulk_insert_articles, update_scores
+from .metrics import DB_POOL_STATS, observe_pool
+from .models import Article, ArticleHash, CacheGeneration, Feed, FeedState, RateLimit, ScoreMemo, SourceStats
+from .page_cache import ARTICLES, _page_key, article_page_key, bump_generation, lookup_stats, record_lookup
+from .parsing import process_feed
+from .partitions import attached_months, detach_partition, ensure_partitions, partition_name
+from .rate_limit import RateLimiter, parse_duration, parse_rate_limit_headers
+from .renderers import ARTICLE_FIELD_PRESETS, ARTICLE_OUTPUT_FIELDS, article_columns, render_article_page
+from .scheduler import due_feeds, schedule_feeds
+from .score_memo import title_digest
+from .serializers import ArticleSerializer
+from .tasks import query_articles_with_null_score, start_update_articles_loop, update_articles_command
+from .test_fixtures.reference_parsing import reference_process_feed
 
-# Create your tests here.
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'test_fixtures')
+AUTHOR_SEPARATOR_RE = re.compile(r', and |, | and ')
+
+
+def read_fixture(*path):
+    with open(os.path.join(FIXTURES_DIR, *path), 'rb') as f:
+        return f.read()
+
+
+def make_article(number, publication_date, source='Test Source', title=None):
+    """An article dict shaped like process_feed output."""
+    title = title or f"Test article {number}"
+    return {
+        'hash': hashlib.md5(title.encode()).hexdigest(),
+        'publication_date': publication_date,
+        'title': title,
+        'author': None,
+        'link': f"https://tests.example.com/{number}",
+        'description': '',
+        'image': None,
+        'source': source,
+        'source_url': 'https://tests.example.com/',
+        'source_image': '',
+    }
+
+
+def generation():
+    return CacheGeneration.objects.filter(name=ARTICLES).values_list('generation', flat=True).first() or 0
+
+
+def author_names(author):
+    """The names of an author field joined by join_authors_with_oxford_comma, in any order."""
+    return sorted(AUTHOR_SEPARATOR_RE.split(author)) if author else []
+
+
+class NormalizerEquivalenceTests(SimpleTestCase):
+    """process_feed produces the articles of the implementation it replaced (test_fixtures/reference_parsing.py)."""
+    cutoff = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    def assertSameArticles(self, name):
+        feed = read_fixture('feeds', name)
+        articles = process_feed(feed, self.cutoff)
+        reference = reference_process_feed(feed, self.cutoff)
+        self.assertTrue(reference)
+        self.assertEqual([article['hash'] for article in articles], [article['hash'] for article in reference])
+        for article, reference_article in zip(articles, reference):
+            # The reference joined several authors in set order, which varies with the hash seed; process_feed
+            # keeps document order. The names must be the same.
+            self.assertEqual(author_names(article.pop('author')), author_names(reference_article.pop('author')))
+            self.assertEqual(article, reference_article)
+
+    def test_cdata(self):
+        self.assertSameArticles('cdata.xml')
+
+    def test_several_authors(self):
+        self.assertSameArticles('several_authors.xml')
+
+    def test_missing_dates(self):
+        self.assertSameArticles('missing_dates.xml')
+
+    def test_images_in_html(self):
+        self.assertSameArticles('html_images.xml')
+
+    def test_relative_urls(self):
+        self.assertSameArticles('relative_urls.xml')
+
+    def test_several_authors_in_document_order(self):
+        articles = process_feed(read_fixture('feeds', 'several_authors.xml'), self.cutoff)
+        self.assertEqual([article['author'] for article in articles],
+                         ['Wanjiru Kamau, Lars Berg, and Ana Souza', 'Kofi Mensah'])
+
+
+class NormalizerImprovementTests(SimpleTestCase):
+    """Feeds the reference implementation got wrong."""
+    cutoff = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+    def feed(self, items):
+        return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0" '
+                'xmlns:content="http://purl.org/rss/1.0/modules/content/"><channel><title>Improvements</title>'
+                f'<link>https://improvements.example.com/</link>{items}</channel></rss>')
+
+    def test_unparseable_date_skips_the_entry_only(self):
+        articles = process_feed(self.feed(
+            '<item><title>Dated</title><link>https://improvements.example.com/a</link>'
+            '<pubDate>Tue, 09 Jan 2024 14:00:00 GMT</pubDate></item>'
+            '<item><title>Undated</title><link>https://improvements.example.com/b</link>'
+            '<pubDate>sometime last week</pubDate></item>'), self.cutoff)
+        self.assertEqual([article['title'] for article in articles], ['Dated'])
+
+    def test_image_in_html_that_is_not_xml(self):
+        articles = process_feed(self.feed(
+            '<item><title>Entities</title><link>https://improvements.example.com/a</link>'
+            '<pubDate>Tue, 09 Jan 2024 14:00:00 GMT</pubDate>'
+            '<description>&lt;p&gt;A&amp;nbsp;caption&lt;br&gt;&lt;img src="https://improvements.example.com/a.jpg"&gt;'
+            '</description></item>'), self.cutoff)
+        self.assertEqual(articles[0]['image'], 'https://improvements.example.com/a.jpg')
+
+    def test_image_in_content_encoded(self):
+        articles = process_feed(self.feed(
+            '<item><title>Content</title><link>https://improvements.example.com/a</link>'
+            '<pubDate>Tue, 09 Jan 2024 14:00:00 GMT</pubDate><description>No image here.</description>'
+            '<content:encoded><![CDATA[<p><img src="https://improvements.example.com/c.jpg"></p>]]></content:encoded>'
+            '</item>'), self.cutoff)
+        self.assertEqual(articles[0]['image'], 'https://improvements.example.com/c.jpg')
+
+
+class FeedCacheTests(SimpleTestCase):
+    url = 'https://feeds.example.com/rss'
+
+    def test_conditional_headers(self):
+        self.assertEqual(conditional_headers(None), {})
+        self.assertEqual(conditional_headers(FeedState(xml_url=self.url)), {})
+        state = FeedState(xml_url=self.url, etag='"v1"', last_modified='Sat, 01 Jun 2024 10:00:00 GMT')
+        self.assertEqual(conditional_headers(state),
+                         {'If-None-Match': '"v1"', 'If-Modified-Since': 'Sat, 01 Jun 2024 10:00:00 GMT'})
+
+    def test_unchanged_body_is_detected_without_validators(self):
+        states = {}
+        self.assertTrue(refresh_feed_state(states, self.url, {'ETag': '"v1"'}, b'<rss/>'))
+        self.assertEqual(states[self.url].etag, '"v1"')
+        self.assertFalse(refresh_feed_state(states, self.url, {}, '<rss/>'))
+        self.assertIsNone(states[self.url].etag)
+        self.assertTrue(refresh_feed_state(states, self.url, {}, b'<rss><channel/></rss>'))
+
+    def test_forgotten_body_is_downloaded_and_processed_again(self):
+        states = {}
+        refresh_feed_state(states, self.url, {'ETag': '"v1"', 'Last-Modified': 'Sat, 01 Jun 2024 10:00:00 GMT'},
+                           b'<rss/>')
+        forget_feed_body(states, self.url)
+        self.assertEqual(conditional_headers(states[self.url]), {})
+        self.assertTrue(refresh_feed_state(states, self.url, {}, b'<rss/>'))
+
+
+@mock.patch('rssapp.tasks.get_score_batcher')
+@override_settings(SCORING_RESEND_SECONDS=600)
+class NullScoreSweepTests(TestCase):
+    def test_queued_titles_are_sent_again_only_after_the_resend_window(self, get_score_batcher):
+        article = make_article(1, datetime.now(timezone.utc) - timedelta(hours=1))
+        bulk_insert_articles([article])
+        queued = [(article['hash'], article['title'])]
+
+        query_articles_with_null_score()
+        self.assertEqual(get_score_batcher().add.call_args.args[0], queued)
+        query_articles_with_null_score()
+        self.assertEqual(get_score_batcher().add.call_args.args[0], [])
+
+        Article.objects.update(score_requested=datetime.now(timezone.utc) - timedelta(seconds=601))
+        query_articles_with_null_score()
+        self.assertEqual(get_score_batcher().add.call_args.args[0], queued)
+
+
+class BulkInsertTests(TestCase):
+    def test_duplicate_hashes_are_skipped(self):
+        now = datetime.now(timezone.utc)
+        first = make_article(1, now)
+        duplicate = dict(first, link='https://tests.example.com/duplicate')
+        second = make_article(2, now)
+
+        self.assertEqual(bulk_insert_articles([first, duplicate, second]), {first['hash'], second['hash']})
+        # The first occurrence in the batch is the one stored
+        self.assertEqual(Article.objects.get(hash=first['hash']).link, first['link'])
+
+        third = make_article(3, now)
+        self.assertEqual(bulk_insert_articles([first, third]), {third['hash']})
+        self.assertEqual(Article.objects.count(), 3)
+        self.assertEqual(ArticleHash.objects.count(), 3)
+        self.assertEqual(SourceStats.objects.get(source='Test Source').total_count, 3)
+
+    def test_generation_is_bumped_only_when_rows_are_inserted(self):
+        article = make_article(1, datetime.now(timezone.utc))
+        before = generation()
+        bulk_insert_articles([article])
+        self.assertEqual(generation(), before + 1)
+        self.assertEqual(bulk_insert_articles([article]), set())
+        self.assertEqual(generation(), before + 1)
+
+
+class UpdateScoresTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.articles = [make_article(number, datetime.now(timezone.utc)) for number in range(2)]
+        bulk_insert_articles(self.articles)
+
+    def test_last_score_of_a_repeated_hash_wins(self):
+        article_hash = self.articles[0]['hash']
+        self.assertEqual(update_scores([(article_hash, 50), (article_hash, 60), ('0' * 32, 10)]), {article_hash})
+        self.assertEqual(Article.objects.get(hash=article_hash).score, 60)
+        stats = SourceStats.objects.get(source='Test Source')
+        self.assertEqual((stats.scored_count, stats.histogram), (1, {'60': 1}))
+
+    def test_generation_is_bumped_only_when_rows_match(self):
+        before = generation()
+        self.assertEqual(update_scores([('0' * 32, 10)]), set())
+        self.assertEqual(generation(), before)
+        update_scores([(self.articles[1]['hash'], 70)])
+        self.assertEqual(generation(), before + 1)
+
+
+class BatchBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+    def flush(self, batch):
+        self.batches.append(batch)
+        return len(batch)
+
+    def test_flush_on_weight(self):
+        buffer = BatchBuffer(self.flush, max_weight=10, max_wait=60, weight=len)
+        futures = buffer.add(['aaaa', 'bbbb', 'cccc'])
+        self.assertEqual(self.batches, [['aaaa', 'bbbb']])
+        self.assertEqual(futures[0].result(timeout=0), 2)
+        self.assertEqual(len(buffer), 1)
+        # An item heavier than max_weight goes out as a batch of one
+        buffer.add(['x' * 11])
+        self.assertEqual(self.batches, [['aaaa', 'bbbb'], ['cccc'], ['x' * 11]])
+        buffer.flush()
+
+    def test_flush_on_count(self):
+        buffer = BatchBuffer(self.flush, max_weight=100, max_wait=60, max_items=2)
+        futures = buffer.add([1, 2, 3, 4, 5])
+        self.assertEqual(self.batches, [[1, 2], [3, 4]])
+        self.assertEqual(len(futures), 3)
+        self.assertFalse(futures[2].done())
+        buffer.flush()
+        self.assertEqual(self.batches[-1], [5])
+        self.assertEqual(futures[2].result(timeout=0), 1)
+
+    def test_flush_on_timer(self):
+        flushed = threading.Event()
+
+        def flush(batch):
+            self.batches.append(batch)
+            flushed.set()
+
+        buffer = BatchBuffer(flush, max_weight=100, max_wait=0.05)
+        futures = buffer.add([1, 2])
+        self.assertTrue(flushed.wait(timeout=5))
+        futures[0].result(timeout=5)
+        self.assertEqual(self.batches, [[1, 2]])
+        self.assertEqual(len(buffer), 0)
+
+    def test_flush_error_reaches_the_future(self):
+        def flush(batch):
+            raise ValueError('flush failed')
+
+        buffer = BatchBuffer(flush, max_weight=1, max_wait=60)
+        with self.assertRaises(ValueError):
+            buffer.add([1])
+
+
+@mock.patch('rssapp.scheduler.article_counts', return_value={})
+@override_settings(FEED_POLL_MIN_SECONDS=300, FEED_POLL_MAX_SECONDS=6 * 3600, FEED_POLL_DEFAULT_SECONDS=3600,
+                   FEED_POLL_MAX_BACKOFF_SECONDS=24 * 3600, FEED_POLL_JITTER=0.1, FEED_RATE_WINDOW_DAYS=14)
+class SchedulerTests(SimpleTestCase):
+    now = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+    def test_due_feeds(self, article_counts):
+        states = {
+            'https://a.example.com/never-scheduled': FeedState(xml_url='https://a.example.com/never-scheduled'),
+            'https://a.example.com/due': FeedState(xml_url='https://a.example.com/due', next_poll=self.now),
+            'https://a.example.com/later': FeedState(xml_url='https://a.example.com/later',
+                                                      next_poll=self.now + timedelta(seconds=1)),
+        }
+        urls = ['https://a.example.com/new', *states]
+        self.assertEqual(due_feeds(urls, states, self.now), urls[:3])
+
+    def assertIntervalWithin(self, state, expected):
+        self.assertGreaterEqual(state.poll_interval, int(expected * 0.9))
+        self.assertLessEqual(state.poll_interval, int(expected * 1.1))
+        self.assertEqual(state.next_poll, self.now + timedelta(seconds=state.poll_interval))
+
+    def test_failures_back_off_exponentially_up_to_the_cap(self, article_counts):
+        url = 'https://a.example.com/failing'
+        for failures, expected in [(0, 300), (1, 600), (3, 2400), (20, 24 * 3600)]:
+            for _ in range(50):
+                state = FeedState(xml_url=url, source='Failing', consecutive_failures=failures)
+                schedule_feeds({url: state}, [url], {url}, self.now)
+                self.assertEqual(state.consecutive_failures, failures + 1)
+                self.assertIntervalWithin(state, expected)
+
+    def test_success_resets_failures_and_follows_the_publishing_rate(self, article_counts):
+        url = 'https://a.example.com/feed'
+        # 14 days / 56 articles = 6 hours between articles, polled twice as often
+        article_counts.return_value = {'Feed': 56}
+        for _ in range(50):
+            state = FeedState(xml_url=url, source='Feed', consecutive_failures=4)
+            schedule_feeds({url: state}, [url], set(), self.now)
+            self.assertEqual(state.consecutive_failures, 0)
+            self.assertIntervalWithin(state, 3 * 3600)
+
+    def test_unknown_source_polls_at_the_default_interval(self, article_counts):
+        url = 'https://a.example.com/new'
+        state = FeedState(xml_url=url)
+        schedule_feeds({url: state}, [url], set(), self.now)
+        self.assertIntervalWithin(state, 3600)
+
+
+@mock.patch('rssapp.management.commands.update_articles.ensure_upcoming_partitions')
+@mock.patch('rssapp.management.commands.update_articles.prune_title_bands')
+@mock.patch('rssapp.management.commands.update_articles.query_articles_with_null_score')
+@mock.patch('rssapp.management.commands.update_articles.download_rss_feeds')
+class UpdateLoopTests(SimpleTestCase):
+    def test_next_pass_is_queued_after_the_download(self, download_rss_feeds, *maintenance):
+        call_command('update_articles', loop=False, requeue=3)
+        kwargs = download_rss_feeds.apply_async.call_args.kwargs
+        self.assertEqual((kwargs['link'].task, kwargs['link'].args), ('rssapp.tasks.requeue_update_articles', (3,)))
+        self.assertEqual(kwargs['link_error'], kwargs['link'])
+
+    def test_manual_run_queues_no_pass(self, download_rss_feeds, *maintenance):
+        call_command('update_articles', loop=False)
+        self.assertIsNone(download_rss_feeds.apply_async.call_args.kwargs['link'])
+
+
+@mock.patch('rssapp.tasks.call_command')
+@mock.patch('rssapp.tasks.update_articles_command.delay')
+class UpdateLoopGenerationTests(TestCase):
+    def test_a_new_loop_supersedes_the_queued_one(self, delay, update_articles):
+        start_update_articles_loop()
+        start_update_articles_loop()
+        (older,), (newer,) = [call.args for call in delay.call_args_list]
+        update_articles_command(older)
+        update_articles.assert_not_called()
+        update_articles_command(newer)
+        update_articles.assert_called_once_with('update_articles', loop=False, requeue=newer)
+
+
+class PageKeyTests(SimpleTestCase):
+    def test_defaults_and_missing_parameters_share_a_key(self):
+        self.assertEqual(_page_key({}, 'list', 1), _page_key({'s': 'date', 'timezone': 'UTC', 'source': ''}, 'list', 1))
+
+    def test_source_order_does_not_matter(self):
+        self.assertEqual(_page_key({'source': 'b,a'}, 'list', 1), _page_key({'source': 'a,b'}, 'list', 1))
+
+    def test_unknown_parameters_are_ignored(self):
+        self.assertEqual(_page_key({'utm_source': 'mail'}, 'list', 1), _page_key({}, 'list', 1))
+
+    def test_page_view_and_generation_are_part_of_the_key(self):
+        key = _page_key({'c': 'abc'}, 'list', 1)
+        self.assertNotEqual(key, _page_key({'c': 'abd'}, 'list', 1))
+        self.assertNotEqual(key, _page_key({'c': 'abc'}, 'search', 1))
+        self.assertNotEqual(key, _page_key({'c': 'abc'}, 'list', 2))
+
+    def test_search_defaults_to_rank_order(self):
+        self.assertNotEqual(_page_key({'q': 'x'}, 'search', 1), _page_key({'q': 'x', 's': 'date'}, 'search', 1))
+        self.assertEqual(_page_key({'q': 'x'}, 'search', 1), _page_key({'q': 'x', 's': 'rank'}, 'search', 1))
+
+
+class LookupStatsTests(SimpleTestCase):
+    def test_hits_and_misses_are_counted(self):
+        before = lookup_stats('test-pages')
+        record_lookup('test-pages', hit=True)
+        record_lookup('test-pages', hit=True, count=2)
+        record_lookup('test-pages', hit=False)
+        record_lookup('other-pages', hit=False)
+        after = lookup_stats('test-pages')
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (3, 1))
+        self.assertEqual(after['hit_ratio'], after['hits'] / (after['hits'] + after['misses']))
+
+
+class DatabasePoolMetricsTests(SimpleTestCase):
+    def test_pool_stats_are_published(self):
+        observe_pool('test-pool', {'pool_size': 4, 'pool_available': 3, 'requests_errors': 2})
+        values = {stat: sample.value for stat, gauge in DB_POOL_STATS.items() for family in gauge.collect()
+                  for sample in family.samples if sample.labels == {'pool': 'test-pool'}}
+        self.assertEqual((values['pool_size'], values['pool_available'], values['requests_errors']), (4, 3, 2))
+        self.assertEqual(values['requests_waiting'], 0)
+
+
+@override_settings(PAGE_CACHE_GENERATION_TTL=0)
+class PageCacheInvalidationTests(TestCase):
+    def test_bump_changes_every_key(self):
+        key = article_page_key({'s': 'score'})
+        self.assertEqual(article_page_key({'s': 'score'}), key)
+        bump_generation(ARTICLES)
+        self.assertNotEqual(article_page_key({'s': 'score'}), key)
+        bump_generation(ARTICLES)
+        self.assertEqual(generation(), 2)
+
+
+class RenderArticlePageTests(SimpleTestCase):
+    def setUp(self):
+        self.articles = [
+            Article(id=7, hash='a' * 32, publication_date=datetime(2024, 3, 1, 21, 5, 3, 120000, tzinfo=timezone.utc),
+                    title='Élection   “quoted” 選挙', link='https://tests.example.com/7', source='Source',
+                    score=None, author=None, description='<p>Line\nbreak</p>', image=None,
+                    source_url='https://tests.example.com/', source_image='', cluster_id=7),
+            Article(id=8, hash='b' * 32, publication_date=datetime(2024, 2, 29, 23, 0, tzinfo=timezone.utc),
+                    title='Plain', link='https://tests.example.com/8', source='Source', score=85, author='A and B',
+                    description='', image='https://tests.example.com/8.jpg', source_url='https://tests.example.com/',
+                    source_image='https://tests.example.com/logo.png', cluster_id=None),
+        ]
+
+    def assertSameBytes(self, fields, timezone_name):
+        columns = article_columns(fields)
+        Row = namedtuple('Row', columns)
+        rows = [Row(*[getattr(article, name) for name in columns]) for article in self.articles]
+        request = Request(APIRequestFactory().get('/api/articles/', {'timezone': timezone_name}))
+        data = ArticleSerializer(self.articles, many=True, context={'request': request, 'fields': fields}).data
+        expected = JSONRenderer().render({'next_cursor': 'bmV4dA', 'previous_cursor': None, 'results': data})
+        self.assertEqual(render_article_page(rows, pytz.timezone(timezone_name), 'bmV4dA', None, fields), expected)
+
+    def test_full_fields(self):
+        self.assertSameBytes(ARTICLE_OUTPUT_FIELDS, 'Africa/Nairobi')
+
+    def test_compact_fields(self):
+        self.assertSameBytes(ARTICLE_FIELD_PRESETS['compact'], 'America/New_York')
+
+    def test_utc(self):
+        self.assertSameBytes(ARTICLE_OUTPUT_FIELDS, 'UTC')
+
+
+class ConnectionBudgetTests(SimpleTestCase):
+    def test_budget_fits_a_default_server(self):
+        # max_connections 100 less the 3 superuser_reserved_connections
+        self.assertLessEqual(planned_connections(), 97)
+
+    def test_planned_connections(self):
+        budget = {'wsgi': {'processes': 4, 'pool': 10}, 'celery': {'processes': 1, 'pool': 40, 'async_pool': 5}}
+        with override_settings(DB_CONNECTION_BUDGET=budget):
+            self.assertEqual(planned_connections(), 85)
+
+    def test_unknown_process_role(self):
+        self.assertEqual(check_process_role(None), [])
+        with override_settings(DB_PROCESS_ROLE='gunicorn'):
+            self.assertEqual([error.id for error in check_process_role(None)], ['rssapp.E002'])
+
+
+class PartitionTests(TestCase):
+    month = datetime(2001, 6, 1, tzinfo=timezone.utc)
+
+    def test_ensure_partitions_creates_missing_months_once(self):
+        self.assertEqual(ensure_partitions([datetime(2001, 6, 15, tzinfo=timezone.utc)]), [partition_name(self.month)])
+        self.assertEqual(ensure_partitions([datetime(2001, 6, 30, 23, tzinfo=timezone.utc)]), [])
+        self.assertIn(self.month, attached_months())
+
+    def test_detach_partition(self):
+        articles = [make_article(number, datetime(2001, 6, number + 1, tzinfo=timezone.utc)) for number in range(3)]
+        bulk_insert_articles(articles)
+        update_scores([(articles[0]['hash'], 40), (articles[1]['hash'], 90)])
+        before = generation()
+
+        self.assertEqual(detach_partition(self.month), 3)
+        self.assertNotIn(self.month, attached_months())
+        self.assertFalse(Article.objects.filter(hash__in=[article['hash'] for article in articles]).exists())
+        stats = SourceStats.objects.get(source='Test Source')
+        self.assertEqual((stats.total_count, stats.scored_count, stats.histogram), (0, 0, {}))
+        self.assertEqual(generation(), before + 1)
+        # The detached table is kept, and its hashes stay registered
+        self.assertIn(partition_name(self.month), connection.introspection.table_names())
+        self.assertEqual(ArticleHash.objects.filter(hash__in=[article['hash'] for article in articles]).count(), 3)
+
+    def test_detach_partition_and_drop(self):
+        article = make_article(1, datetime(2001, 6, 2, tzinfo=timezone.utc))
+        bulk_insert_articles([article])
+        self.assertEqual(detach_partition(self.month, drop=True), 1)
+        self.assertNotIn(partition_name(self.month), connection.introspection.table_names())
+        # Dropped articles are not ingested again
+        self.assertEqual(bulk_insert_articles([article]), set())
+
+    def test_ensure_partitions_recreates_partition_dropped_elsewhere(self):
+        ensure_partitions([self.month])
+        # As another process would, without going through this one
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {connection.ops.quote_name(partition_name(self.month))}")
+        article = make_article(2, datetime(2001, 6, 3, tzinfo=timezone.utc))
+        self.assertEqual(bulk_insert_articles([article]), {article['hash']})
+        self.assertIn(self.month, attached_months())
+
+
+@override_settings(PAGE_CACHE_GENERATION_TTL=0, ARTICLE_LIST_FAST_PATH=True)
+class ArchiveReadThroughTests(TestCase):
+    """Pages of /api/articles/ over a range that starts in an archived month and ends in a live one."""
+
+    def setUp(self):
+        super().setUp()
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        archive_settings = override_settings(ARTICLE_ARCHIVE_DIR=archive_dir, ARTICLE_ARCHIVE_BLOCK_ROWS=2)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+        cache.clear()
+
+        articles = [make_article(number, datetime(2001, 3, 1, tzinfo=timezone.utc) + timedelta(days=number * 5))
+                    for number in range(12)]
+        bulk_insert_articles(articles)
+        update_scores((article['hash'], 50 + number) for number, article in enumerate(articles))
+        self.expected = list(Article.objects.order_by('-publication_date', '-id').values_list('id', flat=True))
+        self.assertEqual(archive_month(datetime(2001, 3, 1, tzinfo=timezone.utc)), 7)
+        self.assertEqual([segment.month for segment in segments()], [datetime(2001, 3, 1, tzinfo=timezone.utc)])
+
+    def get_page(self, **params):
+        response = self.client.get('/api/articles/', {'start_date': '2001-03-01', 'end_date': '2001-04-30',
+                                                      'i': 3, 'fields': 'compact', **params}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_cross_from_the_database_to_the_archive(self):
+        self.assertEqual(Article.objects.count(), 5)
+        seen = []
+        pages = []
+        page = self.get_page()
+        while True:
+            pages.append(page)
+            seen.extend(article['id'] for article in page['results'])
+            if not page['next_cursor']:
+                break
+            page = self.get_page(c=page['next_cursor'])
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 4)
+
+        # Going back from the last page gives the page before it
+        previous = self.get_page(c=pages[-1]['previous_cursor'])
+        self.assertEqual([article['id'] for article in previous['results']],
+                         [article['id'] for article in pages[-2]['results']])
+
+    def test_archived_articles_keep_the_list_filters(self):
+        page = self.get_page(min_score=53, max_score=58, i=20)
+        self.assertEqual([article['score'] for article in page['results']], [58, 57, 56, 55, 54, 53])
+
+    def test_score_order_is_rejected_for_archived_months(self):
+        response = self.client.get('/api/articles/', {'start_date': '2001-03-01', 's': 'score'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('s', response.json())
+
+    def test_member_of_an_archived_first_article_stays_collapsed(self):
+        # The last article of March was archived; make the first one of April a member of its cluster
+        first_id, member_id = self.expected[5], self.expected[4]
+        first_date = datetime(2001, 3, 31, tzinfo=timezone.utc)
+        Article.objects.filter(id=member_id).update(cluster_id=first_id, cluster_date=first_date)
+        bump_generation(ARTICLES)
+        ids = [article['id'] for article in self.get_page(collapse='cluster', i=20)['results']]
+        self.assertIn(first_id, ids)
+        self.assertNotIn(member_id, ids)
+        self.assertEqual(len(ids), 11)
+
+    def test_failed_archive_leaves_the_partition_and_no_files(self):
+        archived = sorted(os.listdir(settings.ARTICLE_ARCHIVE_DIR))
+        with mock.patch('rssapp.archive.detach_partition', side_effect=OperationalError('lock timeout')):
+            with self.assertRaises(OperationalError):
+                archive_month(datetime(2001, 4, 1, tzinfo=timezone.utc))
+        self.assertEqual(sorted(os.listdir(settings.ARTICLE_ARCHIVE_DIR)), archived)
+        self.assertIn(datetime(2001, 4, 1, tzinfo=timezone.utc), attached_months())
+        self.assertEqual(Article.objects.count(), 5)
+
+
+@override_settings(PAGE_CACHE_GENERATION_TTL=0)
+class SearchTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        now = datetime.now(timezone.utc)
+        articles = [make_article(number, now - timedelta(hours=number), title=f"Market update {number}")
+                    for number in range(5)]
+        for article in articles[:3]:
+            article['description'] = 'Traders watch the drought.'
+        # An old article that is the best match, published long before the recent ones
+        self.old = make_article(5, now - timedelta(days=400), title='Drought: the drought of the decade')
+        articles.append(self.old)
+        bulk_insert_articles(articles)
+        update_scores((article['hash'], 50) for article in articles)
+
+    def test_every_match_is_ranked(self):
+        response = self.client.get('/api/search/', {'q': 'drought', 'fields': 'compact'}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[0]['hash'], self.old['hash'])
+
+    def test_query_is_required(self):
+        response = self.client.get('/api/search/', {'q': ' '}, secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+class OneRequestThrottle(AnonRateThrottle):
+    rate = '1/min'
+
+
+@override_settings(ROOT_URLCONF='djrssproj.asgi_urls', ASYNC_DB_POOL_MIN_SIZE=1, ASYNC_DB_POOL_MAX_SIZE=2,
+                   PAGE_CACHE_GENERATION_TTL=0)
+class AsyncViewTests(TransactionTestCase):
+    """The async read endpoints of the ASGI application, which query on their own connections."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        now = datetime.now(timezone.utc)
+        articles = [make_article(number, now - timedelta(hours=number), source=f"Source {number % 2}")
+                    for number in range(5)]
+        bulk_insert_articles(articles)
+        update_scores((article['hash'], 40 + 10 * number) for number, article in enumerate(articles))
+
+    def request(self, method, path, data=None, **extra):
+        async def send():
+            try:
+                return await getattr(self.async_client, method)(path, data, secure=True, **extra)
+            finally:
+                # The pool belongs to this request's event loop
+                await close_pool()
+        return async_to_sync(send)()
+
+    def test_responses_match_the_sync_views(self):
+        for path, data in [('/api/articles/', {'i': 2}), ('/api/articles/', {'s': 'score', 'fields': 'compact'}),
+                           ('/api/sources/', None), ('/api/score-range/', {'source': 'Source 1'}),
+                           ('/api/date-range/', None), ('/api/source-counts/', {'min_score': 50})]:
+            with self.subTest(path=path, data=data):
+                cache.clear()
+                response = self.request('get', path, data)
+                self.assertEqual(response.status_code, 200)
+                cache.clear()
+                with override_settings(ROOT_URLCONF='djrssproj.urls'):
+                    self.assertEqual(response.content, self.client.get(path, data, secure=True).content)
+
+    def test_errors_are_handled_by_drf(self):
+        response = self.request('get', '/api/articles/', {'collapse': 'source'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'collapse': "The only supported value is 'cluster'."})
+        self.assertEqual(self.request('get', '/api/source-counts/', {'min_score': 'high'}).status_code, 400)
+        self.assertEqual(self.request('post', '/api/sources/').status_code, 405)
+
+    def test_content_negotiation(self):
+        for path in ['/api/articles/', '/api/sources/']:
+            with self.subTest(path=path):
+                response = self.request('get', path, headers={'Accept': 'text/html'})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response['Content-Type'].startswith('text/html'))
+        self.assertEqual(self.request('get', '/api/date-range/', headers={'Accept': 'application/xml'}).status_code, 406)
+
+    def test_throttling(self):
+        with mock.patch.object(AsyncDateRangeView, 'throttle_classes', [OneRequestThrottle]):
+            self.assertEqual(self.request('get', '/api/date-range/').status_code, 200)
+            response = self.request('get', '/api/date-range/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class RateLimitHeaderTests(SimpleTestCase):
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration('1s'), 1)
+        self.assertEqual(parse_duration('6m0s'), 360)
+        self.assertEqual(parse_duration('20ms'), 0.02)
+        self.assertEqual(parse_duration('1h2m3.5s'), 3723.5)
+        self.assertEqual(parse_duration(' 2.5 '), 2.5)
+        self.assertIsNone(parse_duration('soon'))
+        self.assertIsNone(parse_duration('1s garbage'))
+
+    def test_limits_and_remaining_counts(self):
+        observed = parse_rate_limit_headers({
+            'X-RateLimit-Limit-Requests': '500', 'X-RateLimit-Remaining-Requests': '499',
+            'X-RateLimit-Limit-Tokens': '30000', 'X-RateLimit-Remaining-Tokens': '29000.0',
+            'X-RateLimit-Reset-Tokens': '2s',
+        })
+        self.assertEqual(observed, {'limit_requests': 500, 'remaining_requests': 499, 'limit_tokens': 30000,
+                                    'remaining_tokens': 29000, 'block': None})
+
+    def test_exhausted_quota_blocks_until_its_reset(self):
+        observed = parse_rate_limit_headers({'x-ratelimit-remaining-tokens': '0', 'x-ratelimit-reset-tokens': '6m0s',
+                                             'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': '1s'})
+        self.assertEqual(observed['block'], 360)
+
+    def test_retry_after(self):
+        self.assertEqual(parse_rate_limit_headers({'Retry-After': '7'})['block'], 7)
+        self.assertEqual(parse_rate_limit_headers({'retry-after-ms': '1500', 'Retry-After': '7'})['block'], 1.5)
+        self.assertEqual(parse_rate_limit_headers({'Retry-After': '3', 'x-ratelimit-remaining-requests': '0',
+                                                   'x-ratelimit-reset-requests': '20s'})['block'], 20)
+        self.assertIsNone(parse_rate_limit_headers({'Retry-After': 'later'})['block'])
+
+    def test_no_headers(self):
+        self.assertFalse(any(value is not None for value in parse_rate_limit_headers({}).values()))
+
+
+class RateLimiterTests(TestCase):
+    def test_refund_does_not_overfill_the_bucket(self):
+        limiter = RateLimiter('test', requests_per_minute=60, tokens_per_minute=6000, burst_seconds=60)
+        reservation = limiter.reserve(tokens=100)
+        self.assertTrue(reservation.granted)
+        # Reported usage well below the reservation, e.g. a bad estimate
+        limiter.settle(reservation._replace(tokens=5000), used_tokens=0)
+        self.assertLessEqual(RateLimit.objects.get(name='test').tokens, 6000)
+
+    def test_reservation_past_max_wait_takes_nothing(self):
+        limiter = RateLimiter('test', requests_per_minute=60, tokens_per_minute=6000, burst_seconds=60, max_wait=5)
+        self.assertTrue(limiter.reserve(tokens=6000).granted)
+        refused = limiter.reserve(tokens=6000)
+        self.assertFalse(refused.granted)
+        self.assertGreater(refused.delay, 5)
+        self.assertEqual((refused.requests, refused.tokens), (0, 0))
+
+
+class MinHashTests(SimpleTestCase):
+    def test_signature(self):
+        signature = minhash_signature(shingles('Rover finds water ice near the lunar south pole'))
+        self.assertEqual(len(signature), NUM_PERMUTATIONS)
+        self.assertEqual(signature, minhash_signature(shingles('ROVER finds water-ice near the lunar south pole!')))
+
+    def test_outlet_suffix_and_punctuation_do_not_change_the_shingles(self):
+        self.assertEqual(shingles('Rover finds water ice - Reuters'), shingles('Rover finds, water ice'))
+
+    def test_agreement_estimates_similarity(self):
+        a = shingles('Rover finds water ice near the lunar south pole - Reuters')
+        b = shingles('Rover finds water ice near lunar south pole, scientists say')
+        agreement = sum(x == y for x, y in zip(minhash_signature(a), minhash_signature(b))) / NUM_PERMUTATIONS
+        self.assertAlmostEqual(agreement, jaccard(a, b), delta=0.15)
+
+    def test_band_keys(self):
+        keys = band_keys(minhash_signature(shingles('Parliament debates the budget')))
+        self.assertEqual(len(keys), NUM_BANDS)
+        # The same rows in two band positions give different keys
+        self.assertEqual(len(set(band_keys([1] * NUM_PERMUTATIONS))), NUM_BANDS)
+        self.assertTrue(all(-2 ** 63 <= key < 2 ** 63 for key in keys))
+
+
+@override_settings(CLUSTER_SIMILARITY_THRESHOLD=0.5, CLUSTER_WINDOW_HOURS=72)
+class AssignClustersTests(TestCase):
+    def insert(self, number, title, hours_ago):
+        article = make_article(number, datetime.now(timezone.utc) - timedelta(hours=hours_ago), title=title)
+        bulk_insert_articles([article])
+        return article['hash']
+
+    def cluster(self, article_hash):
+        return Article.objects.values_list('id', 'cluster_id', 'score').get(hash=article_hash)
+
+    def test_near_duplicate_joins_the_earlier_cluster_and_takes_its_score(self):
+        first = self.insert(1, 'Rover finds water ice near the lunar south pole - Reuters', 3)
+        self.assertEqual(assign_clusters({first}), set())
+        first_id, first_cluster, _ = self.cluster(first)
+        self.assertEqual(first_cluster, first_id)
+        update_scores([(first, 80)])
+
+        duplicate = self.insert(2, 'Rover finds water ice near lunar south pole, scientists say', 2)
+        other = self.insert(3, 'Parliament debates the football budget', 1)
+        self.assertEqual(assign_clusters({duplicate, other}), {duplicate})
+        self.assertEqual(self.cluster(duplicate)[1:], (first_id, 80))
+        other_id, other_cluster, other_score = self.cluster(other)
+        self.assertEqual((other_cluster, other_score), (other_id, None))
+
+    def test_near_duplicates_in_one_batch(self):
+        first = self.insert(1, 'Drought hits the harvest in the east', 2)
+        second = self.insert(2, 'Drought hits harvest in the east - BBC News', 1)
+        self.assertEqual(assign_clusters({first, second}), {second})
+        self.assertEqual(self.cluster(second)[1], self.cluster(first)[0])
+
+    def test_articles_outside_the_window_are_not_clustered(self):
+        old = self.insert(1, 'Festival opens in the square', 100)
+        self.assertEqual(assign_clusters({old}), set())
+        self.assertIsNone(self.cluster(old)[1])
+
+    def test_members_record_the_date_of_their_first_article(self):
+        first = self.insert(1, 'Drought hits the harvest in the east', 2)
+        second = self.insert(2, 'Drought hits harvest in the east - BBC News', 1)
+        assign_clusters({first, second})
+        first_date = Article.objects.get(hash=first).publication_date
+        self.assertEqual(Article.objects.get(hash=second).cluster_date, first_date)
+        self.assertEqual(Article.objects.get(hash=first).cluster_date, first_date)
+
+        representatives = Article.objects.filter(representative_filter())
+        self.assertEqual(list(representatives.values_list('hash', flat=True)), [first])
+        Article.objects.filter(hash=first).delete()
+        # Left without its first article, the member represents the cluster
+        self.assertEqual(list(representatives.values_list('hash', flat=True)), [second])
+
+
+@override_settings(CLUSTER_SIMILARITY_THRESHOLD=0.5, CLUSTER_WINDOW_HOURS=72)
+class WarmScoreMemoTests(TestCase):
+    def test_only_scores_given_to_the_title_are_remembered(self):
+        first = make_article(1, datetime.now(timezone.utc) - timedelta(hours=2),
+                             title='Rover finds water ice near the lunar south pole - Reuters')
+        member = make_article(2, datetime.now(timezone.utc) - timedelta(hours=1),
+                              title='Rover finds water ice near lunar south pole, scientists say')
+        bulk_insert_articles([first, member])
+        assign_clusters({first['hash'], member['hash']})
+        update_scores([(first['hash'], 80)])
+        propagate_cluster_scores()
+        self.assertEqual(Article.objects.get(hash=member['hash']).score, 80)
+
+        call_command('warm_score_memo', stdout=io.StringIO())
+        self.assertEqual(list(ScoreMemo.objects.values_list('title_digest', 'score')),
+                         [(title_digest(first['title']), 80)])
+
+
+class FetchTimeoutTests(SimpleTestCase):
+    async def fetch_from_slow_host(self, feeds, delay, timeout):
+        async def handler(request):
+            await asyncio.sleep(delay)
+            return web.Response(text='<rss/>')
+
+        app = web.Application()
+        app.router.add_get('/{name}', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            return await fetch_all([f"http://127.0.0.1:{port}/{number}" for number in range(feeds)], timeout=timeout)
+        finally:
+            await runner.cleanup()
+
+    def test_waiting_for_a_host_slot_does_not_count_against_the_timeout(self):
+        # Three rounds of four connections to the one host take 0.6s, each request 0.2s
+        results, stats = asyncio.run(self.fetch_from_slow_host(12, delay=0.2, timeout=0.5))
+        self.assertEqual([result.error for result in results], [None] * 12)
+        self.assertEqual(stats.failed, 0)
+
+    def test_a_slow_request_times_out(self):
+        results, stats = asyncio.run(self.fetch_from_slow_host(1, delay=0.5, timeout=0.1))
+        self.assertIsNotNone(results[0].error)
+        self.assertEqual(stats.failed, 1)
+
+
+class OPMLTests(SimpleTestCase):
+    def test_parse_opml(self):
+        feeds = parse_opml(b'''<?xml version="1.0"?><opml version="2.0"><head><title>Feeds</title></head><body>
+            <outline text="News" title="News">
+              <outline type="rss" text="World" xmlUrl="https://news.example.com/world.xml" htmlUrl="https://news.example.com/"/>
+              <outline text="Africa">
+                <outline type="rss" title="Nairobi" text="ignored" xmlUrl="https://nairobi.example.com/rss"/>
+              </outline>
+            </outline>
+            <outline type="rss" text="Loose" xmlUrl="https://loose.example.com/feed"/>
+            <outline type="rss" text="World again" xmlUrl="https://news.example.com/world.xml"/>
+        </body></opml>''')
+        self.assertEqual(feeds, [
+            OPMLFeed('https://news.example.com/world.xml', 'World', 'https://news.example.com/', 'News'),
+            OPMLFeed('https://nairobi.example.com/rss', 'Nairobi', None, 'Africa'),
+            OPMLFeed('https://loose.example.com/feed', 'Loose', None, None),
+        ])
+
+
+class SyncFeedsTests(TestCase):
+    def setUp(self):
+        self.world = OPMLFeed('https://news.example.com/world.xml', 'World', None, 'News')
+        self.sport = OPMLFeed('https://news.example.com/sport.xml', 'Sport', None, 'News')
+        sync_feeds([self.world, self.sport])
+
+    def test_added(self):
+        self.assertEqual(set(Feed.objects.filter(enabled=True).values_list('xml_url', flat=True)),
+                         {self.world.xml_url, self.sport.xml_url})
+
+    def test_changes(self):
+        Feed.objects.filter(xml_url=self.world.xml_url).update(article_count=12)
+        science = OPMLFeed('https://science.example.org/feed', 'Science', None, None)
+        sync = sync_feeds([self.sport._replace(category='Sports', title='Sport!'), science])
+        self.assertEqual(sync.added, [science.xml_url])
+        self.assertEqual(sync.disabled, [self.world.xml_url])
+        self.assertEqual(sync.recategorized, [self.sport.xml_url])
+        self.assertEqual(sync.retitled, [self.sport.xml_url])
+
+        world = Feed.objects.get(xml_url=self.world.xml_url)
+        # Dropped feeds are disabled, keeping their counts
+        self.assertEqual((world.enabled, world.article_count), (False, 12))
+        self.assertIsNotNone(world.disabled_since)
+        self.assertEqual(Feed.objects.get(xml_url=self.sport.xml_url).category, 'Sports')
+
+        sync = sync_feeds([self.world, self.sport])
+        self.assertEqual(sync.enabled, [self.world.xml_url])
+        self.assertEqual(sync.disabled, [science.xml_url])
+        self.assertIsNone(Feed.objects.get(xml_url=self.world.xml_url).disabled_since)
+
+    def test_dry_run_writes_nothing(self):
+        sync = sync_feeds([], dry_run=True)
+        self.assertEqual(sorted(sync.disabled), sorted([self.world.xml_url, self.sport.xml_url]))
+        self.assertEqual(Feed.objects.filter(enabled=True).count(), 2)
@@ -1,11 +1,14 @@
 # rssapp/urls.py
 from django.urls import path
-from .views import ArticleListView, SourceListView, ScoreRangeView, SourceCountView, DateRangeView
+from .views import ArticleListView, ArticleExportView, SourceListView, ScoreRangeView, SourceCountView, DateRangeView, CacheStatsView, SearchView
 
 urlpatterns = [
     path('articles/', ArticleListView.as_view(), name='article-list'),
+    path('articles/export/', ArticleExportView.as_view(), name='article-export'),
+    path('search/', SearchView.as_view(), name='article-search'),
     path('sources/', SourceListView.as_view(), name='source-list'),
     path('score-range/', ScoreRangeView.as_view(), name='score-range'),
     path('date-range/', DateRangeView.as_view(), name='date-range'),
     path('source-counts/', SourceCountView.as_view(), name='source-counts'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache-stats'),
 ]
\ No newline at end of file
@@ -1,24 +1,41 @@
 # rssapp/views.py
-from django.db.models import Count, Min, Max, Q
-from django.db.models.functions import Lower
+from django.db.models import Min, Max, Q
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .models import Article
 from .serializers import ArticleSerializer
-from .pagination import ArticleCursorPagination
+from .pagination import ArticleCursorPagination, SearchCursorPagination
 from django.utils import timezone
 from datetime import datetime
 import pytz
-from django.http import JsonResponse
-from .tasks import download_rss_feeds, query_openai_api
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+import csv
+from .tasks import download_rss_feeds, enqueue_for_scoring
 from django.conf import settings
+from django.core.cache import cache
+from .page_cache import ARTICLES, article_page_key, cache_stats, record_lookup
+from .source_stats import count_in_range, source_stats
+from .renderers import ARTICLE_OUTPUT_FIELDS, article_columns, article_dicts, encode_json, parse_fields, render_article_page
+from .search import search_articles
+from .clustering import representative_filter
+from .metrics import render_metrics
+from .archive import ArchiveFilter, ArchiveReadThrough, reaches_archive, segments
+from prometheus_client import CONTENT_TYPE_LATEST
 
 class ArticleListView(ListAPIView):
     serializer_class = ArticleSerializer
     pagination_class = ArticleCursorPagination
+    page_cache_view = 'list'
+    # Whether a date range reaching past the archive horizon also reads the archived articles
+    archive_read_through = True
 
-    def get_queryset(self):
+    def get_date_range(self):
+        """start_date and end_date of the request as UTC datetimes, or None."""
         # Get timezone from the request, default to UTC if not provided
         client_timezone = self.request.query_params.get('timezone', 'UTC')
         tz = pytz.timezone(client_timezone)
@@ -36,6 +53,10 @@ class ArticleListView(ListAPIView):
             end_date = tz.localize(datetime.strptime(end_date, '%Y-%m-%d'))
             # Set to the end of the day before converting to UTC
             end_date = (end_date + timezone.timedelta(days=1, seconds=-1)).astimezone(pytz.utc)
+        return start_date or None, end_date or None
+
+    def get_queryset(self):
+        start_date, end_date = self.get_date_range()
 
         q_objects = Q(score__isnull=False)
         if source_filter := self.request.query_params.get('source'):
@@ -51,6 +72,14 @@ class ArticleListView(ListAPIView):
         if end_date:
             q_objects &= Q(publication_date__lt=end_date)
 
+        # Return one article per near-duplicate cluster, the first one published
+        collapse = self.request.query_params.get('collapse')
+        if collapse == 'cluster':
+            # A member stays hidden while its cluster's first article is archived, as archived rows are shown
+            q_objects &= representative_filter([segment.month for segment in segments()])
+        elif collapse:
+            raise ValidationError({'collapse': "The only supported value is 'cluster'."})
+
         # Determine the sort order
         sort_by = self.request.query_params.get('s', 'date')
         if sort_by == 'score':
@@ -58,62 +87,311 @@ class ArticleListView(ListAPIView):
         else:
             order_fields = ['-publication_date', '-id']
 
-        return Article.objects.filter(q_objects).order_by(*order_fields)
-    
+        # Only read the columns the selected fields need, e.g. no description for fields=compact
+        return Article.objects.filter(q_objects).order_by(*order_fields).only(*article_columns(self.get_fields()))
+
+    def get_archive_filter(self):
+        """The request's filters for archived articles, or None when its date range does not reach the archive."""
+        start_date, end_date = self.get_date_range()
+        if not self.archive_read_through or not reaches_archive(start_date):
+            return None
+        params = self.request.query_params
+        if params.get('s') == 'score':
+            # Archived blocks are read in date order; any other order would sort all of their rows in memory
+            raise ValidationError({'s': f"Articles older than {settings.ARTICLE_ARCHIVE_HORIZON_DAYS} days are only "
+                                        f"listed by date, use s=date or a later start_date."})
+        try:
+            min_score = int(params['min_score']) if params.get('min_score') else None
+            max_score = int(params['max_score']) if params.get('max_score') else None
+        except ValueError:
+            raise ValidationError({'min_score': 'min_score and max_score must be integers.'})
+        return ArchiveFilter(start=start_date, end=end_date,
+                             sources=params['source'].split(',') if params.get('source') else None,
+                             min_score=min_score, max_score=max_score,
+                             representative_only=params.get('collapse') == 'cluster')
+
+    def read_through(self, queryset, after=None):
+        """The queryset, merged with the archived articles if the request's date range reaches them."""
+        archive_filter = self.get_archive_filter()
+        if archive_filter is None:
+            return queryset
+        return ArchiveReadThrough(queryset, archive_filter, after=after)
+
+    def paginate_queryset(self, queryset):
+        return super().paginate_queryset(self.read_through(queryset))
+
+    def get_fields(self):
+        """Output fields selected by the fields= parameter."""
+        try:
+            return parse_fields(self.request.query_params.get('fields'))
+        except ValueError as e:
+            raise ValidationError({'fields': str(e)})
+
     def get_serializer_context(self):
-        # Override the method to add the request to the serializer context
-        return {'request': self.request}
+        # Override the method to add the request and the selected fields to the serializer context
+        return {'request': self.request, 'fields': self.get_fields()}
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            # e.g. the browsable API, rendered by DRF and not cached
+            return super().list(request, *args, **kwargs)
+
+        # Serve repeated pages from the cache until new articles or scores are written
+        key = article_page_key(request.query_params, self.page_cache_view)
+        content = cache.get(key)
+        record_lookup(ARTICLES, hit=content is not None)
+        cache_status = 'HIT'
+        if content is None:
+            content = self.render_page() if settings.ARTICLE_LIST_FAST_PATH else self.render_page_with_serializer()
+            cache.set(key, content, settings.ARTICLE_PAGE_CACHE_TIMEOUT)
+            cache_status = 'MISS'
+
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = cache_status
+        return response
+
+    def render_page(self):
+        """Render the page from value tuples, bypassing model instances and the serializer."""
+        fields = self.get_fields()
+        return self.render_rows(self.paginate_queryset(self.get_rows_queryset(fields)), fields)
+
+    def get_rows_queryset(self, fields):
+        """The filtered queryset as named tuples of the columns the fields need."""
+        return self.filter_queryset(self.get_queryset()).values_list(*self.get_row_columns(fields), named=True)
+
+    def render_rows(self, page, fields):
+        """Render a paginated page of rows, with the paginator's cursors."""
+        tz = pytz.timezone(self.request.query_params.get('timezone', 'UTC'))
+        return render_article_page(page, tz,
+                                   self.paginator.get_cursor_from_link(self.paginator.get_next_link()),
+                                   self.paginator.get_cursor_from_link(self.paginator.get_previous_link()),
+                                   fields)
+
+    def get_row_columns(self, fields):
+        """Columns read for each row of the fast path."""
+        return article_columns(fields)
+
+    def render_page_with_serializer(self):
+        """Render the page through ArticleSerializer, the reference for render_page."""
+        response = super().list(self.request)
+        return JSONRenderer().render(response.data)
+
+class SearchView(ArticleListView):
+    pagination_class = SearchCursorPagination
+    page_cache_view = 'search'
+    # Archived articles have no search vector
+    archive_read_through = False
+
+    def get_queryset(self):
+        # Same filters as the article list, restricted to matches of q and ranked
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'A search query is required.'})
+        return search_articles(super().get_queryset(), text)
+
+    def get_row_columns(self, fields):
+        # The cursor of a relevance-ordered page is built from the rank
+        return article_columns(fields) + ['rank']
+
+class ArticleExportView(ArticleListView):
+    """
+    Stream every article matching the article list filters as NDJSON (output=ndjson, the default) or CSV
+    (output=csv), read through a server-side cursor so memory stays flat whatever the result size.
+
+    Rows are exported in the list's order and always include the fields of that order (id, publication_date,
+    and score with s=score). An interrupted export resumes with after= set to those values of the last row
+    received, comma-separated in that order: score,publication_date,id or publication_date,id.
+
+    A date range reaching past the archive horizon merges in the archived articles, read block by block in
+    date order; s=score is rejected for such a range.
+    """
+    OUTPUTS = {
+        'ndjson': ('application/x-ndjson', 'articles.ndjson'),
+        'csv': ('text/csv; charset=utf-8', 'articles.csv'),
+    }
+
+    def get(self, request, *args, **kwargs):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in self.OUTPUTS:
+            raise ValidationError({'output': f"Choose from {', '.join(self.OUTPUTS)}."})
+        fields = self.get_fields()
+        queryset = self.get_queryset()
+        position = None
+        if after := request.query_params.get('after'):
+            position = self.get_keyset_position(after)
+            queryset = queryset.filter(self.get_keyset_filter(position))
+        rows = self.read_through(queryset.values_list(*self.get_row_columns(fields), named=True),
+                                 after=tuple(position.values()) if position else None)
+        tz = pytz.timezone(request.query_params.get('timezone', 'UTC'))
+
+        content_type, filename = self.OUTPUTS[output]
+        stream = self.stream_ndjson(rows, tz, fields) if output == 'ndjson' else self.stream_csv(rows, tz, fields)
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    def get_fields(self):
+        # The ordering fields are always exported, so any row can be used to resume
+        fields = set(super().get_fields()) | set(self.get_keyset_fields())
+        return [name for name in ARTICLE_OUTPUT_FIELDS if name in fields]
+
+    def get_keyset_fields(self):
+        if self.request.query_params.get('s') == 'score':
+            return ['score', 'publication_date', 'id']
+        return ['publication_date', 'id']
+
+    def get_keyset_position(self, after):
+        """The ordering values of the after= parameter, by field name in ordering order."""
+        names = self.get_keyset_fields()
+        values = after.split(',')
+        try:
+            if len(values) != len(names):
+                raise ValueError
+            position = dict(zip(names, values))
+            position['id'] = int(position['id'])
+            position['publication_date'] = parse_datetime(position['publication_date'])
+            if position['publication_date'] is None:
+                raise ValueError
+            if timezone.is_naive(position['publication_date']):
+                # Read in the default timezone as the database lookup would, comparable with archived dates
+                position['publication_date'] = timezone.make_aware(position['publication_date'])
+            if 'score' in position:
+                position['score'] = int(position['score'])
+        except ValueError:
+            raise ValidationError({'after': f"Expected {','.join(names)} of the last exported row."})
+        return position
+
+    def get_keyset_filter(self, position):
+        """Rows that come after a keyset position, in descending order."""
+        names = list(position)
+        # (a, b, c) < (x, y, z) for a descending order, expanded for the indexes on each column
+        keyset = Q()
+        equal = Q()
+        for name in names:
+            keyset |= equal & Q(**{f'{name}__lt': position[name]})
+            equal &= Q(**{name: position[name]})
+        return keyset
+
+    def iterate_rows(self, rows):
+        """
+        Yield chunks of rows from a server-side cursor. The cursor is declared in a transaction, since outside
+        of one PostgreSQL materializes the whole result of a cursor WITH HOLD before the first row is read.
+        """
+        chunk_size = settings.ARTICLE_EXPORT_CHUNK_SIZE
+        with transaction.atomic():
+            chunk = []
+            for row in rows.iterator(chunk_size=chunk_size):
+                chunk.append(row)
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    def stream_ndjson(self, rows, tz, fields):
+        for chunk in self.iterate_rows(rows):
+            yield ''.join(encode_json(article) + '\n' for article in article_dicts(chunk, tz, fields)).encode()
+
+    def stream_csv(self, rows, tz, fields):
+        buffer = CSVBuffer()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        yield buffer.take()
+        for chunk in self.iterate_rows(rows):
+            writer.writerows([article[name] for name in fields] for article in article_dicts(chunk, tz, fields))
+            yield buffer.take()
+
+class CSVBuffer:
+    """File-like object collecting csv.writer output until it is taken."""
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+    def take(self):
+        content = ''.join(self.parts).encode()
+        self.parts = []
+        return content
 
 class SourceListView(APIView):
+    def get_queryset(self):
+        # The incrementally maintained per-source statistics, not a scan of the articles
+        return source_stats().values_list('source', 'total_count')
+
     def get(self, request, *args, **kwargs):
-        sources = Article.objects.values('source').annotate(count=Count('source')).order_by(Lower('source'))
-        return Response({'sources': sources})
+        return Response(self.list_sources(self.get_queryset()))
+
+    def list_sources(self, rows):
+        return {'sources': [{'source': source, 'count': count} for source, count in rows]}
 
 class ScoreRangeView(APIView):
-    def get(self, request, *args, **kwargs):
+    aggregates = {'min_score': Min('score'), 'max_score': Max('score')}
+
+    def get_queryset(self):
         q_objects = Q(score__isnull=False)
-        if source_filter := request.query_params.get('source'):
+        if source_filter := self.request.query_params.get('source'):
             q_objects &= Q(source__in=source_filter.split(','))
-        score_range = Article.objects.filter(q_objects).aggregate(min_score=Min('score'), max_score=Max('score'))
-        return Response(score_range)
+        return Article.objects.filter(q_objects)
+
+    def get(self, request, *args, **kwargs):
+        return Response(self.get_queryset().aggregate(**self.aggregates))
 
 class DateRangeView(APIView):
+    aggregates = {'min_date': Min('publication_date'), 'max_date': Max('publication_date')}
+
+    def get_queryset(self):
+        return Article.objects.all()
+
     def get(self, request, *args, **kwargs):
-        date_range = Article.objects.aggregate(min_date=Min('publication_date'), max_date=Max('publication_date'))
-        return Response(date_range)
-    
+        return Response(self.get_queryset().aggregate(**self.aggregates))
+
 class SourceCountView(APIView):
-    def get(self, request, *args, **kwargs):
-        q_objects = Q(score__isnull=False)
-        if min_score := request.query_params.get('min_score'):
-            q_objects &= Q(score__gte=min_score)
-        if max_score := request.query_params.get('max_score'):
-            q_objects &= Q(score__lte=max_score)
+    def get_queryset(self):
+        return source_stats().values_list('source', 'total_count', 'histogram')
 
-        total_source_counts = Article.objects.values('source').annotate(total_count=Count('source')).order_by(Lower('source'))
-        filtered_source_counts = Article.objects.filter(q_objects).values('source').annotate(filtered_count=Count('source')).order_by(Lower('source'))
+    def get_score_range(self):
+        """min_score and max_score of the request, None when not given; ValueError when not integers."""
+        min_score = self.request.query_params.get('min_score')
+        max_score = self.request.query_params.get('max_score')
+        return int(min_score) if min_score else None, int(max_score) if max_score else None
 
-        response_data = {
-            source['source']: {
-                'total_count': source['total_count'],
-                'filtered_count': next((filtered['filtered_count'] for filtered in filtered_source_counts if filtered['source'] == source['source']), 0)
-            } for source in total_source_counts
+    def get(self, request, *args, **kwargs):
+        try:
+            min_score, max_score = self.get_score_range()
+        except ValueError:
+            return Response({'error': 'min_score and max_score must be integers'}, status=400)
+        return Response(self.count_sources(self.get_queryset(), min_score, max_score))
+
+    def count_sources(self, rows, min_score, max_score):
+        # The score filter is evaluated against each source's score histogram
+        return {
+            source: {
+                'total_count': total_count,
+                'filtered_count': count_in_range(histogram, min_score, max_score),
+            } for source, total_count, histogram in rows
         }
 
-        return Response(response_data)
+class CacheStatsView(APIView):
+    def get(self, request, *args, **kwargs):
+        # Score memo hits and misses are the rssapp_score_memo_lookups_total metric of the workers
+        return Response({ARTICLES: cache_stats(ARTICLES)})
 
 def start_rss_feed_download(request):
     # You might want to add authentication and permissions checks here
-    opml_content = open(settings.OPML_FILE_PATH, 'r').read()
-    download_rss_feeds.delay(opml_content)  # Assuming you want to start this as a background task
+    # Polls the enabled feeds of the registry; the 'sync_feeds' command loads them from the OPML file
+    download_rss_feeds.delay()
     return JsonResponse({'status': 'started'})
 
 def start_openai_query(request):
     # You might want to add authentication and permissions checks here
     # For demonstration purposes, let's assume you want to query all articles
     # with a null score and you have a function in your tasks.py for this purpose
-    articles = Article.objects.filter(score__isnull=True)
-    for article in articles:
-        # Assuming query_openai_api is a task that takes the article title and hash as arguments
-        query_openai_api.delay(article.title, settings.PROMPT, article.hash)
-    return JsonResponse({'status': 'queries_started'})
\ No newline at end of file
+    articles = Article.objects.filter(score__isnull=True).filter(representative_filter()).values_list('hash', 'title')
+    # Pack the titles into token-budgeted scoring requests and send them right away
+    enqueue_for_scoring(list(articles), flush=True)
+    return JsonResponse({'status': 'queries_started'})
+
+def metrics(request):
+    # Only reachable from the host itself, Nginx does not forward /metrics from outside
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
\ No newline at end of file